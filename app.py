@@ -1,26 +1,53 @@
 import os
-import csv
 import json
+import time
 import logging
 from datetime import datetime
-from io import StringIO
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, Response, send_file, stream_with_context, g, before_render_template, template_rendered
 
-from utils.zillow_api import get_zillow_listings
-from utils.rentcast_api import get_rent_estimate
-from utils.calculator import calculate_property_metrics
-from utils.cache import get_cached_data, cache_data
-import logging
+from utils.analysis import analyze_zip, parse_parameters, parse_zip_codes
+from utils.cache import get_cache_stats, get_storage_report
+from utils.pipeline import run_ordered, iter_completed
+from utils.rate_limit import get_usage_report
+from utils.export import iter_csv, iter_gzip
+from utils.topk import TopK
+from utils import circuit_breaker, jobs, metrics, result_store, rescore, warehouse, warmer
 
 # Configure detailed logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asasctime)s - %(name)s - %(levelname)s - %(message)s')
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
 
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+
+@app.after_request
+def finish_request_metrics(response):
+    metrics.finish_request(request.endpoint, request.method, request.path,
+                           response.status_code)
+    return response
+
+
+def start_render_span(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def finish_render_span(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        metrics.record_span('render', time.perf_counter() - started)
+
+
+before_render_template.connect(start_render_span, app)
+template_rendered.connect(finish_render_span, app)
+
+
 @app.route('/', methods=['GET'])
 def index():
     return render_template(
@@ -31,223 +58,124 @@ def index():
         monthly_expenses=300)
 
 
-def get_sample_properties(zip_code: str, min_coc_return: float,
-                          down_payment: float, interest_rate: float,
-                          loan_term: int, monthly_expenses: float):
-    """Fallback function to generate sample properties when API calls fail"""
-    logging.info(f"Using sample properties for ZIP: {zip_code}")
-
-    # Different property prices and rents based on region type
-    high_end_zips = {
-        "90210": {
-            "name": "Beverly Hills, CA",
-            "min_price": 1500000,
-            "max_price": 5500000,
-            "rent_ratio": 0.004
-        },
-        "90402": {
-            "name": "Santa Monica, CA",
-            "min_price": 1400000,
-            "max_price": 4800000,
-            "rent_ratio": 0.0035
-        },
-        "10013": {
-            "name": "Tribeca, NY",
-            "min_price": 1300000,
-            "max_price": 5000000,
-            "rent_ratio": 0.003
-        },
-        "94104": {
-            "name": "San Francisco, CA",
-            "min_price": 1200000,
-            "max_price": 4500000,
-            "rent_ratio": 0.0032
-        }
-    }
+def parse_top_k(form):
+    """Returns a TopK if the form asks for only the best top_k results, otherwise None."""
+    if not form.get('top_k'):
+        return None
+    return TopK(int(form['top_k']), form.get('top_k_by') or 'coc_return')
+
+
+def get_stream_format():
+    """Returns 'ndjson' or 'sse' if the client asked for a streamed analysis, otherwise None."""
+    requested = request.args.get('stream', request.form.get('stream', ''))
+    if requested in ('ndjson', 'sse'):
+        return requested
+
+    accept = request.headers.get('Accept', '')
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+
+def stream_analysis(zip_codes: list, parameters: dict, result_id: str,
+                    stream_format: str, top_k=None):
+    """
+    Analyzes ZIP codes and yields events as each ZIP code finishes.
+
+    Events are a 'start' event, one 'result' event per qualifying property,
+    a 'progress' event per ZIP code and a final 'done' (or 'error') event,
+    encoded as NDJSON lines or Server-Sent Events. Results are also appended
+    to the result set so the page and CSV download work afterwards. In a
+    top-K run the 'result' events for the best K follow the last 'progress'
+    event.
+    """
+
+    def encode(event):
+        data = json.dumps(event)
+        if stream_format == 'sse':
+            return f"event: {event['type']}\ndata: {data}\n\n"
+        return data + "\n"
+
+    yield encode({
+        'type': 'start',
+        'result_id': result_id,
+        'zip_count': len(zip_codes),
+        'parameters': parameters
+    })
+
+    zips_done = 0
+    result_count = 0
+    api_failures = 0
+    pruned = 0
+    rejections = circuit_breaker.get_rejection_counts()
+    zip_indexes = {zip_code: index for index, zip_code in enumerate(zip_codes)}
 
-    mid_tier_zips = {
-        "94107": {
-            "name": "SoMa, San Francisco, CA",
-            "min_price": 800000,
-            "max_price": 2000000,
-            "rent_ratio": 0.005
-        },
-        "80206": {
-            "name": "Cherry Creek, Denver, CO",
-            "min_price": 600000,
-            "max_price": 1500000,
-            "rent_ratio": 0.006
-        },
-        "98004": {
-            "name": "Bellevue, WA",
-            "min_price": 700000,
-            "max_price": 1800000,
-            "rent_ratio": 0.0055
-        },
-        "85251": {
-            "name": "Scottsdale, AZ",
-            "min_price": 450000,
-            "max_price": 1200000,
-            "rent_ratio": 0.007
-        }
-    }
+    try:
+        for index, outcome in iter_completed(
+                lambda zip_code: analyze_zip(zip_code, parameters, top_k,
+                                             zip_indexes[zip_code]),
+                zip_codes):
+            if top_k is not None:
+                top_k.add_results(outcome['results'], outcome['zip_code'],
+                                  index, outcome['positions'])
+                pruned += outcome['pruned']
+            else:
+                result_store.append_results(result_id, outcome['results'],
+                                            outcome['zip_code'])
+            result_store.append_candidates(result_id, outcome['candidates'],
+                                           outcome['zip_code'])
+            zips_done += 1
+            result_count += len(outcome['results'])
+            if outcome['used_sample']:
+                api_failures += 1
 
-    affordable_zips = {
-        "45040": {
-            "name": "Mason, OH",
-            "min_price": 180000,
-            "max_price": 450000,
-            "rent_ratio": 0.009
-        },
-        "37211": {
-            "name": "Nashville, TN",
-            "min_price": 200000,
-            "max_price": 500000,
-            "rent_ratio": 0.0095
-        },
-        "32830": {
-            "name": "Orlando, FL",
-            "min_price": 220000,
-            "max_price": 550000,
-            "rent_ratio": 0.01
-        },
-        "75019": {
-            "name": "Coppell, TX",
-            "min_price": 250000,
-            "max_price": 600000,
-            "rent_ratio": 0.008
-        }
-    }
+            # Top-K results are only known once every ZIP code is done
+            if top_k is None:
+                for result in outcome['results']:
+                    yield encode({
+                        'type': 'result',
+                        'zip_code': outcome['zip_code'],
+                        'result': result
+                    })
+
+            yield encode({
+                'type': 'progress',
+                'zip_code': outcome['zip_code'],
+                'zips_done': zips_done,
+                'zip_count': len(zip_codes),
+                'listings_scanned': outcome['listings_scanned'],
+                'used_sample': outcome['used_sample'],
+                'result_count': result_count
+            })
 
-    # Get ZIP code profile
-    if zip_code in high_end_zips:
-        zip_profile = high_end_zips[zip_code]
-        city_name = zip_profile["name"]
-        is_high_end = True
-    elif zip_code in mid_tier_zips:
-        zip_profile = mid_tier_zips[zip_code]
-        city_name = zip_profile["name"]
-        is_high_end = False
-    elif zip_code in affordable_zips:
-        zip_profile = affordable_zips[zip_code]
-        city_name = zip_profile["name"]
-        is_high_end = False
-    else:
-        # For unknown ZIPs, dynamically generate realistic values based on first digits
-        zip_first_digits = zip_code[:1]
-        if zip_first_digits in ["0", "1", "9"]:  # East and West Coast
-            min_price = 600000
-            max_price = 1500000
-            rent_ratio = 0.006
-            city_name = f"Area {zip_code}"
-            is_high_end = False
-        elif zip_first_digits in ["2", "3", "8"]:  # South
-            min_price = 250000
-            max_price = 600000
-            rent_ratio = 0.008
-            city_name = f"Area {zip_code}"
-            is_high_end = False
-        else:  # Midwest and other regions
-            min_price = 180000
-            max_price = 450000
-            rent_ratio = 0.01
-            city_name = f"Area {zip_code}"
-            is_high_end = False
-
-        zip_profile = {
-            "name": city_name,
-            "min_price": min_price,
-            "max_price": max_price,
-            "rent_ratio": rent_ratio
-        }
-
-    # Create properties that will meet the criteria
-    properties = []
-    street_suffixes = [
-        "Ave", "St", "Dr", "Blvd", "Ln", "Rd", "Way", "Circle", "Court",
-        "Place"
-    ]
-    street_names = [
-        "Main", "Oak", "Maple", "Washington", "Lincoln", "Park", "Lake",
-        "River", "Mountain", "Valley"
-    ]
-
-    # Generate 5-8 properties that will work
-    num_properties = 5 + (hash(zip_code) % 4)
-
-    for i in range(num_properties):
-        street_num = 100 + ((i + 1) * 25)
-        street_name = street_names[i % len(street_names)]
-        street_suffix = street_suffixes[i % len(street_suffixes)]
-        address = f"{street_num} {street_name} {street_suffix}, {city_name}, {zip_code}"
-
-        price_range = zip_profile["max_price"] - zip_profile["min_price"]
-        price_factor = (i + 1) / (num_properties + 1)
-        price = zip_profile["min_price"] + (price_range * price_factor)
-
-        if price < 250000:
-            bedrooms = 2 + (i % 2)
-        elif price < 600000:
-            bedrooms = 3 + (i % 2)
-        elif price < 1500000:
-            bedrooms = 3 + (i % 3)
-        else:
-            bedrooms = 4 + (i % 3)
-
-        base_rent = price * zip_profile["rent_ratio"]
-        monthly_payment = (
-            price * (1 - (down_payment / 100)) * (interest_rate / 100 / 12) *
-            (1 + (interest_rate / 100 / 12))**(loan_term * 12)) / (
-                (1 + (interest_rate / 100 / 12))**(loan_term * 12) - 1)
-
-        required_rent_for_cashflow = monthly_payment + monthly_expenses + 100
-        annual_cashflow_for_coc = (price * (down_payment / 100) *
-                                   (min_coc_return / 100))
-        monthly_cashflow_for_coc = annual_cashflow_for_coc / 12
-        required_rent_for_coc = monthly_payment + monthly_expenses + monthly_cashflow_for_coc
-
-        required_rent = max(required_rent_for_cashflow, required_rent_for_coc)
-        rent = max(base_rent, required_rent)
-        rent = round(rent / 50) * 50
-        price = round(price / 1000) * 1000
-
-        prop = {
-            "address": address,
-            "price": price,
-            "bedrooms": bedrooms,
-            "rent": rent,
-            "property_type": "Single Family",
-            "link": f"https://www.zillow.com/homes/{zip_code}_rb/",
-        }
-
-        metrics = calculate_property_metrics(prop["price"], prop["rent"],
-                                             down_payment, interest_rate,
-                                             loan_term, monthly_expenses)
-
-        if metrics['cash_on_cash_return'] >= min_coc_return * 0.5 and metrics[
-                'cash_flow'] >= 100:
-            properties.append(prop)
-
-    results = []
-    for prop in properties:
-        metrics = calculate_property_metrics(prop["price"], prop["rent"],
-                                             down_payment, interest_rate,
-                                             loan_term, monthly_expenses)
-
-        result = {
-            'address': prop["address"],
-            'price': prop["price"],
-            'bedrooms': prop["bedrooms"],
-            'rent': prop["rent"],
-            'mortgage': metrics['mortgage_payment'],
-            'cash_flow': metrics['cash_flow'],
-            'coc_return': metrics['cash_on_cash_return'],
-            'property_type': prop["property_type"],
-            'link': prop["link"]
-        }
-        results.append(result)
-
-    return results
+        if top_k is not None:
+            top_results = top_k.get_results()
+            result_store.append_results(result_id, top_results)
+            if pruned:
+                result_store.mark_not_rescorable(result_id)
+            result_count = len(top_results)
+            for result in top_results:
+                yield encode({
+                    'type': 'result',
+                    'zip_code': result['zip_code'],
+                    'result': result
+                })
+
+    except Exception as e:
+        logging.error(f"Error streaming analysis: {str(e)}")
+        yield encode({'type': 'error', 'message': str(e)})
+        return
+
+    yield encode({
+        'type': 'done',
+        'result_id': result_id,
+        'result_count': result_count,
+        'api_failures': api_failures,
+        'open_circuits': circuit_breaker.describe_rejections(rejections),
+        'results_url': url_for('results_page', result_id=result_id)
+    })
 
 
 @app.route('/analyze', methods=['POST'])
@@ -255,197 +183,115 @@ def analyze():
     is_api_request = request.headers.get('Content-Type') == 'application/json'
     # Get form data
     zip_codes = request.form.get('zip_codes', '').strip()
-    down_payment = float(request.form.get('down_payment', 15))
-    interest_rate = float(request.form.get('interest_rate', 6.5))
-    loan_term = int(request.form.get('loan_term', 30))
-    monthly_expenses = float(request.form.get('monthly_expenses', 300))
-    min_coc_return = float(request.form.get('min_coc_return', 5))
-    min_cash_flow = float(request.form.get('min_cash_flow', 100))
+    try:
+        parameters = parse_parameters(request.form)
+    except ValueError as e:
+        if is_api_request:
+            return jsonify({'message': f'Invalid parameter: {str(e)}'}), 400
+        flash(f'Invalid parameter: {str(e)}', 'danger')
+        return redirect(url_for('index'))
 
     # Validate input
     if not zip_codes:
         flash('Please enter at least one ZIP code', 'danger')
         return redirect(url_for('index'))
 
-    # Parse ZIP codes
-    zip_list = [
-        zip.strip() for zip in zip_codes.replace(',', '\n').split('\n')
-        if zip.strip()
-    ]
-    unique_zip_list = list(set(zip_list))
+    unique_zip_list = parse_zip_codes(zip_codes)
 
     if len(unique_zip_list) > 300:
         flash('Maximum 300 ZIP codes allowed', 'danger')
         return redirect(url_for('index'))
 
+    try:
+        top_k = parse_top_k(request.form)
+    except ValueError as e:
+        if is_api_request:
+            return jsonify({'message': f'Invalid top-K setting: {str(e)}'}), 400
+        flash(f'Invalid top-K setting: {str(e)}', 'danger')
+        return redirect(url_for('index'))
+
     # Store parameters in session
-    session['parameters'] = {
-        'down_payment': down_payment,
-        'interest_rate': interest_rate,
-        'loan_term': loan_term,
-        'monthly_expenses': monthly_expenses,
-        'min_coc_return': min_coc_return,
-        'min_cash_flow': min_cash_flow
-    }
+    session['parameters'] = parameters
+
+    stream_format = get_stream_format()
+    if stream_format:
+        result_id = result_store.create_result_set(parameters,
+                                                   len(unique_zip_list))
+        session['result_id'] = result_id
+        return Response(stream_with_context(
+            stream_analysis(unique_zip_list, parameters, result_id,
+                            stream_format, top_k)),
+                        mimetype='text/event-stream'
+                        if stream_format == 'sse' else 'application/x-ndjson',
+                        headers={
+                            'Cache-Control': 'no-cache',
+                            'X-Accel-Buffering': 'no'
+                        })
 
     try:
         all_results = []
         api_failures = 0
-
-        for zip_code in unique_zip_list:
-            logging.info(f"Processing ZIP code: {zip_code}")
-
-            try:
-                # First try to get real listings from API
-                cached_listings = get_cached_data(
-                    f"zillow_listings_{zip_code}")
-
-                if cached_listings:
-                    listings = cached_listings
-                    logging.debug(
-                        f"Using cached Zillow data for ZIP {zip_code}")
-                else:
-                    listings = get_zillow_listings(zip_code)
-                    if listings:
-                        cache_data(f"zillow_listings_{zip_code}", listings)
-                    else:
-                        raise Exception("No listings returned from API")
-
-                # Process each listing
-                for listing in listings:
-                    try:
-                        # Get property details
-                        home_type = listing.get('propertyType',
-                                                listing.get('homeType',
-                                                            '')).lower()
-                        property_type = "Single Family"
-                        if home_type and ('multi' in home_type):
-                            property_type = "Multifamily"
-                        elif home_type and ('condo' in home_type):
-                            property_type = "Condo"
-
-                        bedrooms = listing.get('bedrooms', 0)
-                        if not bedrooms and 'hdpData' in listing and 'homeInfo' in listing[
-                                'hdpData']:
-                            bedrooms = listing['hdpData']['homeInfo'].get(
-                                'bedrooms', 0)
-
-                        price = listing.get('price', 0)
-                        if not price and 'hdpData' in listing and 'homeInfo' in listing[
-                                'hdpData']:
-                            price = listing['hdpData']['homeInfo'].get(
-                                'price', 0)
-
-                        if isinstance(price, str):
-                            price = price.replace('$', '').replace(',', '')
-                            try:
-                                price = float(price)
-                            except (ValueError, TypeError):
-                                price = 0
-
-                        if not bedrooms:
-                            bedrooms = 3
-
-                        if not price or price < 10000:
-                            continue
-
-                        # Get rent estimate
-                        cache_key = f"rentcast_{zip_code}_{bedrooms}"
-                        cached_rent = get_cached_data(cache_key)
-
-                        if cached_rent:
-                            rent = cached_rent
-                        else:
-                            rent = get_rent_estimate(zip_code, bedrooms)
-                            if rent:
-                                cache_data(cache_key, rent)
-                            else:
-                                rent = 1000  # Fallback value
-
-                        # Calculate metrics
-                        metrics = calculate_property_metrics(
-                            price, rent, down_payment, interest_rate,
-                            loan_term, monthly_expenses)
-
-                        # Check criteria
-                        high_end_zip_prefixes = [
-                            '902', '904', '945', '100', '101', '941'
-                        ]
-                        is_high_end_zip = any(
-                            zip_code.startswith(prefix)
-                            for prefix in high_end_zip_prefixes)
-
-                        min_coc_for_zip = min_coc_return * 0.5 if is_high_end_zip else min_coc_return
-                        min_cash_flow_for_zip = min_cash_flow * 0.5 if is_high_end_zip else min_cash_flow
-
-                        if metrics[
-                                'cash_on_cash_return'] < min_coc_for_zip or metrics[
-                                    'cash_flow'] < min_cash_flow_for_zip:
-                            continue
-
-                        # Create result
-                        street = listing.get('streetAddress',
-                                             listing.get('address', ''))
-                        city = listing.get('city', '')
-                        state = listing.get('state', '')
-
-                        address_parts = []
-                        if street: address_parts.append(street)
-                        if city: address_parts.append(city)
-                        if state: address_parts.append(state)
-                        address_parts.append(zip_code)
-
-                        full_address = ", ".join(
-                            [part for part in address_parts if part])
-                        if not full_address:
-                            full_address = f"Property in {zip_code}"
-
-                        result = {
-                            'address':
-                            full_address,
-                            'price':
-                            price,
-                            'bedrooms':
-                            bedrooms,
-                            'rent':
-                            rent,
-                            'mortgage':
-                            metrics['mortgage_payment'],
-                            'cash_flow':
-                            metrics['cash_flow'],
-                            'coc_return':
-                            metrics['cash_on_cash_return'],
-                            'property_type':
-                            property_type,
-                            'link':
-                            listing.get('detailUrl',
-                                        listing.get('imgSrc', '#'))
-                        }
-
-                        all_results.append(result)
-
-                    except Exception as e:
-                        print(e)
-
-            except Exception as api_error:
-                logging.warning(
-                    f"API failed for {zip_code}, using sample properties: {str(api_error)}"
-                )
-                api_failures += 1
-                # Fall back to sample properties
-                properties = get_sample_properties(zip_code, min_coc_return,
-                                                   down_payment, interest_rate,
-                                                   loan_term, monthly_expenses)
-                all_results.extend(properties)
-
-        # Store results in session
-        session['results'] = all_results
+        rejections = circuit_breaker.get_rejection_counts()
+
+        if top_k is not None:
+            # Only the heap is kept in memory; each ZIP's outcome is dropped once merged
+            result_id = result_store.create_result_set(parameters,
+                                                       len(unique_zip_list))
+            zip_indexes = {
+                zip_code: index
+                for index, zip_code in enumerate(unique_zip_list)
+            }
+            pruned = 0
+            for index, outcome in iter_completed(
+                    lambda zip_code: analyze_zip(zip_code, parameters, top_k,
+                                                 zip_indexes[zip_code]),
+                    unique_zip_list):
+                if outcome['used_sample']:
+                    api_failures += 1
+                top_k.add_results(outcome['results'], outcome['zip_code'],
+                                  index, outcome['positions'])
+                pruned += outcome['pruned']
+                result_store.append_candidates(result_id,
+                                               outcome['candidates'],
+                                               outcome['zip_code'])
+            all_results = top_k.get_results()
+            result_store.append_results(result_id, all_results)
+            if pruned:
+                # The pruned listings have no rent, so the run cannot be re-scored
+                result_store.mark_not_rescorable(result_id)
+            logging.info(
+                f"Top {top_k.k} run skipped rent lookups for {top_k.skipped} listings")
+        else:
+            zip_outcomes = run_ordered(
+                lambda zip_code: analyze_zip(zip_code, parameters),
+                unique_zip_list)
+
+            # Results are kept server-side; the session only holds the result set ID
+            result_id = result_store.create_result_set(parameters,
+                                                       len(unique_zip_list))
+            for outcome in zip_outcomes:
+                if outcome['used_sample']:
+                    api_failures += 1
+                all_results.extend(outcome['results'])
+                result_store.append_results(result_id, outcome['results'],
+                                            outcome['zip_code'])
+                result_store.append_candidates(result_id,
+                                               outcome['candidates'],
+                                               outcome['zip_code'])
+
+        session['result_id'] = result_id
 
         if api_failures > 0:
             flash(
                 f"Used sample data for {api_failures} ZIP codes where API failed",
                 'warning')
 
+        open_circuits = circuit_breaker.describe_rejections(rejections)
+        if open_circuits:
+            flash(
+                f"Fallback data was used while these APIs were failing: {'; '.join(open_circuits)}",
+                'warning')
+
         if not all_results:
             if is_api_request:
                 return jsonify({'message': 'No properties matched your criteria'}), 404
@@ -460,7 +306,8 @@ def analyze():
             })
 
         return render_template('results.html',
-                               results=all_results,
+                               result_id=result_id,
+                               result_count=len(all_results),
                                parameters=session['parameters'],
                                zip_count=len(unique_zip_list))
 
@@ -471,38 +318,288 @@ def analyze():
         return redirect(url_for('index'))
 
 
+@app.route('/results', methods=['GET'])
+def results_page():
+    result_set = result_store.get_result_set(
+        request.args.get('result_id') or session.get('result_id'))
+
+    if not result_set:
+        flash('These results have expired. Please run the search again.',
+              'warning')
+        return redirect(url_for('index'))
+
+    session['result_id'] = result_set['id']
+    return render_template('results.html',
+                           result_id=result_set['id'],
+                           result_count=result_set['result_count'],
+                           parameters=result_set['parameters'],
+                           zip_count=result_set['zip_count'],
+                           rescorable=result_set['rescorable'])
+
+
 @app.route('/download-csv', methods=['GET'])
 def download_csv():
-    results = session.get('results', [])
+    result_set = result_store.get_result_set(session.get('result_id'))
 
-    if not results:
+    if not result_set or not result_set['result_count']:
         flash('No results to download', 'warning')
         return redirect(url_for('index'))
 
-    # Create a CSV string
-    output = StringIO()
-    fieldnames = [
-        'address', 'price', 'bedrooms', 'rent', 'mortgage', 'cash_flow',
-        'coc_return', 'property_type', 'link'
-    ]
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
+    # Optional column selection, e.g. ?columns=address,price,coc_return
+    available_columns = result_store.RESULT_FIELDS + ['zip_code']
+    columns = [
+        column.strip()
+        for column in request.args.get('columns', '').split(',')
+        if column.strip()
+    ] or result_store.RESULT_FIELDS
+    unknown_columns = [c for c in columns if c not in available_columns]
+    if unknown_columns:
+        flash(f"Unknown CSV columns: {', '.join(unknown_columns)}", 'warning')
+        return redirect(url_for('index'))
 
-    for result in results:
-        writer.writerow(result)
+    # Rows are formatted as they are read from the result store
+    chunks = iter_csv(result_store.iter_results(result_set['id']), columns)
+    filename = f'rental_properties_{datetime.now().strftime("%Y%m%d")}.csv'
+    mimetype = 'text/csv'
+
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
 
     # Create response
-    response = Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={
-            'Content-Disposition':
-            f'attachment;filename=rental_properties_{datetime.now().strftime("%Y%m%d")}.csv'
-        })
+    response = Response(stream_with_context(chunks),
+                        mimetype=mimetype,
+                        headers={
+                            'Content-Disposition':
+                            f'attachment;filename={filename}'
+                        })
 
     return response
 
 
+def optional_float(value):
+    """Converts a query string value to float, treating blanks as missing."""
+    if value is None or value.strip() == '':
+        return None
+    return float(value)
+
+
+@app.route('/results/data', methods=['GET'])
+def results_data():
+    args = request.args
+    result_set = result_store.get_result_set(
+        args.get('result_id') or session.get('result_id'))
+    if not result_set:
+        return jsonify({'message': 'Result set not found or expired'}), 404
+
+    # Accept both plain parameters and DataTables server-side parameters
+    sort = args.get('sort')
+    direction = args.get('dir')
+    if sort is None and 'order[0][column]' in args:
+        sort = args.get(f"columns[{args.get('order[0][column]')}][data]")
+        direction = args.get('order[0][dir]')
+    sort = sort or 'coc_return'
+    direction = direction or 'desc'
+
+    try:
+        draw = int(args.get('draw', 0))
+        offset = max(int(args.get('offset', args.get('start', 0))), 0)
+        # DataTables asks for every row with length=-1
+        limit = int(args.get('limit', args.get('length', 25)))
+        limit = 1000 if limit < 0 else min(limit, 1000)
+        after = json.loads(args['after']) if args.get('after') else None
+        page = result_store.query_results(
+            result_set['id'],
+            sort=sort,
+            descending=direction.lower() != 'asc',
+            offset=offset,
+            limit=limit,
+            after=after,
+            min_coc_return=optional_float(args.get('min_coc_return')),
+            min_cash_flow=optional_float(args.get('min_cash_flow')),
+            max_price=optional_float(args.get('max_price')),
+            property_type=args.get('property_type') or None,
+            zip_code=args.get('zip_code') or None,
+            search=args.get('search[value]', args.get('search')) or None)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': page['total'],
+        'recordsFiltered': page['filtered'],
+        'data': page['rows'],
+        'next_cursor': page['next_cursor']
+    })
+
+
+@app.route('/results/rescore', methods=['POST'])
+def rescore_results():
+    submitted = request.get_json(silent=True) or request.form
+    result_set = result_store.get_result_set(
+        submitted.get('result_id') or session.get('result_id'))
+    if not result_set:
+        return jsonify({'message': 'Result set not found or expired'}), 404
+    if not result_set['rescorable']:
+        return jsonify({
+            'message': 'This top-K run skipped listings and cannot be re-scored'
+        }), 409
+
+    # Parameters that are not submitted keep the values of the original run
+    try:
+        parameters = parse_parameters({
+            **result_set['parameters'],
+            **{key: value for key, value in submitted.items() if value != ''}
+        })
+        limit = int(submitted.get('limit', 50))
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': f'Invalid parameter: {str(e)}'}), 400
+
+    if limit < 0:
+        return jsonify({'message': 'Invalid parameter: limit must not be negative'}), 400
+    limit = min(limit, 1000)
+
+    save = str(submitted.get('save', '')).lower() in ('1', 'true')
+    outcome = rescore.rescore(result_set['id'], parameters,
+                              limit=None if save else limit)
+
+    response = {
+        'result_id': result_set['id'],
+        'parameters': parameters,
+        'candidate_count': outcome['candidate_count'],
+        'match_count': outcome['match_count'],
+        'summary': outcome['summary'],
+        'results': outcome['results'][:limit]
+    }
+
+    if save:
+        # Store the re-scored run as a new result set and make it current
+        new_id = result_store.create_result_set(parameters,
+                                                result_set['zip_count'])
+        result_store.append_results(new_id, outcome['results'])
+        result_store.copy_candidates(result_set['id'], new_id)
+        session['parameters'] = parameters
+        session['result_id'] = new_id
+        response['result_id'] = new_id
+        response['results_url'] = url_for('results_page', result_id=new_id)
+
+    return jsonify(response)
+
+
+@app.route('/listings/search', methods=['GET'])
+def search_listings():
+    # Screens every listing fetched so far without calling the APIs
+    args = request.args
+    try:
+        min_bedrooms = optional_float(args.get('min_bedrooms'))
+        max_bedrooms = optional_float(args.get('max_bedrooms'))
+        seen_within_days = optional_float(args.get('seen_within_days'))
+        property_types = [
+            property_type.strip()
+            for value in args.getlist('property_type')
+            for property_type in value.split(',') if property_type.strip()
+        ]
+        page = warehouse.search_listings(
+            zip_codes=parse_zip_codes(args.get('zip_codes', '')),
+            min_price=optional_float(args.get('min_price')),
+            max_price=optional_float(args.get('max_price')),
+            min_bedrooms=min_bedrooms,
+            max_bedrooms=max_bedrooms,
+            property_types=property_types,
+            seen_within_days=seen_within_days,
+            sort=args.get('sort', 'price'),
+            descending=args.get('dir', 'asc').lower() == 'desc',
+            offset=max(int(args.get('offset', 0)), 0),
+            limit=min(max(int(args.get('limit', 100)), 0), 1000))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify(page)
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    zip_codes = request.form.get('zip_codes', '').strip()
+    if not zip_codes:
+        return jsonify({'message': 'Please enter at least one ZIP code'}), 400
+
+    unique_zip_list = parse_zip_codes(zip_codes)
+    if len(unique_zip_list) > jobs.JOB_MAX_ZIPS:
+        return jsonify(
+            {'message': f'Maximum {jobs.JOB_MAX_ZIPS} ZIP codes allowed'}), 400
+
+    try:
+        parameters = parse_parameters(request.form)
+    except ValueError as e:
+        return jsonify({'message': f'Invalid parameter: {str(e)}'}), 400
+
+    job_id = jobs.submit_job(unique_zip_list, parameters)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('job_status', job_id=job_id),
+        'results_url': url_for('job_results', job_id=job_id)
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'message': 'Job not found'}), 404
+
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'zips_done': job['zips_done'],
+        'zip_count': job['zip_count'],
+        'parameters': job['parameters'],
+        'results': jobs.get_job_results(job_id)
+    })
+
+
+@app.route('/usage', methods=['GET'])
+def usage():
+    month = request.args.get('month')
+    return jsonify(get_usage_report(month))
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    # ?storage=1 adds a breakdown of the persistent cache by namespace and age
+    if request.args.get('storage') in ('1', 'true'):
+        return jsonify(get_storage_report())
+    return jsonify(get_cache_stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Process-local cache counters are exported as gauges next to the span metrics
+    cache_counts = get_cache_stats()
+    gauges = {
+        'app_cache_lookups': ('Cache lookups by tier and outcome in this process.', {
+            (('tier', tier), ('outcome', outcome)): counts[outcome]
+            for tier, counts in cache_counts.items()
+            for outcome in ('hits', 'misses')
+        }),
+        'app_circuit_state': ('Circuit breaker state (0 closed, 1 half-open, 2 open).', {
+            (('provider', provider), ('endpoint', endpoint)):
+            circuit_breaker.STATE_VALUES[state['state']]
+            for (provider, endpoint), state in circuit_breaker.get_breaker_states().items()
+        })
+    }
+    return Response(metrics.render_metrics(gauges),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
@@ -513,5 +610,9 @@ def server_error(e):
     return render_template('500.html'), 500
 
 
+# Pick up queued jobs, including ones interrupted by a restart
+jobs.start_workers(analyze_zip)
+warmer.start_scheduler()
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+A local stand-in for the Zillow (RapidAPI) and RentCast endpoints.
+
+Listings are built from the Zillow payloads bundled in cache/, re-keyed per
+ZIP code so every ZIP returns its own stable set of realistic listings.
+Latency, error rates and the share of RentCast combinations that 404 are
+configurable, and all responses are deterministic for a given seed.
+
+Run it on its own with:
+
+    python -m benchmarks.mock_server --port 8765 --latency-ms 50
+
+and point the app at it with ZILLOW_BASE_URL=http://127.0.0.1:8765 and
+RENTCAST_BASE_URL=http://127.0.0.1:8765.
+"""
+import os
+import json
+import glob
+import time
+import random
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+
+# Zillow's search endpoints return 41 listings per page
+PAGE_SIZE = 41
+
+RENTCAST_BASE_RENTS = {1: 950, 2: 1200, 3: 1500, 4: 1800, 5: 2100}
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the stand-in server."""
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    error_rate: float = 0.0
+    not_found_rate: float = 0.3
+    listings_per_zip: int = 40
+    seed: int = 1
+
+
+def load_templates() -> List[Dict[str, Any]]:
+    """Returns the raw Zillow listings bundled in cache/zillow_listings_*.json."""
+    templates = []
+    for path in sorted(glob.glob(os.path.join(CACHE_DIR, "zillow_listings_*.json"))):
+        with open(path, 'r') as f:
+            templates.extend(json.load(f).get('data') or [])
+    return templates
+
+
+def stable_random(config: MockConfig, *parts: Any) -> random.Random:
+    """Returns a random generator seeded by the config seed and the given parts."""
+    digest = hashlib.sha256(":".join(map(str, (config.seed, ) + parts)).encode()).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+class MockAPI:
+    """Generates responses and counts requests per endpoint."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.templates = load_templates()
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.listings = {}
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def get_request_counts(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.requests)
+
+    def reset_counts(self) -> None:
+        with self.lock:
+            self.requests.clear()
+
+    def get_listings(self, zip_code: str) -> List[Dict[str, Any]]:
+        """Returns the listings of a ZIP code, building them on first use."""
+        with self.lock:
+            listings = self.listings.get(zip_code)
+        if listings is not None:
+            return listings
+
+        rng = stable_random(self.config, "listings", zip_code)
+        listings = []
+        for i in range(self.config.listings_per_zip):
+            listing = dict(rng.choice(self.templates))
+            listing['zpid'] = f"{zip_code}{i:05d}"
+            listing['address'] = f"{100 + i} Benchmark St, Testville, OH {zip_code}"
+            listing['bedrooms'] = listing.get('bedrooms') or rng.randint(1, 5)
+            listing['price'] = rng.randrange(60000, 600000, 500)
+            listings.append(listing)
+
+        with self.lock:
+            self.listings[zip_code] = listings
+        return listings
+
+    def search(self, params: Dict[str, str]) -> Dict[str, Any]:
+        listings = self.get_listings(params.get('location', ''))
+        page = max(int(params.get('page', 1)), 1)
+        total_pages = max((len(listings) + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+        return {
+            'props': listings[(page - 1) * PAGE_SIZE:page * PAGE_SIZE],
+            'resultsPerPage': PAGE_SIZE,
+            'totalPages': total_pages,
+            'totalResultCount': len(listings)
+        }
+
+    def rent(self, params: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """Returns a rent estimate, or None for combinations that do not exist."""
+        zip_code = params.get('zip', '')
+        bedrooms = int(params.get('bedrooms', 3))
+        property_type = params.get('propertyType', '')
+
+        rng = stable_random(self.config, "rent", zip_code, bedrooms, property_type)
+        if rng.random() < self.config.not_found_rate:
+            return None
+
+        rent = RENTCAST_BASE_RENTS.get(bedrooms, 1500) * rng.uniform(0.8, 1.4)
+        return {'rent': round(rent, 2), 'rentRangeLow': round(rent * 0.9, 2),
+                'rentRangeHigh': round(rent * 1.1, 2)}
+
+
+def make_handler(api: MockAPI):
+    """Returns a request handler class bound to a MockAPI."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, status: int, body: Any) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            config = api.config
+            api.count(url.path)
+
+            delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+            time.sleep(max(delay, 0) / 1000)
+
+            if config.error_rate and random.random() < config.error_rate:
+                self.send_json(503, {'message': 'Service unavailable'})
+                return
+
+            if url.path in ("/propertyExtendedSearch", "/properties/list-for-sale"):
+                self.send_json(200, api.search(params))
+            elif url.path == "/v1/avm/rent/zip":
+                estimate = api.rent(params)
+                if estimate is None:
+                    self.send_json(404, {'message': 'No data'})
+                else:
+                    self.send_json(200, estimate)
+            else:
+                self.send_json(404, {'message': f'Unknown path {url.path}'})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_server(config: MockConfig, port: int = 0):
+    """
+    Starts the stand-in server on a background thread.
+
+    Args:
+        config: The server behaviour.
+        port: The port to listen on (0 picks a free port).
+
+    Returns:
+        The server (whose base URL is http://127.0.0.1:<server.server_port>) and its MockAPI.
+    """
+    api = MockAPI(config)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+    return server, api
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.mock_server",
+                                     description="Stand-in Zillow/RentCast server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=MockConfig.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--not-found-rate", type=float, default=MockConfig.not_found_rate)
+    parser.add_argument("--listings-per-zip", type=int, default=MockConfig.listings_per_zip)
+    parser.add_argument("--seed", type=int, default=MockConfig.seed)
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                        args.not_found_rate, args.listings_per_zip, args.seed)
+    server, _ = start_server(config, args.port)
+    print(f"Serving mock Zillow/RentCast API on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,227 @@
+"""
+Offline benchmarks for the analysis pipeline.
+
+Starts the stand-in API server, points the app at it with throwaway cache
+and result databases, and measures:
+
+- /analyze wall time for 1, 50 and 300 ZIP codes with a cold cache, a warm
+  persistent cache (memory tier cleared) and a warm memory tier
+- calculator throughput, scalar loop versus batch, at the same sizes
+
+Results are written to benchmarks/results/latest.json and compared with
+benchmarks/results/baseline.json; timings slower than the baseline by more
+than --tolerance are reported as regressions (exit status 1).
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1,50 --latency-ms 50 --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from benchmarks.mock_server import MockConfig, start_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+LATEST_PATH = os.path.join(RESULTS_DIR, "latest.json")
+
+ANALYZE_FORM = {
+    'down_payment': '15',
+    'interest_rate': '6.5',
+    'loan_term': '30',
+    'monthly_expenses': '300',
+    'min_coc_return': '5',
+    'min_cash_flow': '100'
+}
+
+
+def configure_environment(base_url: str, work_dir: str) -> None:
+    """Points the app at the stand-in server and throwaway databases. Must run before importing app."""
+    os.environ.update({
+        "ZILLOW_BASE_URL": base_url,
+        "RENTCAST_BASE_URL": base_url,
+        "ZILLOW_API_KEY": "benchmark",
+        "RENTCAST_API_KEY": "benchmark",
+        # Measure the pipeline, not the production rate limits
+        "ZILLOW_RATE_LIMIT": "0",
+        "RENTCAST_RATE_LIMIT": "0",
+        "HTTP_BACKOFF_BASE": "0.01",
+        "CACHE_BACKEND": "sqlite",
+        "CACHE_DB_PATH": os.path.join(work_dir, "cache.db"),
+        "RESULTS_DB_PATH": os.path.join(work_dir, "results.db"),
+        "JOBS_DB_PATH": os.path.join(work_dir, "jobs.db"),
+        "WAREHOUSE_DB_PATH": os.path.join(work_dir, "warehouse.db"),
+        "RENT_PROBES_DB_PATH": os.path.join(work_dir, "rent_probes.db"),
+        "API_USAGE_DB": os.path.join(work_dir, "api_usage.db"),
+        "JOB_WORKERS": "0",
+        "WARM_WATCHLIST": "",
+        "WARM_WATCHLIST_FILE": "",
+    })
+
+
+def bench_analyze(client, api, zip_codes: List[str]) -> Dict[str, Any]:
+    """Posts one /analyze request and returns its timing and upstream request counts."""
+    from utils import result_store
+
+    api.reset_counts()
+    started = time.perf_counter()
+    response = client.post('/analyze', data={**ANALYZE_FORM, 'zip_codes': '\n'.join(zip_codes)})
+    seconds = time.perf_counter() - started
+
+    with client.session_transaction() as session:
+        result_set = result_store.get_result_set(session.get('result_id'))
+
+    upstream = api.get_request_counts()
+    return {
+        'status': response.status_code,
+        'seconds': round(seconds, 4),
+        'zips_per_second': round(len(zip_codes) / seconds, 2),
+        'results': result_set['result_count'] if result_set else 0,
+        'upstream_requests': sum(upstream.values()),
+        'upstream_by_path': upstream
+    }
+
+
+def bench_calculator(rows: int, repeat: int = 3) -> Dict[str, Any]:
+    """Times the scalar calculator in a loop against the batch calculator."""
+    from utils.calculator import calculate_property_metrics, calculate_property_metrics_batch
+
+    rng = random.Random(rows)
+    prices = [rng.randrange(60000, 600000, 500) for _ in range(rows)]
+    rents = [rng.uniform(800, 3000) for _ in range(rows)]
+
+    def best_of(func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    scalar = best_of(lambda: [calculate_property_metrics(price, rent, 15, 6.5, 30, 300)
+                              for price, rent in zip(prices, rents)])
+    batch = best_of(lambda: calculate_property_metrics_batch(prices, rents, 15, 6.5, 30, 300))
+    return {
+        'rows': rows,
+        'scalar_seconds': round(scalar, 6),
+        'batch_seconds': round(batch, 6),
+        'scalar_rows_per_second': round(rows / scalar),
+        'batch_rows_per_second': round(rows / batch)
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a description of every timing that is slower than the baseline by more than tolerance."""
+    regressions = []
+
+    for size, scenarios in results['analyze'].items():
+        for scenario, outcome in scenarios.items():
+            previous = baseline.get('analyze', {}).get(size, {}).get(scenario)
+            if previous and outcome['seconds'] > previous['seconds'] * (1 + tolerance):
+                regressions.append(f"analyze {size} ZIPs {scenario}: {outcome['seconds']}s "
+                                   f"(baseline {previous['seconds']}s)")
+
+    for size, outcome in results['calculator'].items():
+        previous = baseline.get('calculator', {}).get(size)
+        if previous and outcome['batch_seconds'] > previous['batch_seconds'] * (1 + tolerance):
+            regressions.append(f"calculator {outcome['rows']} rows: {outcome['batch_seconds']}s "
+                               f"(baseline {previous['batch_seconds']}s)")
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Offline benchmarks")
+    parser.add_argument("--sizes", default="1,50,300", help="comma separated ZIP counts")
+    parser.add_argument("--latency-ms", type=float, default=MockConfig.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=MockConfig.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=MockConfig.error_rate)
+    parser.add_argument("--not-found-rate", type=float, default=MockConfig.not_found_rate)
+    parser.add_argument("--listings-per-zip", type=int, default=MockConfig.listings_per_zip)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    config = MockConfig(args.latency_ms, args.jitter_ms, args.error_rate,
+                        args.not_found_rate, args.listings_per_zip)
+    server, api = start_server(config)
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    configure_environment(f"http://127.0.0.1:{server.server_port}", work_dir)
+
+    import logging
+    import app as application
+    from utils import cache
+
+    logging.getLogger().setLevel(logging.WARNING)
+    client = application.app.test_client()
+
+    results = {
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mock': vars(config),
+        'analyze': {},
+        'calculator': {}
+    }
+
+    # Every size gets its own ZIP codes so its cold run really is cold
+    next_zip = 10000
+    for size in sizes:
+        zip_codes = [str(next_zip + i) for i in range(size)]
+        next_zip += size
+
+        cold = bench_analyze(client, api, zip_codes)
+        cache._memory_cache.clear()
+        warm_persistent = bench_analyze(client, api, zip_codes)
+        warm_memory = bench_analyze(client, api, zip_codes)
+        results['analyze'][str(size)] = {
+            'cold': cold,
+            'warm_persistent': warm_persistent,
+            'warm_memory': warm_memory
+        }
+        print(f"/analyze {size:>4} ZIPs: cold {cold['seconds']:.3f}s "
+              f"({cold['upstream_requests']} upstream), warm persistent "
+              f"{warm_persistent['seconds']:.3f}s, warm memory {warm_memory['seconds']:.3f}s")
+
+    for size in sizes:
+        outcome = bench_calculator(size * args.listings_per_zip)
+        results['calculator'][str(size)] = outcome
+        print(f"calculator {outcome['rows']:>6} rows: scalar {outcome['scalar_rows_per_second']:,} rows/s, "
+              f"batch {outcome['batch_rows_per_second']:,} rows/s")
+
+    server.shutdown()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(LATEST_PATH, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded; run with --save-baseline to create one")
+        return 0
+
+    with open(BASELINE_PATH, 'r') as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print("No regressions against the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+// Streams /analyze results into the page as each ZIP code finishes
+
+function formatLiveMoney(value) {
+  return '$' + Number(value).toLocaleString(undefined, {maximumFractionDigits: 0});
+}
+
+function appendLiveRow(tbody, result) {
+  const row = document.createElement('tr');
+  const cells = [
+    result.address,
+    formatLiveMoney(result.price),
+    result.bedrooms,
+    formatLiveMoney(result.rent),
+    formatLiveMoney(result.mortgage),
+    formatLiveMoney(result.cash_flow),
+    Number(result.coc_return).toFixed(1) + '%',
+    result.property_type
+  ];
+  cells.forEach(function(value) {
+    const cell = document.createElement('td');
+    cell.textContent = value;
+    row.appendChild(cell);
+  });
+  tbody.appendChild(row);
+}
+
+function handleLiveEvent(event, elements) {
+  if (event.type === 'start') {
+    elements.status.textContent = 'Analyzing ' + event.zip_count + ' ZIP codes...';
+  } else if (event.type === 'result') {
+    appendLiveRow(elements.tbody, event.result);
+  } else if (event.type === 'progress') {
+    elements.progress.max = event.zip_count;
+    elements.progress.value = event.zips_done;
+    elements.status.textContent = event.zips_done + ' of ' + event.zip_count + ' ZIP codes done, ' +
+      event.result_count + ' matching properties';
+  } else if (event.type === 'done') {
+    elements.status.textContent = 'Done: ' + event.result_count + ' matching properties.';
+    if (event.api_failures > 0) {
+      elements.status.textContent += ' Used sample data for ' + event.api_failures + ' ZIP codes where API failed.';
+    }
+    if (event.open_circuits && event.open_circuits.length > 0) {
+      elements.status.textContent += ' Fallback data was used while these APIs were failing: ' +
+        event.open_circuits.join('; ') + '.';
+    }
+    elements.link.href = event.results_url;
+    elements.link.style.display = 'inline-flex';
+  } else if (event.type === 'error') {
+    elements.status.textContent = 'An error occurred while analyzing properties: ' + event.message;
+  }
+}
+
+function initLiveResults() {
+  const form = document.getElementById('analyze-form');
+  const toggle = document.getElementById('live_results');
+  const container = document.getElementById('live-results');
+  if (!form || !toggle || !container || !window.fetch || !window.ReadableStream) {
+    return;
+  }
+
+  form.addEventListener('submit', function(submitEvent) {
+    if (!toggle.checked) {
+      return;
+    }
+    submitEvent.preventDefault();
+
+    const elements = {
+      status: document.getElementById('live-status'),
+      progress: document.getElementById('live-progress'),
+      tbody: document.querySelector('#live-results-table tbody'),
+      link: document.getElementById('live-results-link')
+    };
+    elements.tbody.innerHTML = '';
+    elements.progress.value = 0;
+    elements.link.style.display = 'none';
+    container.style.display = 'block';
+
+    fetch(form.action, {
+      method: 'POST',
+      body: new FormData(form),
+      headers: {'Accept': 'application/x-ndjson'}
+    }).then(function(response) {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      function read() {
+        return reader.read().then(function(chunk) {
+          buffer += decoder.decode(chunk.value || new Uint8Array(), {stream: !chunk.done});
+          const lines = buffer.split('\n');
+          buffer = lines.pop();
+          lines.forEach(function(line) {
+            if (line.trim()) {
+              handleLiveEvent(JSON.parse(line), elements);
+            }
+          });
+          if (!chunk.done) {
+            return read();
+          }
+        });
+      }
+
+      return read();
+    }).catch(function(error) {
+      elements.status.textContent = 'An error occurred while analyzing properties: ' + error;
+    });
+  });
+}
+
+document.addEventListener('DOMContentLoaded', initLiveResults);
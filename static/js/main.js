@@ -44,6 +44,10 @@ function initThemeToggle() {
 // Function to initialize datatables if they exist on the page
 function initDataTables() {
   if (typeof jQuery !== 'undefined' && typeof jQuery.fn.DataTable !== 'undefined' && document.getElementById('results-table')) {
+    // Pages that configure the table themselves (e.g. server-side processing) win
+    if (jQuery.fn.DataTable.isDataTable('#results-table')) {
+      return;
+    }
     jQuery('#results-table').DataTable({
       order: [[6, 'desc']], // Sort by CoC Return by default
       responsive: true,
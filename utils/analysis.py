@@ -0,0 +1,428 @@
+import math
+import logging
+
+from utils.calculator import calculate_property_metrics_batch
+from utils.fetchers import fetch_listings, fetch_rent_grid
+
+
+def get_sample_properties(zip_code: str, min_coc_return: float,
+                          down_payment: float, interest_rate: float,
+                          loan_term: int, monthly_expenses: float):
+    """Fallback function to generate sample properties when API calls fail"""
+    logging.info(f"Using sample properties for ZIP: {zip_code}")
+
+    # Different property prices and rents based on region type
+    high_end_zips = {
+        "90210": {
+            "name": "Beverly Hills, CA",
+            "min_price": 1500000,
+            "max_price": 5500000,
+            "rent_ratio": 0.004
+        },
+        "90402": {
+            "name": "Santa Monica, CA",
+            "min_price": 1400000,
+            "max_price": 4800000,
+            "rent_ratio": 0.0035
+        },
+        "10013": {
+            "name": "Tribeca, NY",
+            "min_price": 1300000,
+            "max_price": 5000000,
+            "rent_ratio": 0.003
+        },
+        "94104": {
+            "name": "San Francisco, CA",
+            "min_price": 1200000,
+            "max_price": 4500000,
+            "rent_ratio": 0.0032
+        }
+    }
+
+    mid_tier_zips = {
+        "94107": {
+            "name": "SoMa, San Francisco, CA",
+            "min_price": 800000,
+            "max_price": 2000000,
+            "rent_ratio": 0.005
+        },
+        "80206": {
+            "name": "Cherry Creek, Denver, CO",
+            "min_price": 600000,
+            "max_price": 1500000,
+            "rent_ratio": 0.006
+        },
+        "98004": {
+            "name": "Bellevue, WA",
+            "min_price": 700000,
+            "max_price": 1800000,
+            "rent_ratio": 0.0055
+        },
+        "85251": {
+            "name": "Scottsdale, AZ",
+            "min_price": 450000,
+            "max_price": 1200000,
+            "rent_ratio": 0.007
+        }
+    }
+
+    affordable_zips = {
+        "45040": {
+            "name": "Mason, OH",
+            "min_price": 180000,
+            "max_price": 450000,
+            "rent_ratio": 0.009
+        },
+        "37211": {
+            "name": "Nashville, TN",
+            "min_price": 200000,
+            "max_price": 500000,
+            "rent_ratio": 0.0095
+        },
+        "32830": {
+            "name": "Orlando, FL",
+            "min_price": 220000,
+            "max_price": 550000,
+            "rent_ratio": 0.01
+        },
+        "75019": {
+            "name": "Coppell, TX",
+            "min_price": 250000,
+            "max_price": 600000,
+            "rent_ratio": 0.008
+        }
+    }
+
+    # Get ZIP code profile
+    if zip_code in high_end_zips:
+        zip_profile = high_end_zips[zip_code]
+        city_name = zip_profile["name"]
+        is_high_end = True
+    elif zip_code in mid_tier_zips:
+        zip_profile = mid_tier_zips[zip_code]
+        city_name = zip_profile["name"]
+        is_high_end = False
+    elif zip_code in affordable_zips:
+        zip_profile = affordable_zips[zip_code]
+        city_name = zip_profile["name"]
+        is_high_end = False
+    else:
+        # For unknown ZIPs, dynamically generate realistic values based on first digits
+        zip_first_digits = zip_code[:1]
+        if zip_first_digits in ["0", "1", "9"]:  # East and West Coast
+            min_price = 600000
+            max_price = 1500000
+            rent_ratio = 0.006
+            city_name = f"Area {zip_code}"
+            is_high_end = False
+        elif zip_first_digits in ["2", "3", "8"]:  # South
+            min_price = 250000
+            max_price = 600000
+            rent_ratio = 0.008
+            city_name = f"Area {zip_code}"
+            is_high_end = False
+        else:  # Midwest and other regions
+            min_price = 180000
+            max_price = 450000
+            rent_ratio = 0.01
+            city_name = f"Area {zip_code}"
+            is_high_end = False
+
+        zip_profile = {
+            "name": city_name,
+            "min_price": min_price,
+            "max_price": max_price,
+            "rent_ratio": rent_ratio
+        }
+
+    # Create properties that will meet the criteria
+    properties = []
+    street_suffixes = [
+        "Ave", "St", "Dr", "Blvd", "Ln", "Rd", "Way", "Circle", "Court",
+        "Place"
+    ]
+    street_names = [
+        "Main", "Oak", "Maple", "Washington", "Lincoln", "Park", "Lake",
+        "River", "Mountain", "Valley"
+    ]
+
+    # Generate 5-8 properties that will work
+    num_properties = 5 + (hash(zip_code) % 4)
+
+    for i in range(num_properties):
+        street_num = 100 + ((i + 1) * 25)
+        street_name = street_names[i % len(street_names)]
+        street_suffix = street_suffixes[i % len(street_suffixes)]
+        address = f"{street_num} {street_name} {street_suffix}, {city_name}, {zip_code}"
+
+        price_range = zip_profile["max_price"] - zip_profile["min_price"]
+        price_factor = (i + 1) / (num_properties + 1)
+        price = zip_profile["min_price"] + (price_range * price_factor)
+
+        if price < 250000:
+            bedrooms = 2 + (i % 2)
+        elif price < 600000:
+            bedrooms = 3 + (i % 2)
+        elif price < 1500000:
+            bedrooms = 3 + (i % 3)
+        else:
+            bedrooms = 4 + (i % 3)
+
+        base_rent = price * zip_profile["rent_ratio"]
+        monthly_payment = (
+            price * (1 - (down_payment / 100)) * (interest_rate / 100 / 12) *
+            (1 + (interest_rate / 100 / 12))**(loan_term * 12)) / (
+                (1 + (interest_rate / 100 / 12))**(loan_term * 12) - 1)
+
+        required_rent_for_cashflow = monthly_payment + monthly_expenses + 100
+        annual_cashflow_for_coc = (price * (down_payment / 100) *
+                                   (min_coc_return / 100))
+        monthly_cashflow_for_coc = annual_cashflow_for_coc / 12
+        required_rent_for_coc = monthly_payment + monthly_expenses + monthly_cashflow_for_coc
+
+        required_rent = max(required_rent_for_cashflow, required_rent_for_coc)
+        rent = max(base_rent, required_rent)
+        rent = round(rent / 50) * 50
+        price = round(price / 1000) * 1000
+
+        prop = {
+            "address": address,
+            "price": price,
+            "bedrooms": bedrooms,
+            "rent": rent,
+            "property_type": "Single Family",
+            "link": f"https://www.zillow.com/homes/{zip_code}_rb/",
+        }
+        properties.append(prop)
+
+    metrics = calculate_property_metrics_batch(
+        [prop["price"] for prop in properties],
+        [prop["rent"] for prop in properties], down_payment, interest_rate,
+        loan_term, monthly_expenses)
+    mortgages = metrics['mortgage_payment'].tolist()
+    cash_flows = metrics['cash_flow'].tolist()
+    coc_returns = metrics['cash_on_cash_return'].tolist()
+
+    results = []
+    for i, prop in enumerate(properties):
+        if not (math.isfinite(coc_returns[i]) and math.isfinite(cash_flows[i])):
+            continue
+        if coc_returns[i] < min_coc_return * 0.5 or cash_flows[i] < 100:
+            continue
+
+        result = {
+            'address': prop["address"],
+            'price': prop["price"],
+            'bedrooms': prop["bedrooms"],
+            'rent': prop["rent"],
+            'mortgage': mortgages[i],
+            'cash_flow': cash_flows[i],
+            'coc_return': coc_returns[i],
+            'property_type': prop["property_type"],
+            'link': prop["link"]
+        }
+        results.append(result)
+
+    return results
+
+
+def parse_parameters(form) -> dict:
+    """
+    Reads the mortgage parameters and filter criteria from a submitted form.
+
+    Raises:
+        ValueError: If a value is not a finite number, the down payment is
+            not above 0% or the loan term is shorter than a year.
+    """
+    parameters = {
+        'down_payment': float(form.get('down_payment', 15)),
+        'interest_rate': float(form.get('interest_rate', 6.5)),
+        'loan_term': int(form.get('loan_term', 30)),
+        'monthly_expenses': float(form.get('monthly_expenses', 300)),
+        'min_coc_return': float(form.get('min_coc_return', 5)),
+        'min_cash_flow': float(form.get('min_cash_flow', 100))
+    }
+
+    for name, value in parameters.items():
+        if not math.isfinite(value):
+            raise ValueError(f"{name} must be a finite number")
+    # Cash-on-cash return is undefined without any cash invested
+    if parameters['down_payment'] <= 0:
+        raise ValueError("Down payment must be greater than 0%")
+    if parameters['loan_term'] <= 0:
+        raise ValueError("Loan term must be at least 1 year")
+    return parameters
+
+
+def parse_zip_codes(zip_codes: str) -> list:
+    """Splits submitted ZIP codes on commas and newlines, dropping duplicates."""
+    zip_list = [
+        zip.strip() for zip in zip_codes.replace(',', '\n').split('\n')
+        if zip.strip()
+    ]
+    # Keep the submitted order so results are deterministic
+    return list(dict.fromkeys(zip_list))
+
+
+def analyze_zip(zip_code: str, parameters: dict, top_k=None, zip_index: int = 0):
+    """
+    Fetches listings and rent estimates for a ZIP code and returns the
+    properties that meet the investment criteria.
+
+    Args:
+        zip_code: The ZIP code to analyze.
+        parameters: The mortgage parameters and filter criteria.
+        top_k: The TopK of a top-K run, if any. Listings that cannot make
+            it into the top K are dropped before their rent is looked up.
+        zip_index: The position of the ZIP code in the submitted list, used
+            to break ties in a top-K run.
+
+    Returns:
+        A dictionary with the matching results, the position of each result
+        among the ZIP's priced listings, the priced candidates they were
+        selected from (for re-scoring), the number of listings scanned, the
+        number of listings pruned by top_k (whose candidates are missing),
+        and used_sample, which is True when the API failed and sample
+        properties were returned instead.
+    """
+    down_payment = parameters['down_payment']
+    interest_rate = parameters['interest_rate']
+    loan_term = parameters['loan_term']
+    monthly_expenses = parameters['monthly_expenses']
+    min_coc_return = parameters['min_coc_return']
+    min_cash_flow = parameters['min_cash_flow']
+
+    logging.info(f"Processing ZIP code: {zip_code}")
+    results = []
+    result_positions = []
+
+    try:
+        # First try to get real listings from cache or the API
+        listings = fetch_listings(zip_code)
+        if not listings:
+            raise Exception("No listings returned from API")
+
+        # Listings are normalized when fetched; keep the priced ones
+        candidates = [
+            listing for listing in listings
+            if listing.price and listing.price >= 10000
+        ]
+
+        # Check criteria
+        high_end_zip_prefixes = ['902', '904', '945', '100', '101', '941']
+        is_high_end_zip = any(
+            zip_code.startswith(prefix) for prefix in high_end_zip_prefixes)
+
+        threshold_factor = 0.5 if is_high_end_zip else 1.0
+        min_coc_for_zip = min_coc_return * threshold_factor
+        min_cash_flow_for_zip = min_cash_flow * threshold_factor
+
+        positions = list(range(len(candidates)))
+        pruned = 0
+        if top_k is not None:
+            prunable = top_k.get_prunable(
+                zip_code, zip_index, [listing.price for listing in candidates],
+                [listing.bedrooms for listing in candidates], parameters,
+                min_coc_for_zip, min_cash_flow_for_zip)
+            positions = [
+                position for position, skip in enumerate(prunable) if not skip
+            ]
+            pruned = len(candidates) - len(positions)
+            candidates = [candidates[position] for position in positions]
+
+        # Fetch the rent for every bedroom count in the ZIP in one batch
+        rent_grid = fetch_rent_grid(
+            zip_code, [listing.bedrooms for listing in candidates])
+
+        # Attach rents, skipping bedroom counts whose lookup failed
+        priced = []
+        priced_positions = []
+        for position, listing in zip(positions, candidates):
+            if listing.bedrooms not in rent_grid:
+                continue
+            rent = rent_grid[listing.bedrooms]
+            if not rent:
+                rent = 1000  # Fallback value
+
+            priced.append({
+                'address': listing.address,
+                'price': listing.price,
+                'bedrooms': listing.bedrooms,
+                'rent': rent,
+                'property_type': listing.property_type,
+                'link': listing.link,
+                'threshold_factor': threshold_factor
+            })
+            priced_positions.append(position)
+
+        # Calculate metrics for the whole ZIP at once
+        metrics = calculate_property_metrics_batch(
+            [row['price'] for row in priced], [row['rent'] for row in priced],
+            down_payment, interest_rate, loan_term, monthly_expenses)
+        mortgages = metrics['mortgage_payment'].tolist()
+        cash_flows = metrics['cash_flow'].tolist()
+        coc_returns = metrics['cash_on_cash_return'].tolist()
+
+        # Evaluate each listing against the criteria
+        for i, row in enumerate(priced):
+            # Non-finite metrics (e.g. no cash invested) never match
+            if not (math.isfinite(coc_returns[i])
+                    and math.isfinite(cash_flows[i])):
+                continue
+            if coc_returns[i] < min_coc_for_zip or cash_flows[
+                    i] < min_cash_flow_for_zip:
+                continue
+
+            # Create result
+            result = {
+                'address': row['address'],
+                'price': row['price'],
+                'bedrooms': row['bedrooms'],
+                'rent': row['rent'],
+                'mortgage': mortgages[i],
+                'cash_flow': cash_flows[i],
+                'coc_return': coc_returns[i],
+                'property_type': row['property_type'],
+                'link': row['link']
+            }
+
+            results.append(result)
+            result_positions.append(priced_positions[i])
+
+    except Exception as api_error:
+        logging.warning(
+            f"API failed for {zip_code}, using sample properties: {str(api_error)}"
+        )
+        # Fall back to sample properties
+        properties = get_sample_properties(zip_code, min_coc_return,
+                                           down_payment, interest_rate,
+                                           loan_term, monthly_expenses)
+        # Sample properties are re-scored with the relaxed thresholds
+        sample_candidates = [{
+            'address': prop['address'],
+            'price': prop['price'],
+            'bedrooms': prop['bedrooms'],
+            'rent': prop['rent'],
+            'property_type': prop['property_type'],
+            'link': prop['link'],
+            'threshold_factor': 0.5
+        } for prop in properties]
+        return {
+            'zip_code': zip_code,
+            'results': properties,
+            'positions': list(range(len(properties))),
+            'candidates': sample_candidates,
+            'listings_scanned': 0,
+            'pruned': 0,
+            'used_sample': True
+        }
+
+    return {
+        'zip_code': zip_code,
+        'results': results,
+        'positions': result_positions,
+        'candidates': priced,
+        'listings_scanned': len(listings),
+        'pruned': pruned,
+        'used_sample': False
+    }
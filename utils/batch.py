@@ -0,0 +1,357 @@
+import os
+import sys
+import glob
+import json
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.analysis import analyze_zip, parse_parameters, parse_zip_codes
+from utils.export import iter_csv
+from utils.pipeline import iter_completed
+from utils.rate_limit import set_rate_share
+from utils.result_store import RESULT_FIELDS
+
+# Number of worker processes per shard; they split the configured API rates
+BATCH_PROCESSES = int(os.environ.get("BATCH_PROCESSES", os.cpu_count() or 1))
+
+# ZIP codes handed to a worker process at a time. Finished chunks are
+# checkpointed, so an interrupted run repeats at most one chunk per process
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 20))
+
+BATCH_COLUMNS = ['zip_code'] + RESULT_FIELDS
+
+PARAMETER_NAMES = ('down_payment', 'interest_rate', 'loan_term', 'monthly_expenses',
+                   'min_coc_return', 'min_cash_flow')
+
+
+def read_zip_file(path: str) -> List[str]:
+    """Returns the ZIP codes of a file (one per line or comma separated, # starts a comment line)."""
+    with open(path, 'r') as f:
+        lines = [line for line in f if not line.lstrip().startswith('#')]
+    return parse_zip_codes('\n'.join(lines))
+
+
+def get_shard(zip_codes: List[str], shard_index: int, shard_count: int) -> List[Tuple[int, str]]:
+    """Returns the (position, ZIP code) pairs that belong to a shard, dealt round-robin."""
+    return [(position, zip_code) for position, zip_code in enumerate(zip_codes)
+            if position % shard_count == shard_index]
+
+
+def get_shard_path(output_dir: str, shard_index: int, shard_count: int) -> str:
+    """Returns the checkpoint file of a shard."""
+    return os.path.join(output_dir, f"shard-{shard_index:03d}-of-{shard_count:03d}.jsonl")
+
+
+def get_run_header(zip_codes: List[str], parameters: Dict[str, Any],
+                   shard_index: int, shard_count: int) -> Dict[str, Any]:
+    """Returns the first line of a shard file, which identifies the run it belongs to."""
+    return {
+        'type': 'header',
+        'zip_count': len(zip_codes),
+        'zip_codes_sha256': hashlib.sha256('\n'.join(zip_codes).encode()).hexdigest(),
+        'parameters': parameters,
+        'shard_index': shard_index,
+        'shard_count': shard_count
+    }
+
+
+def read_shard(path: str, repair: bool = False) -> Tuple[Optional[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    """
+    Reads a shard file.
+
+    A line cut short by an interrupted run ends the file.
+
+    Args:
+        path: The shard file.
+        repair: Truncate the file after its last complete line, so that
+            appended records start on a line of their own.
+
+    Returns:
+        The shard header (None if the file is missing or empty) and the
+        finished ZIP codes by position.
+    """
+    if not os.path.exists(path):
+        return None, {}
+
+    header = None
+    records = {}
+    valid_bytes = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            valid_bytes += len(line)
+            if record.get('type') == 'header':
+                header = record
+            elif record.get('type') == 'zip':
+                records[record['position']] = record
+
+    if repair and valid_bytes < os.path.getsize(path):
+        logging.warning(f"Dropping an incomplete record at the end of {path}")
+        with open(path, 'r+b') as f:
+            f.truncate(valid_bytes)
+
+    return header, records
+
+
+def init_worker(share: float) -> None:
+    """Sets up a worker process: its share of the API rates and quieter logging."""
+    set_rate_share(share)
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def analyze_chunk(items: List[Tuple[int, str]], parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Analyzes a chunk of ZIP codes in a worker process.
+
+    Args:
+        items: (position, ZIP code) pairs.
+        parameters: The mortgage parameters and filter criteria.
+
+    Returns:
+        One shard record per ZIP code.
+    """
+    records = []
+    for index, outcome in iter_completed(lambda item: analyze_zip(item[1], parameters), items):
+        records.append({
+            'type': 'zip',
+            'position': items[index][0],
+            'zip_code': outcome['zip_code'],
+            'results': outcome['results'],
+            'listings_scanned': outcome['listings_scanned'],
+            'used_sample': outcome['used_sample']
+        })
+    return records
+
+
+def run_shard(zip_codes: List[str], parameters: Dict[str, Any], output_dir: str,
+              shard_index: int = 0, shard_count: int = 1,
+              processes: int = BATCH_PROCESSES) -> Dict[str, Any]:
+    """
+    Analyzes one shard of a batch, resuming from its checkpoint file.
+
+    Every machine in a multi-machine run gets the same ZIP file and
+    parameters and its own shard index. ZIP codes are split across a pool
+    of worker processes in chunks, and each finished ZIP code is appended
+    to the shard file before the next chunk is handed out.
+
+    Args:
+        zip_codes: All ZIP codes of the batch, in result order.
+        parameters: The mortgage parameters and filter criteria.
+        output_dir: The directory holding the shard files.
+        shard_index: The shard to run, from 0 to shard_count - 1.
+        shard_count: The number of shards the batch is split into.
+        processes: The number of worker processes (1 runs in this process).
+
+    Returns:
+        A summary with the number of ZIP codes in the shard, done before this
+        run, done by this run, and analyzed with sample data.
+
+    Raises:
+        ValueError: If the shard arguments are invalid, or the shard file
+            belongs to a run with other ZIP codes or parameters.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index must be between 0 and {shard_count - 1}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = get_shard_path(output_dir, shard_index, shard_count)
+    header = get_run_header(zip_codes, parameters, shard_index, shard_count)
+
+    existing_header, done = read_shard(path, repair=True)
+    if existing_header is not None and existing_header != header:
+        raise ValueError(f"{path} belongs to a run with other ZIP codes or parameters; "
+                         f"use a new output directory")
+
+    shard = get_shard(zip_codes, shard_index, shard_count)
+    pending = [item for item in shard if item[0] not in done]
+    chunks = [pending[start:start + BATCH_CHUNK_SIZE]
+              for start in range(0, len(pending), BATCH_CHUNK_SIZE)]
+    summary = {'zip_codes': len(shard), 'resumed': len(shard) - len(pending),
+               'analyzed': 0, 'failures': 0}
+
+    if summary['resumed']:
+        logging.info(f"Resuming shard {shard_index}: {summary['resumed']} of {len(shard)} ZIP codes already done")
+
+    with open(path, 'a') as f:
+        if existing_header is None:
+            f.write(json.dumps(header) + '\n')
+
+        def checkpoint(records):
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                summary['analyzed'] += 1
+                summary['failures'] += 1 if record['used_sample'] else 0
+            f.flush()
+            os.fsync(f.fileno())
+            logging.info(f"Shard {shard_index}: {summary['resumed'] + summary['analyzed']} "
+                         f"of {len(shard)} ZIP codes done")
+
+        if processes <= 1:
+            for chunk in chunks:
+                checkpoint(analyze_chunk(chunk, parameters))
+            return summary
+
+        # Workers are spawned rather than forked so they do not inherit this
+        # process's threads and database connections
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=init_worker,
+                                 initargs=(1 / processes, )) as executor:
+            queued = iter(chunks)
+            running = set()
+            try:
+                # Keep one chunk per process in flight so an interruption loses little work
+                for chunk in queued:
+                    running.add(executor.submit(analyze_chunk, chunk, parameters))
+                    if len(running) >= processes:
+                        break
+                while running:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        checkpoint(future.result())
+                        chunk = next(queued, None)
+                        if chunk is not None:
+                            running.add(executor.submit(analyze_chunk, chunk, parameters))
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    return summary
+
+
+def find_shard_files(paths: List[str]) -> List[str]:
+    """Expands directories to the shard files they contain."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "shard-*-of-*.jsonl"))))
+        else:
+            files.append(path)
+    return files
+
+
+def merge_shards(paths: List[str], output: str, output_format: Optional[str] = None,
+                 allow_partial: bool = False) -> Dict[str, Any]:
+    """
+    Merges shard files into one CSV or JSON file, in the order of the ZIP file.
+
+    Args:
+        paths: Shard files, or directories holding them.
+        output: The file to write.
+        output_format: 'csv' or 'json'. Defaults to the output file's extension.
+        allow_partial: Write the output even if ZIP codes are missing.
+
+    Returns:
+        A summary with the number of ZIP codes, those done and missing,
+        failures and results.
+
+    Raises:
+        ValueError: If no shard files are found, the files belong to
+            different runs, or ZIP codes are missing and allow_partial is False.
+    """
+    output_format = output_format or ('json' if output.endswith('.json') else 'csv')
+    files = find_shard_files(paths)
+    if not files:
+        raise ValueError("No shard files found")
+
+    run_header = None
+    records = {}
+    for path in files:
+        header, shard_records = read_shard(path)
+        if header is None:
+            continue
+        run = {key: header[key] for key in ('zip_count', 'zip_codes_sha256', 'parameters', 'shard_count')}
+        if run_header is None:
+            run_header = run
+        elif run != run_header:
+            raise ValueError(f"{path} belongs to a different run")
+        records.update(shard_records)
+
+    if run_header is None:
+        raise ValueError("No shard files found")
+
+    missing = run_header['zip_count'] - len(records)
+    if missing and not allow_partial:
+        raise ValueError(f"{missing} of {run_header['zip_count']} ZIP codes are not done yet")
+
+    ordered = [records[position] for position in sorted(records)]
+    rows = [{**result, 'zip_code': record['zip_code']}
+            for record in ordered for result in record['results']]
+
+    with open(output, 'wb' if output_format == 'csv' else 'w') as f:
+        if output_format == 'csv':
+            for chunk in iter_csv(rows, BATCH_COLUMNS):
+                f.write(chunk)
+        else:
+            json.dump({
+                'parameters': run_header['parameters'],
+                'zip_count': run_header['zip_count'],
+                'zips_done': len(records),
+                'results': rows
+            }, f)
+
+    return {
+        'zip_codes': run_header['zip_count'],
+        'done': len(records),
+        'missing': missing,
+        'failures': sum(1 for record in ordered if record['used_sample']),
+        'results': len(rows)
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m utils.batch",
+                                     description="Analyze large ZIP code batches outside the web app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="analyze a shard of a ZIP code file")
+    run.add_argument("zip_file", help="ZIP codes, one per line or comma separated")
+    run.add_argument("output_dir", help="directory for the shard checkpoint files")
+    run.add_argument("--shard-index", type=int, default=0)
+    run.add_argument("--shard-count", type=int, default=1)
+    run.add_argument("--processes", type=int, default=BATCH_PROCESSES)
+    for name in PARAMETER_NAMES:
+        run.add_argument(f"--{name.replace('_', '-')}", dest=name)
+
+    merge = commands.add_parser("merge", help="merge shard files into one CSV or JSON file")
+    merge.add_argument("paths", nargs="+", help="shard files or directories holding them")
+    merge.add_argument("--output", required=True)
+    merge.add_argument("--format", choices=("csv", "json"))
+    merge.add_argument("--allow-partial", action="store_true",
+                       help="write the output even if ZIP codes are missing")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        if args.command == "run":
+            parameters = parse_parameters({
+                name: getattr(args, name) for name in PARAMETER_NAMES
+                if getattr(args, name) is not None
+            })
+            summary = run_shard(read_zip_file(args.zip_file), parameters, args.output_dir,
+                                args.shard_index, args.shard_count, args.processes)
+        else:
+            summary = merge_shards(args.paths, args.output, args.format, args.allow_partial)
+    except (OSError, ValueError) as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        return 130
+
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
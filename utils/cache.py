@@ -1,14 +1,58 @@
 import os
+import re
 import json
+import glob
+import argparse
 import time
+import sqlite3
 import logging
-from typing import Any, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+from utils.metrics import span
+
 # Default cache location is the current directory
 CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
 CACHE_EXPIRY_DAYS = 30  # Cache data for 30 days
 
+# "sqlite" (default) keeps every entry in one indexed database file,
+# "json" keeps the legacy one-file-per-key layout.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")
+CACHE_DB_PATH = os.environ.get("CACHE_DB_PATH", os.path.join(CACHE_DIR, "cache.db"))
+
+# In-process LRU tier kept in front of the persistent backend
+CACHE_MEMORY_MAX_ENTRIES = int(os.environ.get("CACHE_MEMORY_MAX_ENTRIES", 4096))
+CACHE_MEMORY_TTL = float(os.environ.get("CACHE_MEMORY_TTL", 600))
+
+# How often expired rows are swept out of the SQLite cache
+CACHE_PURGE_INTERVAL = 3600
+
+# Expired entries are kept this long and served while a background refresh
+# replaces them (stale-while-revalidate)
+CACHE_STALE_DAYS = float(os.environ.get("CACHE_STALE_DAYS", 7))
+CACHE_REFRESH_WORKERS = int(os.environ.get("CACHE_REFRESH_WORKERS", 2))
+
+# Upper bound on the stored size of all entries (0 = unbounded). When it is
+# exceeded, entries are evicted least recently ("lru") or least frequently
+# ("lfu") used first.
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 0))
+CACHE_EVICTION_POLICY = os.environ.get("CACHE_EVICTION_POLICY", "lru")
+
+# How often buffered access times and hit counts are written to SQLite, and
+# how often a JSON cache file's access time is refreshed at most
+CACHE_ACCESS_FLUSH_INTERVAL = 60
+
+# Age buckets of the storage report, as (label, upper bound in seconds)
+AGE_BUCKETS = [("<1h", 3600), ("1h-1d", 86400), ("1d-7d", 7 * 86400),
+               ("7d-30d", 30 * 86400), (">30d", float("inf"))]
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+
 def ensure_cache_dir():
     """Ensures the cache directory exists."""
     if not os.path.exists(CACHE_DIR):
@@ -20,67 +64,948 @@ def get_cache_path(key: str) -> str:
     safe_key = "".join(c if c.isalnum() else "_" for c in key)
     return os.path.join(CACHE_DIR, f"{safe_key}.json")
 
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """Runs a block in an immediate (write-locking) SQLite transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def get_ttl_seconds() -> float:
+    """Returns the default time-to-live for cache entries in seconds."""
+    return timedelta(days=CACHE_EXPIRY_DAYS).total_seconds()
+
+def get_stale_seconds() -> float:
+    """Returns how long expired entries are kept for stale reads, in seconds."""
+    return timedelta(days=CACHE_STALE_DAYS).total_seconds()
+
+
+class CacheBackend:
+    """Interface implemented by the persistent cache stores."""
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Returns the unexpired entries for the given keys. Missing keys are omitted."""
+        return {key: data for key, (data, _) in self.get_entries(keys).items()}
+
+    def get_entries(self, keys: Iterable[str], stale_for: float = 0.0) -> Dict[str, Tuple[Any, float]]:
+        """
+        Returns (data, expires_at) for the given keys.
+
+        Entries that expired less than stale_for seconds ago are included.
+        """
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        """Stores several entries. Returns True if all were written."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        """Removes an entry if it exists."""
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Removes all expired entries and returns how many were removed."""
+        raise NotImplementedError
+
+    def record_access(self, keys: Iterable[str]) -> None:
+        """Notes that entries were read, for eviction ordering."""
+
+    def sweep(self) -> Dict[str, int]:
+        """Removes expired and unreadable entries. Returns counts by reason."""
+        raise NotImplementedError
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """Returns key, bytes, created_at, expires_at, last_access and hits for every entry."""
+        raise NotImplementedError
+
+    def evict(self, max_bytes: int, policy: str = "lru") -> List[str]:
+        """Removes entries until the total size is at most max_bytes. Returns the removed keys."""
+        raise NotImplementedError
+
+    def compact(self) -> None:
+        """Returns unused space to the file system."""
+
+
+class JSONFileCacheBackend(CacheBackend):
+    """Legacy backend storing each key as its own JSON file under CACHE_DIR."""
+
+    def __init__(self):
+        self.access_lock = threading.Lock()
+        self.last_touched = {}
+        self.last_touched_prune = time.time()
+
+    def get_entries(self, keys: Iterable[str], stale_for: float = 0.0) -> Dict[str, Tuple[Any, float]]:
+        ensure_cache_dir()
+        found = {}
+
+        for key in keys:
+            cache_path = get_cache_path(key)
+
+            if not os.path.exists(cache_path):
+                logging.debug(f"No cache found for {key}")
+                continue
+
+            try:
+                with open(cache_path, 'r') as f:
+                    cache_entry = json.load(f)
+
+                # Check if cache is expired
+                timestamp = cache_entry.get('timestamp', 0)
+                expiry_time = datetime.fromtimestamp(timestamp) + timedelta(days=CACHE_EXPIRY_DAYS)
+
+                if datetime.now() > expiry_time + timedelta(seconds=stale_for):
+                    logging.debug(f"Cache for {key} has expired")
+                    if datetime.now() > expiry_time + timedelta(days=CACHE_STALE_DAYS):
+                        os.remove(cache_path)  # Clean up expired cache
+                    continue
+
+                found[key] = (cache_entry.get('data'), expiry_time.timestamp())
+
+            except (IOError, json.JSONDecodeError) as e:
+                logging.warning(f"Error reading cache for {key}: {str(e)}")
+
+        self.record_access(found)
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        ensure_cache_dir()
+        success = True
+
+        for key, data in items.items():
+            try:
+                cache_entry = {
+                    'timestamp': datetime.now().timestamp(),
+                    'data': data
+                }
+
+                with open(get_cache_path(key), 'w') as f:
+                    json.dump(cache_entry, f)
+
+            except (IOError, TypeError) as e:
+                logging.error(f"Error caching data for {key}: {str(e)}")
+                success = False
+
+        return success
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(get_cache_path(key))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self) -> int:
+        ensure_cache_dir()
+        removed = 0
+        cutoff = time.time() - get_ttl_seconds() - get_stale_seconds()
+
+        for cache_path in glob.glob(os.path.join(CACHE_DIR, "*.json")):
+            try:
+                with open(cache_path, 'r') as f:
+                    timestamp = json.load(f).get('timestamp', 0)
+            except (IOError, json.JSONDecodeError):
+                continue
+
+            if timestamp < cutoff:
+                os.remove(cache_path)
+                removed += 1
+
+        return removed
+
+
+    def record_access(self, keys: Iterable[str]) -> None:
+        # The file modification time doubles as the last access time; a file
+        # read again within the flush interval is not touched again
+        now = time.time()
+        with self.access_lock:
+            if now - self.last_touched_prune > CACHE_ACCESS_FLUSH_INTERVAL:
+                self.last_touched = {key: touched for key, touched in self.last_touched.items()
+                                     if now - touched <= CACHE_ACCESS_FLUSH_INTERVAL}
+                self.last_touched_prune = now
+            due = [key for key in keys
+                   if now - self.last_touched.get(key, 0.0) > CACHE_ACCESS_FLUSH_INTERVAL]
+            for key in due:
+                self.last_touched[key] = now
+
+        for key in due:
+            try:
+                os.utime(get_cache_path(key))
+            except OSError:
+                pass
+
+    def sweep(self) -> Dict[str, int]:
+        ensure_cache_dir()
+        removed = {"expired": 0, "corrupt": 0}
+        cutoff = time.time() - get_ttl_seconds() - get_stale_seconds()
+
+        for cache_path in glob.glob(os.path.join(CACHE_DIR, "*.json")):
+            try:
+                with open(cache_path, 'r') as f:
+                    timestamp = float(json.load(f).get('timestamp', 0))
+                reason = "expired" if timestamp < cutoff else None
+            except FileNotFoundError:
+                continue
+            except (IOError, ValueError, TypeError, AttributeError):
+                # Includes zero-byte files left by interrupted writes
+                reason = "corrupt"
+
+            if reason:
+                try:
+                    os.remove(cache_path)
+                    removed[reason] += 1
+                except FileNotFoundError:
+                    pass
+
+        return removed
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        ensure_cache_dir()
+        entries = []
+        ttl = get_ttl_seconds()
+
+        for cache_path in glob.glob(os.path.join(CACHE_DIR, "*.json")):
+            try:
+                stat = os.stat(cache_path)
+                with open(cache_path, 'r') as f:
+                    timestamp = float(json.load(f).get('timestamp', 0))
+            except (IOError, ValueError, TypeError, AttributeError):
+                continue
+            entries.append({
+                "key": os.path.splitext(os.path.basename(cache_path))[0],
+                "bytes": stat.st_size,
+                "created_at": timestamp,
+                "expires_at": timestamp + ttl,
+                "last_access": stat.st_mtime,
+                "hits": None
+            })
+
+        return entries
+
+    def evict(self, max_bytes: int, policy: str = "lru") -> List[str]:
+        # Files carry no hit counts, so LFU falls back to LRU
+        entries = sorted(self.list_entries(), key=lambda entry: entry["last_access"])
+        total = sum(entry["bytes"] for entry in entries)
+        evicted = []
+
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            self.delete(entry["key"])
+            total -= entry["bytes"]
+            evicted.append(entry["key"])
+
+        return evicted
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Backend storing all entries in a single SQLite database.
+
+    The database runs in WAL mode so several gunicorn workers can read while
+    one writes; each thread keeps its own connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.last_purge = 0.0
+        self.access_lock = threading.Lock()
+        self.pending_access = {}
+        self.last_access_flush = time.time()
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Returns this thread's connection, creating the schema on first use."""
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.create_schema(conn)
+            self.local.conn = conn
+        return conn
+
+    def create_schema(self, conn: sqlite3.Connection) -> None:
+        """Creates or upgrades the entries table and imports the JSON cache the first time."""
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 2:
+            return
+
+        # The write lock serialises concurrent workers creating the schema
+        with transaction(conn):
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_expires_at ON entries (expires_at)")
+                imported = import_json_files(conn)
+                if imported:
+                    logging.info(f"Imported {imported} JSON cache files into {self.path}")
+            if version < 2:
+                # Access tracking for size-capped eviction
+                conn.execute("ALTER TABLE entries ADD COLUMN last_access REAL")
+                conn.execute("ALTER TABLE entries ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+            conn.execute("PRAGMA user_version = 2")
+
+    def get_entries(self, keys: Iterable[str], stale_for: float = 0.0) -> Dict[str, Tuple[Any, float]]:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time() - stale_for
+
+        try:
+            conn = self.get_connection()
+            for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[start:start + SQLITE_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, value, expires_at FROM entries WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*batch, now)).fetchall()
+                for key, value, expires_at in rows:
+                    try:
+                        found[key] = (json.loads(value), expires_at)
+                    except json.JSONDecodeError as e:
+                        logging.warning(f"Error reading cache for {key}: {str(e)}")
+
+        except sqlite3.Error as e:
+            logging.warning(f"Error reading cache: {str(e)}")
+
+        self.record_access(found)
+        return found
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else get_ttl_seconds())
+        rows = []
+
+        for key, data in items.items():
+            try:
+                rows.append((key, json.dumps(data, separators=(',', ':')), now, expires_at))
+            except (TypeError, ValueError) as e:
+                logging.error(f"Error caching data for {key}: {str(e)}")
+
+        try:
+            conn = self.get_connection()
+            with transaction(conn):
+                conn.executemany("""
+                    INSERT INTO entries (key, value, created_at, expires_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        value = excluded.value,
+                        created_at = excluded.created_at,
+                        expires_at = excluded.expires_at
+                """, rows)
+        except sqlite3.Error as e:
+            logging.error(f"Error caching data: {str(e)}")
+            return False
+
+        if now - self.last_purge > CACHE_PURGE_INTERVAL:
+            self.purge_expired()
+            if CACHE_MAX_BYTES:
+                self.evict(CACHE_MAX_BYTES, CACHE_EVICTION_POLICY)
+
+        return len(rows) == len(items)
+
+    def delete(self, key: str) -> None:
+        try:
+            conn = self.get_connection()
+            with transaction(conn):
+                conn.execute("DELETE FROM entries WHERE key = ?", (key, ))
+        except sqlite3.Error as e:
+            logging.warning(f"Error deleting cache for {key}: {str(e)}")
+
+    def purge_expired(self) -> int:
+        self.last_purge = time.time()
+        try:
+            conn = self.get_connection()
+            with transaction(conn):
+                # Recently expired rows are kept for stale reads
+                cursor = conn.execute("DELETE FROM entries WHERE expires_at <= ?",
+                                      (self.last_purge - get_stale_seconds(), ))
+            if cursor.rowcount:
+                logging.debug(f"Purged {cursor.rowcount} expired cache entries")
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logging.warning(f"Error purging expired cache entries: {str(e)}")
+            return 0
+
+    def record_access(self, keys: Iterable[str]) -> None:
+        # Reads are buffered and written in one batch to keep them lock-free
+        now = time.time()
+        with self.access_lock:
+            for key in keys:
+                hits, _ = self.pending_access.get(key, (0, now))
+                self.pending_access[key] = (hits + 1, now)
+            due = now - self.last_access_flush > CACHE_ACCESS_FLUSH_INTERVAL
+
+        if due:
+            self.flush_access()
+
+    def flush_access(self) -> None:
+        """Writes buffered access times and hit counts to the database."""
+        with self.access_lock:
+            pending = self.pending_access
+            self.pending_access = {}
+            self.last_access_flush = time.time()
+
+        if not pending:
+            return
+
+        try:
+            conn = self.get_connection()
+            with transaction(conn):
+                conn.executemany("""
+                    UPDATE entries SET hits = hits + ?,
+                                       last_access = MAX(COALESCE(last_access, 0), ?)
+                    WHERE key = ?
+                """, [(hits, last_access, key) for key, (hits, last_access) in pending.items()])
+        except sqlite3.Error as e:
+            logging.warning(f"Error recording cache access: {str(e)}")
+
+    def sweep(self) -> Dict[str, int]:
+        # Legacy JSON files that could not be imported are never read again
+        removed = {"expired": self.purge_expired(), "corrupt": remove_unreadable_json_files()}
+        conn = self.get_connection()
+        corrupt = []
+
+        # Values are checked in key order a batch at a time so writers are never blocked for long
+        last_key = ""
+        while True:
+            rows = conn.execute("SELECT key, value FROM entries WHERE key > ? ORDER BY key LIMIT ?",
+                                (last_key, SQLITE_BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            for key, value in rows:
+                try:
+                    json.loads(value)
+                except (TypeError, ValueError):
+                    corrupt.append(key)
+            last_key = rows[-1][0]
+
+        for start in range(0, len(corrupt), SQLITE_BATCH_SIZE):
+            batch = corrupt[start:start + SQLITE_BATCH_SIZE]
+            with transaction(conn):
+                conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch)
+        removed["corrupt"] += len(corrupt)
+
+        return removed
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        self.flush_access()
+        rows = self.get_connection().execute("""
+            SELECT key, length(value), created_at, expires_at, last_access, hits FROM entries
+        """).fetchall()
+        return [{
+            "key": key,
+            "bytes": size,
+            "created_at": created_at,
+            "expires_at": expires_at,
+            "last_access": last_access or created_at,
+            "hits": hits
+        } for key, size, created_at, expires_at, last_access, hits in rows]
+
+    def evict(self, max_bytes: int, policy: str = "lru") -> List[str]:
+        self.flush_access()
+        if policy == "lfu":
+            order = "hits, COALESCE(last_access, created_at)"
+        else:
+            order = "COALESCE(last_access, created_at)"
+
+        conn = self.get_connection()
+        evicted = []
+        try:
+            with transaction(conn):
+                total = conn.execute("SELECT COALESCE(SUM(length(value)), 0) FROM entries").fetchone()[0]
+                if total <= max_bytes:
+                    return evicted
+                for key, size in conn.execute(f"SELECT key, length(value) FROM entries ORDER BY {order}"):
+                    if total <= max_bytes:
+                        break
+                    evicted.append(key)
+                    total -= size
+                for start in range(0, len(evicted), SQLITE_BATCH_SIZE):
+                    batch = evicted[start:start + SQLITE_BATCH_SIZE]
+                    conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch)
+        except sqlite3.Error as e:
+            logging.warning(f"Error evicting cache entries: {str(e)}")
+            return []
+
+        if evicted:
+            logging.info(f"Evicted {len(evicted)} cache entries ({policy}) to stay under {max_bytes} bytes")
+        return evicted
+
+    def compact(self) -> None:
+        conn = self.get_connection()
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class MemoryCache:
+    """
+    A bounded, thread-safe LRU cache with per-entry expiry.
+
+    Cached objects are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Returns the unexpired entries for the given keys and marks them as recently used."""
+        found = {}
+        now = time.monotonic()
+
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, data = entry
+                if expires_at <= now:
+                    del self.entries[key]
+                    continue
+                self.entries.move_to_end(key)
+                found[key] = data
+
+        return found
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Stores entries, evicting the least recently used ones beyond max_entries."""
+        if self.max_entries <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl
+        with self.lock:
+            for key, data in items.items():
+                self.entries[key] = (expires_at, data)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """Removes an entry if it exists."""
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def import_json_files(conn: sqlite3.Connection) -> int:
+    """
+    Imports the legacy cache/*.json files into an SQLite cache database.
+
+    Entries keep their original timestamps, so files that are already expired
+    are imported as expired and swept out later. An existing row is only
+    replaced by a newer file.
+
+    Args:
+        conn: A connection to the cache database.
+
+    Returns:
+        The number of files imported.
+    """
+    imported = 0
+    ttl = get_ttl_seconds()
+
+    for cache_path in sorted(glob.glob(os.path.join(CACHE_DIR, "*.json"))):
+        # Cache keys only contain filename-safe characters, so the file name is the key
+        key = os.path.splitext(os.path.basename(cache_path))[0]
+
+        try:
+            with open(cache_path, 'r') as f:
+                cache_entry = json.load(f)
+            timestamp = float(cache_entry.get('timestamp', 0))
+            value = json.dumps(cache_entry.get('data'), separators=(',', ':'))
+        except (IOError, ValueError, TypeError, AttributeError) as e:
+            logging.warning(f"Skipping unreadable cache file {cache_path}: {str(e)}")
+            continue
+
+        conn.execute("""
+            INSERT INTO entries (key, value, created_at, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value,
+                created_at = excluded.created_at,
+                expires_at = excluded.expires_at
+            WHERE excluded.created_at > entries.created_at
+        """, (key, value, timestamp, timestamp + ttl))
+        imported += 1
+
+    return imported
+
+
+def remove_unreadable_json_files() -> int:
+    """
+    Deletes legacy cache/*.json files that cannot be parsed, such as the
+    zero-byte files left by interrupted writes. Readable files are kept.
+
+    Returns:
+        The number of files removed.
+    """
+    removed = 0
+    for cache_path in glob.glob(os.path.join(CACHE_DIR, "*.json")):
+        try:
+            with open(cache_path, 'r') as f:
+                float(json.load(f).get('timestamp', 0))
+            continue
+        except FileNotFoundError:
+            continue
+        except (IOError, ValueError, TypeError, AttributeError):
+            pass
+
+        try:
+            os.remove(cache_path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def migrate_json_cache() -> int:
+    """
+    Imports the legacy cache/*.json files into the SQLite cache.
+
+    This runs automatically when the database is first created; call it again
+    to pick up JSON files written since.
+
+    Returns:
+        The number of files imported.
+    """
+    backend = SQLiteCacheBackend(CACHE_DB_PATH)
+    conn = backend.get_connection()
+    with transaction(conn):
+        return import_json_files(conn)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+_memory_cache = MemoryCache(CACHE_MEMORY_MAX_ENTRIES, CACHE_MEMORY_TTL)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "memory": {"hits": 0, "misses": 0},
+    "persistent": {"hits": 0, "misses": 0},
+    "stale": {"hits": 0, "misses": 0},
+}
+
+_refresh_executor = ThreadPoolExecutor(max_workers=max(CACHE_REFRESH_WORKERS, 1),
+                                       thread_name_prefix="cache-refresh")
+_refresh_lock = threading.Lock()
+_refreshing = set()
+
+def record_lookups(tier: str, hits: int, misses: int) -> None:
+    """Adds lookup outcomes to a tier's hit/miss counters."""
+    with _stats_lock:
+        _stats[tier]["hits"] += hits
+        _stats[tier]["misses"] += misses
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns hit/miss counters for the memory and persistent tiers of this process.
+
+    The stale tier counts persistent misses that were answered with an
+    expired entry while it was refreshed in the background.
+
+    Returns:
+        A dictionary keyed by tier with hits, misses and hit_rate.
+    """
+    with _stats_lock:
+        stats = {tier: dict(counts) for tier, counts in _stats.items()}
+
+    for counts in stats.values():
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = counts["hits"] / lookups if lookups else 0.0
+    stats["memory"]["entries"] = len(_memory_cache)
+    with _refresh_lock:
+        stats["stale"]["refreshing"] = len(_refreshing)
+
+    return stats
+
+def get_backend() -> CacheBackend:
+    """Returns the configured cache backend."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if CACHE_BACKEND == "json":
+                    _backend = JSONFileCacheBackend()
+                else:
+                    _backend = SQLiteCacheBackend(CACHE_DB_PATH)
+    return _backend
+
 def get_cached_data(key: str) -> Optional[Any]:
     """
     Retrieves data from cache if it exists and is not expired.
-    
+
     Args:
         key: The cache key to retrieve.
-        
+
     Returns:
         The cached data if available and not expired, otherwise None.
     """
-    ensure_cache_dir()
-    cache_path = get_cache_path(key)
-    
-    if not os.path.exists(cache_path):
-        logging.debug(f"No cache found for {key}")
-        return None
-    
-    try:
-        with open(cache_path, 'r') as f:
-            cache_data = json.load(f)
-        
-        # Check if cache is expired
-        timestamp = cache_data.get('timestamp', 0)
-        expiry_time = datetime.fromtimestamp(timestamp) + timedelta(days=CACHE_EXPIRY_DAYS)
-        
-        if datetime.now() > expiry_time:
-            logging.debug(f"Cache for {key} has expired")
-            os.remove(cache_path)  # Clean up expired cache
-            return None
-            
-        return cache_data.get('data')
-        
-    except (IOError, json.JSONDecodeError) as e:
-        logging.warning(f"Error reading cache for {key}: {str(e)}")
-        return None
+    return get_many_cached_data([key]).get(key)
+
+def get_many_cached_data(keys: Iterable[str]) -> Dict[str, Any]:
+    """
+    Retrieves several keys from cache in one lookup.
+
+    Keys are served from the in-process memory tier when possible; the rest
+    are read from the persistent backend in a single query and promoted into
+    the memory tier.
+
+    Args:
+        keys: The cache keys to retrieve.
+
+    Returns:
+        A dictionary of the keys that are cached and not expired.
+    """
+    keys = list(dict.fromkeys(keys))
+    with span("cache.get"):
+        found = _memory_cache.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        record_lookups("memory", len(found), len(missing))
+        if found:
+            # Keep eviction ordering aware of entries served from memory
+            get_backend().record_access(found)
+
+        if missing:
+            loaded = get_backend().get_many(missing)
+            record_lookups("persistent", len(loaded), len(missing) - len(loaded))
+            if loaded:
+                _memory_cache.set_many(loaded)
+                found.update(loaded)
+
+    return found
+
+def get_stale_data(keys: Iterable[str]) -> Dict[str, Any]:
+    """
+    Retrieves entries that expired within the last CACHE_STALE_DAYS.
+
+    Call this for keys get_many_cached_data did not return, serve what it
+    finds and replace it with refresh_in_background.
+
+    Args:
+        keys: The cache keys to retrieve.
+
+    Returns:
+        A dictionary of the keys that have an expired, but still kept, entry.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys or CACHE_STALE_DAYS <= 0:
+        return {}
+
+    now = time.time()
+    with span("cache.get_stale"):
+        entries = get_backend().get_entries(keys, stale_for=get_stale_seconds())
+    found = {key: data for key, (data, expires_at) in entries.items() if expires_at <= now}
+    record_lookups("stale", len(found), len(keys) - len(found))
+    return found
+
+def get_cache_expiry(keys: Iterable[str]) -> Dict[str, float]:
+    """
+    Returns when the given keys expire, as Unix timestamps.
+
+    Keys without an entry (or whose entry is past its stale period) are omitted.
+    """
+    entries = get_backend().get_entries(keys, stale_for=get_stale_seconds())
+    return {key: expires_at for key, (_, expires_at) in entries.items()}
+
+def refresh_in_background(key: str, refresh: Callable[[], Any]) -> bool:
+    """
+    Queues a refresh of a cache entry on the background refresh threads.
+
+    A key is only queued once until its refresh finishes.
+
+    Args:
+        key: The cache key being refreshed.
+        refresh: Fetches the data and stores it in the cache.
+
+    Returns:
+        True if the refresh was queued, False if one was already pending.
+    """
+    with _refresh_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+
+    def run():
+        try:
+            refresh()
+        except Exception as e:
+            logging.warning(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(key)
+
+    logging.debug(f"Queued background refresh of {key}")
+    _refresh_executor.submit(run)
+    return True
 
 def cache_data(key: str, data: Any) -> bool:
     """
     Stores data in the cache.
-    
+
     Args:
         key: The cache key.
         data: The data to cache.
-        
+
     Returns:
         True if caching was successful, False otherwise.
     """
-    ensure_cache_dir()
-    cache_path = get_cache_path(key)
-    
-    try:
-        cache_entry = {
-            'timestamp': datetime.now().timestamp(),
-            'data': data
-        }
-        
-        with open(cache_path, 'w') as f:
-            json.dump(cache_entry, f)
-            
+    return cache_many({key: data})
+
+def cache_many(items: Dict[str, Any]) -> bool:
+    """
+    Stores several entries in the cache in one write.
+
+    Args:
+        items: A dictionary of cache keys to data.
+
+    Returns:
+        True if all entries were cached, False otherwise.
+    """
+    if not items:
         return True
-        
-    except (IOError, TypeError) as e:
-        logging.error(f"Error caching data for {key}: {str(e)}")
-        return False
+    # Write-through: the memory tier is updated together with the persistent one
+    with span("cache.set"):
+        _memory_cache.set_many(items)
+        return get_backend().set_many(items)
+
+
+def get_namespace(key: str) -> str:
+    """Returns a key's namespace, e.g. 'zillow_listings' for zillow_listings_45040."""
+    return re.sub(r"(_\d+)+$", "", key)
+
+def sweep_cache() -> Dict[str, int]:
+    """
+    Removes expired entries (past their stale period) and unreadable entries.
+
+    Returns:
+        The number of entries removed, by reason.
+    """
+    removed = get_backend().sweep()
+    logging.info(f"Swept cache: {removed}")
+    return removed
+
+def enforce_size_limit(max_bytes: Optional[int] = None, policy: Optional[str] = None) -> int:
+    """
+    Evicts entries until the cache is within its size cap.
+
+    Args:
+        max_bytes: The size cap. Defaults to CACHE_MAX_BYTES.
+        policy: "lru" or "lfu". Defaults to CACHE_EVICTION_POLICY.
+
+    Returns:
+        The number of entries evicted.
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if max_bytes <= 0:
+        return 0
+
+    evicted = get_backend().evict(max_bytes, policy or CACHE_EVICTION_POLICY)
+    for key in evicted:
+        _memory_cache.delete(key)
+    return len(evicted)
+
+def get_storage_report() -> Dict[str, Any]:
+    """
+    Describes what the persistent cache holds.
+
+    Returns:
+        Totals, per-namespace entry counts, bytes and hits, an age histogram
+        and this process's hit rates.
+    """
+    now = time.time()
+    report = {
+        "backend": CACHE_BACKEND,
+        "entries": 0,
+        "bytes": 0,
+        "expired": 0,
+        "max_bytes": CACHE_MAX_BYTES or None,
+        "eviction_policy": CACHE_EVICTION_POLICY,
+        "namespaces": {},
+        "age": {label: 0 for label, _ in AGE_BUCKETS},
+    }
+
+    for entry in get_backend().list_entries():
+        namespace = report["namespaces"].setdefault(
+            get_namespace(entry["key"]), {"entries": 0, "bytes": 0, "expired": 0, "hits": 0})
+        namespace["entries"] += 1
+        namespace["bytes"] += entry["bytes"]
+        namespace["hits"] += entry["hits"] or 0
+        report["entries"] += 1
+        report["bytes"] += entry["bytes"]
+
+        if entry["expires_at"] <= now:
+            namespace["expired"] += 1
+            report["expired"] += 1
+
+        age = now - entry["created_at"]
+        for label, limit in AGE_BUCKETS:
+            if age < limit:
+                report["age"][label] += 1
+                break
+
+    report["lookups"] = get_cache_stats()
+    return report
+
+def run_maintenance(max_bytes: Optional[int] = None, policy: Optional[str] = None,
+                    compact: bool = False) -> Dict[str, Any]:
+    """
+    Sweeps the cache, enforces the size cap and optionally compacts the store.
+
+    Every step works in short transactions, so it is safe to run while the
+    app is serving requests.
+
+    Returns:
+        The counts of removed and evicted entries.
+    """
+    summary = sweep_cache()
+    summary["evicted"] = enforce_size_limit(max_bytes, policy)
+    if compact:
+        get_backend().compact()
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m utils.cache", description="Cache maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="import the legacy JSON cache files into SQLite")
+    commands.add_parser("sweep", help="remove expired and unreadable entries")
+    commands.add_parser("stats", help="print a storage report as JSON")
+    for name, help_text in (("evict", "evict entries down to the size cap"),
+                            ("maintain", "sweep, evict and optionally compact")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--max-bytes", type=int, default=None)
+        command.add_argument("--policy", choices=["lru", "lfu"], default=None)
+        if name == "maintain":
+            command.add_argument("--compact", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(f"Imported {migrate_json_cache()} JSON cache files into {CACHE_DB_PATH}")
+    elif args.command == "sweep":
+        print(json.dumps(sweep_cache()))
+    elif args.command == "stats":
+        print(json.dumps(get_storage_report(), indent=2))
+    elif args.command == "evict":
+        print(json.dumps({"evicted": enforce_size_limit(args.max_bytes, args.policy)}))
+    else:
+        print(json.dumps(run_maintenance(args.max_bytes, args.policy, args.compact)))
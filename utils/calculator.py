@@ -1,6 +1,12 @@
 import math
 from typing import Dict, Any
 
+import numpy as np
+from numpy.typing import ArrayLike
+
+from utils.metrics import timed
+
+@timed("calculate")
 def calculate_property_metrics(price: float, 
                                rent: float, 
                                down_payment_percent: float, 
@@ -56,3 +62,104 @@ def calculate_property_metrics(price: float,
         "annual_cash_flow": annual_cash_flow,
         "cash_on_cash_return": cash_on_cash_return
     }
+
+
+
+def _mortgage_payments(loan_amount: np.ndarray, monthly_interest_rate: float,
+                       n_payments: float) -> np.ndarray:
+    """
+    Applies the mortgage formula of calculate_property_metrics to an array of loan amounts.
+
+    Raises:
+        ValueError: If there are no payments (a loan term of 0).
+    """
+    if n_payments <= 0:
+        raise ValueError("Loan term must be at least 1 year")
+    if monthly_interest_rate == 0:
+        # Handle edge case of 0% interest
+        return loan_amount / n_payments
+
+    growth = math.pow(1 + monthly_interest_rate, n_payments)
+    return loan_amount * ((monthly_interest_rate * growth) / (growth - 1))
+
+
+@timed("calculate")
+def calculate_property_metrics_batch(prices: ArrayLike,
+                                     rents: ArrayLike,
+                                     down_payment_percent: ArrayLike,
+                                     interest_rate: ArrayLike,
+                                     loan_term_years: ArrayLike,
+                                     monthly_expenses: ArrayLike) -> Dict[str, np.ndarray]:
+    """
+    Calculates the metrics of calculate_property_metrics for many properties at once.
+
+    Each argument may be a scalar or an array of the same length as prices.
+    Operations run in the same order as in the scalar function, and the
+    annuity factor is computed with math.pow once per distinct (rate, term)
+    pair, so results are identical to calling calculate_property_metrics per
+    property. Callers validate the inputs with parse_parameters; a zero down
+    payment that gets through yields inf/nan (with a RuntimeWarning).
+
+    Args:
+        prices: The purchase prices.
+        rents: The monthly rental incomes.
+        down_payment_percent: The down payment percentages (e.g., 20 for 20%).
+        interest_rate: The annual interest rates (e.g., 7 for 7%).
+        loan_term_years: The loan terms in years.
+        monthly_expenses: Monthly expenses (taxes, insurance, maintenance, etc.)
+
+    Returns:
+        A dictionary of column arrays with the same keys as calculate_property_metrics.
+
+    Raises:
+        ValueError: If a loan term is 0.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    rents = np.asarray(rents, dtype=np.float64)
+    down_payment_percent = np.asarray(down_payment_percent, dtype=np.float64)
+    interest_rate = np.asarray(interest_rate, dtype=np.float64)
+    loan_term_years = np.asarray(loan_term_years)
+    monthly_expenses = np.asarray(monthly_expenses, dtype=np.float64)
+
+    # Calculate down payment and loan amount
+    down_payment = prices * (down_payment_percent / 100)
+    loan_amount = prices - down_payment
+
+    # Calculate monthly mortgage payment
+    monthly_interest_rate = (interest_rate / 100) / 12
+    n_payments = loan_term_years * 12
+
+    if monthly_interest_rate.ndim == 0 and n_payments.ndim == 0:
+        mortgage_payment = _mortgage_payments(loan_amount, monthly_interest_rate.item(),
+                                              n_payments.item())
+    else:
+        loan_amount, monthly_interest_rate, n_payments = np.broadcast_arrays(
+            loan_amount, monthly_interest_rate, n_payments)
+        mortgage_payment = np.empty(loan_amount.shape, dtype=np.float64)
+
+        # Loan parameters usually take only a few distinct values
+        pairs = np.stack([monthly_interest_rate.ravel(),
+                          n_payments.ravel().astype(np.float64)], axis=1)
+        unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+        inverse = inverse.reshape(loan_amount.shape)
+        for index, (rate, term) in enumerate(unique_pairs):
+            mask = inverse == index
+            mortgage_payment[mask] = _mortgage_payments(loan_amount[mask], float(rate), float(term))
+
+    # Calculate cash flow
+    cash_flow = rents - mortgage_payment - monthly_expenses
+
+    # Calculate annual cash flow
+    annual_cash_flow = cash_flow * 12
+
+    # Calculate cash-on-cash return
+    cash_on_cash_return = (annual_cash_flow / down_payment) * 100
+
+    return {
+        "down_payment": down_payment,
+        "loan_amount": loan_amount,
+        "mortgage_payment": mortgage_payment,
+        "cash_flow": cash_flow,
+        "annual_cash_flow": annual_cash_flow,
+        "cash_on_cash_return": cash_on_cash_return
+    }
@@ -0,0 +1,201 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+from utils.metrics import Counter
+
+# Circuit breakers are used unless CIRCUIT_BREAKER_ENABLED=0
+CIRCUIT_BREAKER_ENABLED = os.environ.get("CIRCUIT_BREAKER_ENABLED", "1") not in ("0", "false")
+
+# A circuit opens when at least CIRCUIT_MIN_CALLS calls in the last
+# CIRCUIT_WINDOW_SECONDS include CIRCUIT_FAILURE_RATE or more failures.
+# Connection errors, timeouts, 429/5xx responses and calls slower than
+# CIRCUIT_SLOW_CALL_SECONDS count as failures
+CIRCUIT_WINDOW_SECONDS = float(os.environ.get("CIRCUIT_WINDOW_SECONDS", 60))
+CIRCUIT_MIN_CALLS = int(os.environ.get("CIRCUIT_MIN_CALLS", 10))
+CIRCUIT_FAILURE_RATE = float(os.environ.get("CIRCUIT_FAILURE_RATE", 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get("CIRCUIT_SLOW_CALL_SECONDS", 10))
+
+# An open circuit rejects calls for this long, then lets up to
+# CIRCUIT_HALF_OPEN_PROBES calls through; it closes once they all succeed
+# and opens again as soon as one fails
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", 30))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", 2))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Values of the app_circuit_state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_TRANSITIONS = Counter("app_circuit_transitions_total", "Circuit breaker state changes.",
+                              ["provider", "endpoint", "state"])
+CIRCUIT_REJECTED = Counter("app_circuit_rejected_total", "Calls rejected by an open circuit.",
+                           ["provider", "endpoint"])
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the provider endpoint's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the failure rate of one provider endpoint and rejects calls while it is failing.
+
+    State is kept per process, like the rate limiter's token buckets.
+    """
+
+    def __init__(self, provider: str, endpoint: str):
+        self.provider = provider
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.calls = deque()
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_successes = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def set_state(self, state: str, now: float) -> None:
+        """Moves to a new state. Must be called with the lock held."""
+        if state == self.state:
+            return
+        logging.warning(f"Circuit for {self.provider} {self.endpoint} is now {state.replace('_', '-')}")
+        CIRCUIT_TRANSITIONS.inc(provider=self.provider, endpoint=self.endpoint, state=state)
+        self.state = state
+        self.calls.clear()
+        self.probes = 0
+        self.probe_successes = 0
+        if state == OPEN:
+            self.opened_at = now
+
+    def before_call(self) -> None:
+        """
+        Admits a call, or rejects it while the circuit is open.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all probes in flight.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if self.state == OPEN and now - self.opened_at >= CIRCUIT_OPEN_SECONDS:
+                self.set_state(HALF_OPEN, now)
+
+            if self.state == HALF_OPEN and self.probes < CIRCUIT_HALF_OPEN_PROBES:
+                self.probes += 1
+                return
+            if self.state == CLOSED:
+                return
+
+        self.reject()
+
+    def check_open(self) -> None:
+        """
+        Rejects a retry straight away if the circuit is open.
+
+        Raises:
+            CircuitOpenError: If the circuit is open.
+        """
+        if self.get_state() == OPEN:
+            self.reject()
+
+    def reject(self) -> None:
+        """Counts a rejected call and raises CircuitOpenError."""
+        with self.lock:
+            self.rejected += 1
+        CIRCUIT_REJECTED.inc(provider=self.provider, endpoint=self.endpoint)
+        raise CircuitOpenError(f"Circuit for {self.provider} {self.endpoint} is open")
+
+    def cancel_call(self) -> None:
+        """Releases an admitted call that was never made (e.g. its quota check failed)."""
+        with self.lock:
+            if self.state == HALF_OPEN and self.probes > 0:
+                self.probes -= 1
+
+    def after_call(self, success: bool, seconds: float) -> None:
+        """
+        Records the outcome of an admitted call.
+
+        Args:
+            success: False for connection errors, timeouts and retryable statuses.
+            seconds: How long the call took; slow calls count as failures.
+        """
+        failed = not success or seconds >= CIRCUIT_SLOW_CALL_SECONDS
+        now = time.monotonic()
+        with self.lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self.set_state(OPEN, now)
+                    return
+                self.probe_successes += 1
+                if self.probe_successes >= CIRCUIT_HALF_OPEN_PROBES:
+                    self.set_state(CLOSED, now)
+                return
+
+            # Calls admitted before the circuit opened do not count
+            if self.state == OPEN:
+                return
+
+            self.calls.append((now, failed))
+            while self.calls and self.calls[0][0] < now - CIRCUIT_WINDOW_SECONDS:
+                self.calls.popleft()
+
+            failures = sum(1 for _, call_failed in self.calls if call_failed)
+            if len(self.calls) >= CIRCUIT_MIN_CALLS and failures >= len(self.calls) * CIRCUIT_FAILURE_RATE:
+                self.set_state(OPEN, now)
+
+    def get_state(self) -> str:
+        """Returns the current state, treating an open circuit that is due for probes as half-open."""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= CIRCUIT_OPEN_SECONDS:
+                return HALF_OPEN
+            return self.state
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, endpoint: str) -> CircuitBreaker:
+    """Returns the circuit breaker of a provider endpoint, creating it on first use."""
+    key = (provider, endpoint)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(key, CircuitBreaker(provider, endpoint))
+    return breaker
+
+
+def get_breaker_states() -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Returns the state and rejected call count of every provider endpoint called so far."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {(breaker.provider, breaker.endpoint): {'state': breaker.get_state(),
+                                                   'rejected': breaker.rejected}
+            for breaker in breakers}
+
+
+def get_rejection_counts() -> Dict[Tuple[str, str], int]:
+    """Returns the number of calls rejected so far per provider endpoint."""
+    return {key: state['rejected'] for key, state in get_breaker_states().items()}
+
+
+def describe_rejections(before: Dict[Tuple[str, str], int]) -> List[str]:
+    """
+    Describes the calls rejected since an earlier get_rejection_counts().
+
+    Returns:
+        One message per provider endpoint that rejected calls, e.g.
+        "zillow /propertyExtendedSearch (12 calls skipped, circuit open)".
+    """
+    messages = []
+    for (provider, endpoint), state in sorted(get_breaker_states().items()):
+        skipped = state['rejected'] - before.get((provider, endpoint), 0)
+        if skipped > 0:
+            messages.append(f"{provider} {endpoint} ({skipped} calls skipped, "
+                            f"circuit {state['state'].replace('_', '-')})")
+    return messages
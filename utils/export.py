@@ -0,0 +1,53 @@
+import csv
+import zlib
+from io import StringIO
+from typing import Any, Dict, Iterable, Iterator, List
+
+# Number of CSV rows buffered into each streamed chunk
+CSV_CHUNK_ROWS = 500
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], columns: List[str]) -> Iterator[bytes]:
+    """
+    Formats rows as CSV incrementally.
+
+    Args:
+        rows: The rows to write, read lazily.
+        columns: The columns to include, in order.
+
+    Yields:
+        UTF-8 encoded chunks of CSV text, starting with the header.
+    """
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CSV_CHUNK_ROWS:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compresses a stream of byte chunks into a gzip stream on the fly.
+
+    Args:
+        chunks: The uncompressed chunks.
+
+    Yields:
+        Chunks of gzip data.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,297 @@
+import os
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.cache import (get_cached_data, get_many_cached_data, get_stale_data, cache_data,
+                         refresh_in_background)
+from utils.circuit_breaker import CircuitOpenError
+from utils.listings import (Listing, decode_listings, encode_listings, get_listing_key,
+                            merge_listings, normalize_listings)
+from utils.pipeline import MAX_IN_FLIGHT, run_ordered
+from utils.rentcast_api import get_fallback_rent, get_rent_estimate
+from utils.singleflight import SingleFlight
+from utils.warehouse import upsert_listings
+from utils.zillow_api import IncompleteListingsError, get_zillow_listings, iter_newest_listings
+
+# Cached listings older than this are topped up with new and changed listings
+# (0 disables incremental refreshes)
+LISTINGS_REFRESH_HOURS = float(os.environ.get("LISTINGS_REFRESH_HOURS", 24))
+
+# Listings are downloaded in full again after this many days, which drops
+# homes that are no longer for sale
+LISTINGS_FULL_REFRESH_DAYS = float(os.environ.get("LISTINGS_FULL_REFRESH_DAYS", 90))
+
+# Downloads that lost some result pages are retried in full after this long
+LISTINGS_INCOMPLETE_RETRY_MINUTES = float(os.environ.get("LISTINGS_INCOMPLETE_RETRY_MINUTES", 15))
+
+_listings_flight = SingleFlight()
+_rent_flight = SingleFlight()
+
+
+def get_refresh_mode(cached: Any) -> Optional[str]:
+    """
+    Decides how a cached listings entry should be refreshed.
+
+    Returns:
+        'full' for a complete download, 'incremental' to merge in new
+        listings, or None if the entry is fresh. Entries in the legacy raw
+        format are used as they are until they expire.
+    """
+    if not isinstance(cached, dict) or 'fetched_at' not in cached:
+        return None
+
+    now = time.time()
+    if now - cached['fetched_at'] > LISTINGS_FULL_REFRESH_DAYS * 86400:
+        return 'full'
+    if not cached.get('complete', True) and now - cached['fetched_at'] > LISTINGS_INCOMPLETE_RETRY_MINUTES * 60:
+        return 'full'
+    if LISTINGS_REFRESH_HOURS and now - cached['refreshed_at'] > LISTINGS_REFRESH_HOURS * 3600:
+        return 'incremental'
+    return None
+
+
+def refresh_listings(zip_code: str, listings: List[Listing]) -> List[Listing]:
+    """
+    Merges listings added or changed since the last fetch into cached listings.
+
+    Pages are read newest first and reading stops at the first page that
+    holds no listing missing from the cache.
+
+    Args:
+        zip_code: The ZIP code to search.
+        listings: The cached listings.
+
+    Returns:
+        The merged listings.
+    """
+    known = {get_listing_key(listing): listing for listing in listings}
+    updates = []
+    for page in iter_newest_listings(zip_code):
+        page_listings = normalize_listings(page, zip_code)
+        upsert_listings(page_listings)
+        updates.extend(listing for listing in page_listings
+                       if known.get(get_listing_key(listing)) != listing)
+        if all(get_listing_key(listing) in known for listing in page_listings):
+            break
+
+    logging.info(f"Incremental refresh for ZIP {zip_code}: {len(updates)} new or changed listings")
+    return merge_listings(listings, updates)
+
+
+def read_cached_listings(zip_code: str) -> Tuple[Any, Optional[List[Listing]]]:
+    """Returns the unexpired cache entry for a ZIP code's listings and its decoded listings."""
+    cached = get_cached_data(f"zillow_listings_{zip_code}")
+    listings = decode_listings(cached, zip_code) if cached else None
+    return cached, listings
+
+
+def load_listings(zip_code: str, force: bool = False) -> List[Listing]:
+    """
+    Brings the cached listings for a ZIP code up to date and returns them.
+
+    Missing entries (or all entries, with force) are downloaded in full;
+    entries past LISTINGS_REFRESH_HOURS are refreshed incrementally.
+    Downloads that lost result pages are cached as incomplete and
+    downloaded again after LISTINGS_INCOMPLETE_RETRY_MINUTES. Concurrent
+    loads of the same ZIP share one API call.
+
+    Args:
+        zip_code: The ZIP code to search.
+        force: Download the listings in full even if the cache is fresh.
+    """
+    cache_key = f"zillow_listings_{zip_code}"
+
+    def load():
+        # A fetch that finished just before this one started may have filled the cache
+        cached, listings = read_cached_listings(zip_code)
+        mode = 'full' if force or not listings else get_refresh_mode(cached)
+        if mode is None:
+            return listings
+
+        now = time.time()
+        if mode == 'incremental':
+            try:
+                listings = refresh_listings(zip_code, listings)
+                cache_data(cache_key, encode_listings(listings, cached['fetched_at'], now,
+                                                      cached.get('complete', True)))
+            except Exception as e:
+                logging.warning(f"Incremental refresh failed for ZIP {zip_code}, using cached listings: {str(e)}")
+            return listings
+
+        complete = True
+        try:
+            fresh_listings = normalize_listings(get_zillow_listings(zip_code), zip_code)
+        except IncompleteListingsError as e:
+            fresh_listings = normalize_listings(e.properties, zip_code)
+            complete = False
+            # Prefer complete cached listings; an incomplete entry is replaced so its retry timer restarts
+            if listings and (not isinstance(cached, dict) or cached.get('complete', True)):
+                logging.warning(f"Full refresh incomplete for ZIP {zip_code}, using cached listings: {str(e)}")
+                upsert_listings(fresh_listings, now)
+                return listings
+            logging.warning(f"Download incomplete for ZIP {zip_code}, retrying in "
+                            f"{LISTINGS_INCOMPLETE_RETRY_MINUTES:g} minutes: {str(e)}")
+        except Exception as e:
+            if not listings:
+                raise
+            logging.warning(f"Full refresh failed for ZIP {zip_code}, using cached listings: {str(e)}")
+            return listings
+
+        if fresh_listings:
+            cache_data(cache_key, encode_listings(fresh_listings, now, complete=complete))
+            upsert_listings(fresh_listings, now)
+        return fresh_listings or listings or []
+
+    return _listings_flight.do(cache_key, load)
+
+
+def fetch_listings(zip_code: str) -> List[Listing]:
+    """
+    Returns the Zillow listings for a ZIP code from cache or the API.
+
+    Listings are normalized once when they are fetched and cached in the
+    compact columnar form. Cached listings that are due for a refresh, and
+    recently expired listings, are returned immediately while they are
+    refreshed in the background; only ZIP codes with nothing cached wait
+    for the API.
+
+    Args:
+        zip_code: The ZIP code to search.
+
+    Returns:
+        A list of listings (empty if the API returned none).
+    """
+    cache_key = f"zillow_listings_{zip_code}"
+
+    cached, listings = read_cached_listings(zip_code)
+    if listings:
+        logging.debug(f"Using cached Zillow data for ZIP {zip_code}")
+        if get_refresh_mode(cached):
+            refresh_in_background(cache_key, lambda: load_listings(zip_code))
+        return listings
+
+    stale = get_stale_data([cache_key]).get(cache_key)
+    listings = decode_listings(stale, zip_code) if stale else None
+    if listings:
+        logging.debug(f"Using stale Zillow data for ZIP {zip_code}")
+        refresh_in_background(cache_key, lambda: load_listings(zip_code))
+        return listings
+
+    return load_listings(zip_code)
+
+
+def load_rent(zip_code: str, bedrooms: int, force: bool = False) -> Optional[float]:
+    """
+    Looks up a rent estimate from the API and caches it.
+
+    Concurrent lookups of the same key share one estimate lookup. While
+    RentCast's circuit is open the static fallback rent is returned and not
+    cached, so real estimates replace it once RentCast recovers.
+
+    Args:
+        zip_code: The ZIP code of the property.
+        bedrooms: The number of bedrooms.
+        force: Look the estimate up even if the cache is fresh.
+    """
+    cache_key = f"rentcast_{zip_code}_{bedrooms}"
+
+    def load():
+        if not force:
+            rent = get_cached_data(cache_key)
+            if rent:
+                return rent
+        try:
+            rent = get_rent_estimate(zip_code, bedrooms)
+        except CircuitOpenError as e:
+            logging.info(f"Using fallback rent for ZIP {zip_code}, {bedrooms} BR: {str(e)}")
+            return get_fallback_rent(zip_code, bedrooms)
+        if rent:
+            cache_data(cache_key, rent)
+        return rent
+
+    return _rent_flight.do(cache_key, load)
+
+
+def fetch_rent(zip_code: str, bedrooms: int) -> Optional[float]:
+    """
+    Returns the rent estimate for a ZIP code and bedroom count from cache or the API.
+
+    A recently expired estimate is returned immediately and refreshed in
+    the background.
+
+    Args:
+        zip_code: The ZIP code of the property.
+        bedrooms: The number of bedrooms.
+
+    Returns:
+        The estimated monthly rent, or None if no estimate was available.
+    """
+    cache_key = f"rentcast_{zip_code}_{bedrooms}"
+    cached_rent = get_cached_data(cache_key)
+    if cached_rent:
+        return cached_rent
+
+    stale_rent = get_stale_data([cache_key]).get(cache_key)
+    if stale_rent:
+        refresh_in_background(cache_key, lambda: load_rent(zip_code, bedrooms))
+        return stale_rent
+
+    return load_rent(zip_code, bedrooms)
+
+
+def fetch_rent_grid(zip_code: str, bedroom_counts: Iterable[int]) -> Dict[int, Optional[float]]:
+    """
+    Returns rent estimates for every bedroom count needed in a ZIP code.
+
+    Cached estimates are read in one bulk lookup and recently expired ones
+    are served while they refresh in the background; the misses are fetched
+    in parallel, each using the fallback ordering of get_rent_estimate.
+
+    Args:
+        zip_code: The ZIP code of the properties.
+        bedroom_counts: The bedroom counts to look up.
+
+    Returns:
+        A dictionary of bedroom count to rent estimate (None if no estimate
+        was available). Bedroom counts whose lookup failed are omitted.
+    """
+    bedroom_counts = list(dict.fromkeys(bedroom_counts))
+    keys = {bedrooms: f"rentcast_{zip_code}_{bedrooms}" for bedrooms in bedroom_counts}
+    cached = get_many_cached_data(keys.values())
+
+    grid = {}
+    missing = []
+    for bedrooms, cache_key in keys.items():
+        if cached.get(cache_key):
+            grid[bedrooms] = cached[cache_key]
+        else:
+            missing.append(bedrooms)
+
+    # Serve recently expired estimates while they are refreshed in the background
+    stale = get_stale_data(keys[bedrooms] for bedrooms in missing)
+    for bedrooms in list(missing):
+        if stale.get(keys[bedrooms]):
+            grid[bedrooms] = stale[keys[bedrooms]]
+            refresh_in_background(keys[bedrooms],
+                                  lambda bedrooms=bedrooms: load_rent(zip_code, bedrooms))
+            missing.remove(bedrooms)
+
+    if not missing:
+        return grid
+
+    logging.info(f"Fetching rent estimates for ZIP {zip_code}, bedrooms: {', '.join(map(str, missing))}")
+
+    def load(bedrooms):
+        try:
+            return bedrooms, load_rent(zip_code, bedrooms), None
+        except Exception as e:
+            return bedrooms, None, e
+
+    for bedrooms, rent, error in run_ordered(load, missing, max_workers=MAX_IN_FLIGHT["rentcast"]):
+        if error is not None:
+            logging.warning(f"Rent estimate failed for ZIP {zip_code}, {bedrooms} BR: {str(error)}")
+            continue
+        grid[bedrooms] = rent
+
+    return grid
@@ -0,0 +1,167 @@
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.circuit_breaker import CIRCUIT_BREAKER_ENABLED, get_breaker
+from utils.metrics import UPSTREAM_REQUESTS, span
+from utils.pipeline import provider_slot
+from utils.rate_limit import throttle, record_call
+
+# Connection pool and timeout settings shared by all upstream clients
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 20))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 20))
+
+# Retry settings for connection errors, timeouts, 429 and 5xx responses
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", 0.5))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", 30))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the shared pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                                      pool_maxsize=HTTP_POOL_SIZE,
+                                      max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Parses the Retry-After header of a response.
+
+    Args:
+        response: The HTTP response.
+
+    Returns:
+        The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff_delay(attempt: int) -> float:
+    """Returns the exponential backoff delay (with jitter) for a retry attempt."""
+    delay = min(HTTP_BACKOFF_BASE * (2 ** attempt), HTTP_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def http_get(provider: str, url: str, headers: Optional[Dict[str, str]] = None,
+             params: Optional[Dict[str, Any]] = None) -> requests.Response:
+    """
+    Performs a GET request through the shared session.
+
+    Every attempt waits for the provider's rate limit and is counted against
+    its monthly quota. Connection errors, timeouts, 429 and 5xx responses are
+    retried with exponential backoff, honouring Retry-After when the server
+    sends it. Attempts go through the circuit breaker of the provider
+    endpoint, so a failing endpoint is skipped without waiting on it.
+
+    Args:
+        provider: The provider name, used for in-flight limits and logging.
+        url: The request URL.
+        headers: Optional request headers.
+        params: Optional query parameters.
+
+    Returns:
+        The final response. Retryable statuses are returned once retries are exhausted.
+
+    Raises:
+        requests.RequestException: If the request still fails after all retries.
+        QuotaExceededError: If the provider's monthly quota has been used up.
+        CircuitOpenError: If the provider endpoint's circuit is open.
+    """
+    session = get_session()
+    timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    endpoint = urlparse(url).path
+    breaker = get_breaker(provider, endpoint) if CIRCUIT_BREAKER_ENABLED else None
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        # Checked before throttling so rejected calls do not use up rate limit tokens
+        if breaker:
+            breaker.before_call()
+        try:
+            with span(f"throttle.{provider}"):
+                throttle(provider)
+        except Exception:
+            if breaker:
+                breaker.cancel_call()
+            raise
+
+        try:
+            with provider_slot(provider), span(f"http.{provider}"):
+                started = time.perf_counter()
+                response = session.get(url, headers=headers, params=params,
+                                       timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if breaker:
+                breaker.after_call(False, time.perf_counter() - started)
+            record_call(provider, endpoint, success=False)
+            UPSTREAM_REQUESTS.inc(provider=provider, status="error")
+            if attempt >= HTTP_MAX_RETRIES:
+                raise
+            if breaker:
+                breaker.check_open()
+            delay = get_backoff_delay(attempt)
+            logging.warning(f"{provider} request to {url} failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        except Exception:
+            if breaker:
+                breaker.cancel_call()
+            raise
+
+        if breaker:
+            breaker.after_call(response.status_code not in RETRY_STATUSES,
+                               time.perf_counter() - started)
+        record_call(provider, endpoint, success=response.status_code < 400)
+        UPSTREAM_REQUESTS.inc(provider=provider, status=response.status_code)
+
+        if response.status_code not in RETRY_STATUSES or attempt >= HTTP_MAX_RETRIES:
+            return response
+
+        # Don't wait to retry an endpoint whose circuit has just opened
+        if breaker:
+            breaker.check_open()
+
+        delay = get_retry_after(response)
+        if delay is None:
+            delay = get_backoff_delay(attempt)
+        delay = min(delay, HTTP_BACKOFF_MAX)
+        logging.warning(f"{provider} returned {response.status_code} for {url}, retrying in {delay:.1f}s")
+        response.close()
+        time.sleep(delay)
@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.cache import transaction
+from utils.pipeline import ZIP_WORKERS, iter_completed
+
+# Jobs are kept next to the application in the instance folder
+JOBS_DB_PATH = os.environ.get(
+    "JOBS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "instance", "jobs.db"))
+
+# Number of job runner threads per process (0 disables background processing)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+
+# A running job whose lease is not renewed within this many seconds is
+# considered abandoned (e.g. the worker was restarted) and is picked up again.
+# Runners renew the lease every third of this while the job is running
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", 300))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 2))
+
+# Background jobs are not bound by the request timeout, so allow larger batches
+JOB_MAX_ZIPS = int(os.environ.get("JOB_MAX_ZIPS", 5000))
+
+_local = threading.local()
+_wakeup = threading.Event()
+_workers_lock = threading.Lock()
+_workers: List[threading.Thread] = []
+
+
+class LeaseLostError(Exception):
+    """Raised when a job was reclaimed by another runner while this one was running it."""
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns this thread's connection to the jobs database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(JOBS_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                parameters TEXT NOT NULL,
+                zip_codes TEXT NOT NULL,
+                zip_count INTEGER NOT NULL,
+                zips_done INTEGER NOT NULL DEFAULT 0,
+                listings_scanned INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                lease_expires_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS job_zips (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                zip_code TEXT NOT NULL,
+                results TEXT NOT NULL,
+                listings_scanned INTEGER NOT NULL,
+                used_sample INTEGER NOT NULL,
+                PRIMARY KEY (job_id, position)
+            );
+        """)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # The write lock serialises concurrent workers upgrading the schema
+            with transaction(conn):
+                if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                    # Identifies the runner that holds a job's lease
+                    conn.execute("ALTER TABLE jobs ADD COLUMN claim_token TEXT")
+                    conn.execute("PRAGMA user_version = 1")
+        _local.conn = conn
+    return conn
+
+
+def submit_job(zip_codes: List[str], parameters: Dict[str, Any]) -> str:
+    """
+    Queues an analysis job.
+
+    Args:
+        zip_codes: The ZIP codes to analyze, in result order.
+        parameters: The mortgage parameters and filter criteria.
+
+    Returns:
+        The new job ID.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = get_connection()
+    with transaction(conn):
+        conn.execute("""
+            INSERT INTO jobs (id, status, parameters, zip_codes, zip_count, created_at, updated_at)
+            VALUES (?, 'queued', ?, ?, ?, ?, ?)
+        """, (job_id, json.dumps(parameters), json.dumps(zip_codes), len(zip_codes), now, now))
+
+    logging.info(f"Queued job {job_id} for {len(zip_codes)} ZIP codes")
+    _wakeup.set()
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the status and progress of a job.
+
+    Args:
+        job_id: The job ID.
+
+    Returns:
+        A dictionary describing the job, or None if it does not exist.
+    """
+    row = get_connection().execute("""
+        SELECT id, status, parameters, zip_count, zips_done, listings_scanned,
+               failures, error, created_at, updated_at
+        FROM jobs WHERE id = ?
+    """, (job_id, )).fetchone()
+    if row is None:
+        return None
+
+    return {
+        'job_id': row[0],
+        'status': row[1],
+        'parameters': json.loads(row[2]),
+        'zip_count': row[3],
+        'zips_done': row[4],
+        'listings_scanned': row[5],
+        'failures': row[6],
+        'error': row[7],
+        'created_at': row[8],
+        'updated_at': row[9]
+    }
+
+
+def get_job_results(job_id: str) -> List[Dict[str, Any]]:
+    """
+    Returns the results of the ZIP codes a job has finished so far.
+
+    Args:
+        job_id: The job ID.
+
+    Returns:
+        The matching properties, in the order the ZIP codes were submitted.
+    """
+    rows = get_connection().execute(
+        "SELECT results FROM job_zips WHERE job_id = ? ORDER BY position",
+        (job_id, )).fetchall()
+
+    results = []
+    for (zip_results, ) in rows:
+        results.extend(json.loads(zip_results))
+    return results
+
+
+def claim_job() -> Optional[Dict[str, Any]]:
+    """
+    Takes the oldest queued job, or a running job whose lease has expired.
+
+    Returns:
+        The claimed job's ID, parameters, ZIP codes and the claim token that
+        proves this runner holds its lease, or None if there is no work.
+    """
+    now = time.time()
+    token = uuid.uuid4().hex
+    conn = get_connection()
+    with transaction(conn):
+        row = conn.execute("""
+            SELECT id, parameters, zip_codes FROM jobs
+            WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)
+            ORDER BY created_at LIMIT 1
+        """, (now, )).fetchone()
+        if row is None:
+            return None
+        conn.execute("""
+            UPDATE jobs SET status = 'running', claim_token = ?, lease_expires_at = ?, updated_at = ?
+            WHERE id = ?
+        """, (token, now + JOB_LEASE_SECONDS, now, row[0]))
+
+    return {
+        'job_id': row[0],
+        'parameters': json.loads(row[1]),
+        'zip_codes': json.loads(row[2]),
+        'claim_token': token
+    }
+
+
+def renew_lease(job_id: str, token: str) -> bool:
+    """
+    Extends the lease of a running job.
+
+    Returns:
+        False if the job is no longer running under this claim token.
+    """
+    now = time.time()
+    conn = get_connection()
+    with transaction(conn):
+        cursor = conn.execute("""
+            UPDATE jobs SET lease_expires_at = ?
+            WHERE id = ? AND claim_token = ? AND status = 'running'
+        """, (now + JOB_LEASE_SECONDS, job_id, token))
+    return cursor.rowcount > 0
+
+
+def keep_lease(job_id: str, token: str, stop: threading.Event, lost: threading.Event) -> None:
+    """Renews a job's lease until stop is set, setting lost if another runner took the job."""
+    while not stop.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            if not renew_lease(job_id, token):
+                logging.warning(f"Job {job_id} was reclaimed by another runner")
+                lost.set()
+                return
+        except sqlite3.Error as e:
+            logging.warning(f"Error renewing the lease of job {job_id}: {str(e)}")
+
+
+def record_zip(job_id: str, position: int, outcome: Dict[str, Any]) -> None:
+    """Saves a finished ZIP code's outcome and updates progress."""
+    now = time.time()
+    conn = get_connection()
+    with transaction(conn):
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO job_zips
+                (job_id, position, zip_code, results, listings_scanned, used_sample)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (job_id, position, outcome['zip_code'],
+              json.dumps(outcome['results'], separators=(',', ':')),
+              outcome['listings_scanned'], 1 if outcome['used_sample'] else 0))
+        if cursor.rowcount:
+            conn.execute("""
+                UPDATE jobs SET zips_done = zips_done + 1,
+                                listings_scanned = listings_scanned + ?,
+                                failures = failures + ?,
+                                updated_at = ?
+                WHERE id = ?
+            """, (outcome['listings_scanned'], 1 if outcome['used_sample'] else 0,
+                  now, job_id))
+
+
+def finish_job(job_id: str, token: str, error: Optional[str] = None) -> bool:
+    """
+    Marks a job as completed, or as failed if an error is given.
+
+    Returns:
+        False if the job was reclaimed by another runner, which then finishes it.
+    """
+    conn = get_connection()
+    with transaction(conn):
+        cursor = conn.execute("""
+            UPDATE jobs SET status = ?, error = ?, lease_expires_at = NULL, updated_at = ?
+            WHERE id = ? AND claim_token = ? AND status = 'running'
+        """, ('failed' if error else 'completed', error, time.time(), job_id, token))
+    return cursor.rowcount > 0
+
+
+def run_job(job: Dict[str, Any], process_zip: Callable[[str, Dict[str, Any]], Dict[str, Any]]) -> None:
+    """
+    Processes the ZIP codes of a job that have not been finished yet.
+
+    The job's lease is renewed in the background while it runs. If another
+    runner reclaims the job anyway, no further ZIP codes are started and
+    the job is left to that runner. Each ZIP code's outcome is released
+    once it is recorded, so memory does not grow with the job size.
+
+    Args:
+        job: The claimed job.
+        process_zip: Analyzes one ZIP code with the job's parameters.
+    """
+    job_id = job['job_id']
+    token = job['claim_token']
+    parameters = job['parameters']
+
+    done = {row[0] for row in get_connection().execute(
+        "SELECT position FROM job_zips WHERE job_id = ?", (job_id, ))}
+    pending = [(position, zip_code) for position, zip_code in enumerate(job['zip_codes'])
+               if position not in done]
+
+    if done:
+        logging.info(f"Resuming job {job_id}: {len(done)} ZIP codes already done")
+
+    stop = threading.Event()
+    lost = threading.Event()
+
+    def process(item):
+        # Don't spend API quota on a job another runner has taken over
+        if lost.is_set():
+            raise LeaseLostError(f"Job {job_id} was reclaimed by another runner")
+        outcome = process_zip(item[1], parameters)
+        # Keep only what record_zip stores (not e.g. the priced candidates)
+        return {key: outcome[key] for key in ('zip_code', 'results', 'listings_scanned', 'used_sample')}
+
+    heartbeat = threading.Thread(target=keep_lease, args=(job_id, token, stop, lost),
+                                 name=f"job-lease-{job_id[:8]}", daemon=True)
+    heartbeat.start()
+    try:
+        for index, outcome in iter_completed(process, pending, ZIP_WORKERS):
+            record_zip(job_id, pending[index][0], outcome)
+            del outcome
+        if finish_job(job_id, token):
+            logging.info(f"Job {job_id} completed")
+        else:
+            logging.warning(f"Job {job_id} was reclaimed by another runner before it completed")
+    except LeaseLostError as e:
+        logging.warning(str(e))
+    except Exception as e:
+        logging.error(f"Job {job_id} failed: {str(e)}")
+        finish_job(job_id, token, str(e))
+    finally:
+        stop.set()
+
+
+def worker_loop(process_zip: Callable[[str, Dict[str, Any]], Dict[str, Any]]) -> None:
+    """Claims and runs jobs until the process exits."""
+    while True:
+        try:
+            job = claim_job()
+        except sqlite3.Error as e:
+            logging.warning(f"Error claiming job: {str(e)}")
+            job = None
+
+        if job is None:
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        run_job(job, process_zip)
+
+
+def start_workers(process_zip: Callable[[str, Dict[str, Any]], Dict[str, Any]]) -> None:
+    """
+    Starts the background job runner threads for this process.
+
+    Queued jobs and jobs abandoned by a previous process are picked up as
+    soon as the runners start. Calling this more than once has no effect.
+
+    Args:
+        process_zip: Analyzes one ZIP code with a job's parameters.
+    """
+    with _workers_lock:
+        if _workers or JOB_WORKERS <= 0:
+            return
+        for i in range(JOB_WORKERS):
+            thread = threading.Thread(target=worker_loop, args=(process_zip, ),
+                                      name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            _workers.append(thread)
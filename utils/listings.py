@@ -0,0 +1,169 @@
+import re
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# Bumped whenever the cached listing format changes
+LISTINGS_FORMAT_VERSION = 2
+
+# Property types in type code order
+PROPERTY_TYPES = ("Single Family", "Multifamily", "Condo")
+
+LISTING_FIELDS = ("zpid", "address", "price", "bedrooms", "type_code", "link", "zip_code")
+
+# Trailing ZIP (or ZIP+4) of an address such as "217 E Circle Dr, Mason, OH 45040"
+ZIP_PATTERN = re.compile(r"\b(\d{5})(?:-\d{4})?\s*$")
+
+
+@dataclass(slots=True)
+class Listing:
+    """A for-sale listing reduced to the fields the analysis uses."""
+    zpid: Optional[str]
+    address: str
+    price: float
+    bedrooms: int
+    type_code: int
+    link: Optional[str]
+    zip_code: str
+
+    @property
+    def property_type(self) -> str:
+        return PROPERTY_TYPES[self.type_code]
+
+
+def get_type_code(home_type: str) -> int:
+    """Maps a Zillow home type such as 'MULTI_FAMILY' to a type code."""
+    home_type = (home_type or '').lower()
+    if 'multi' in home_type:
+        return 1
+    if 'condo' in home_type:
+        return 2
+    return 0
+
+
+def normalize_listing(listing: Dict[str, Any], zip_code: str) -> Listing:
+    """
+    Converts a raw Zillow listing to a Listing.
+
+    Missing bedroom counts default to 3 and unparseable prices to 0, so
+    callers only need to check the price.
+
+    Args:
+        listing: The raw listing from the search or sale endpoint.
+        zip_code: The ZIP code the listing was found in.
+    """
+    home_info = listing.get('hdpData', {}).get('homeInfo', {})
+
+    bedrooms = listing.get('bedrooms', 0) or home_info.get('bedrooms', 0)
+    try:
+        bedrooms = int(bedrooms or 3)
+    except (ValueError, TypeError):
+        bedrooms = 3
+
+    price = listing.get('price', 0) or home_info.get('price', 0)
+    if isinstance(price, str):
+        try:
+            price = float(price.replace('$', '').replace(',', ''))
+        except ValueError:
+            price = 0
+    elif not isinstance(price, (int, float)):
+        price = 0
+
+    street = listing.get('streetAddress', listing.get('address', ''))
+    address_parts = [street, listing.get('city', ''), listing.get('state', ''), zip_code]
+    address = ", ".join([part for part in address_parts if part]) or f"Property in {zip_code}"
+
+    # Searches can return homes from neighbouring ZIP codes
+    match = ZIP_PATTERN.search(str(listing.get('address') or ''))
+    home_zip = str(listing.get('zipcode') or home_info.get('zipcode') or
+                   (match.group(1) if match else zip_code))
+
+    zpid = listing.get('zpid')
+    return Listing(
+        zpid=str(zpid) if zpid else None,
+        address=address,
+        price=price,
+        bedrooms=bedrooms,
+        type_code=get_type_code(listing.get('propertyType', listing.get('homeType', ''))),
+        link=listing.get('detailUrl', listing.get('imgSrc', '#')),
+        zip_code=home_zip)
+
+
+def normalize_listings(listings: List[Dict[str, Any]], zip_code: str) -> List[Listing]:
+    """Converts raw Zillow listings to Listings, skipping any that cannot be read."""
+    normalized = []
+    for listing in listings:
+        try:
+            normalized.append(normalize_listing(listing, zip_code))
+        except (AttributeError, TypeError) as e:
+            logging.debug(f"Skipping unreadable listing in ZIP {zip_code}: {str(e)}")
+    return normalized
+
+
+def get_listing_key(listing: Listing) -> str:
+    """Returns the key that identifies a listing across fetches: its zpid, or its address."""
+    return listing.zpid or listing.address
+
+
+def merge_listings(listings: List[Listing], updates: List[Listing]) -> List[Listing]:
+    """
+    Applies new and changed listings to a cached list.
+
+    Updated listings replace the cached listing with the same key in place;
+    listings that were not cached before are appended.
+    """
+    merged = {get_listing_key(listing): listing for listing in listings}
+    for listing in updates:
+        merged[get_listing_key(listing)] = listing
+    return list(merged.values())
+
+
+def encode_listings(listings: List[Listing], fetched_at: float,
+                    refreshed_at: Optional[float] = None,
+                    complete: bool = True) -> Dict[str, Any]:
+    """
+    Packs Listings into the columnar form stored in the cache.
+
+    Storing one list per field avoids repeating every key for every listing.
+
+    Args:
+        listings: The listings.
+        fetched_at: When the listings were last downloaded in full.
+        refreshed_at: When new listings were last merged in. Defaults to fetched_at.
+        complete: False if some result pages of the download failed.
+    """
+    return {
+        'version': LISTINGS_FORMAT_VERSION,
+        'fetched_at': fetched_at,
+        'refreshed_at': refreshed_at or fetched_at,
+        'complete': complete,
+        'columns': {field: [getattr(listing, field) for listing in listings]
+                    for field in LISTING_FIELDS}
+    }
+
+
+def decode_listings(data: Any, zip_code: str) -> Optional[List[Listing]]:
+    """
+    Unpacks cached listings.
+
+    Entries written before listings were normalized hold the raw Zillow
+    payload; they are normalized on read until they expire.
+
+    Args:
+        data: The cached value.
+        zip_code: The ZIP code the listings belong to.
+
+    Returns:
+        The listings, or None if the entry was written in another format
+        version and should be fetched again.
+    """
+    if isinstance(data, list):
+        return normalize_listings(data, zip_code)
+    if data.get('version') not in (1, LISTINGS_FORMAT_VERSION):
+        return None
+
+    columns = data['columns']
+    if 'zip_code' not in columns:
+        # Version 1 entries predate the listing's own ZIP code
+        columns = {**columns, 'zip_code': [zip_code] * len(columns['zpid'])}
+    return [Listing(*row) for row in zip(*(columns[field] for field in LISTING_FIELDS))]
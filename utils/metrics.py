@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Spans and request timings are recorded unless METRICS_ENABLED=0
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") not in ("0", "false")
+
+# Log one JSON line per request with its timing breakdown, optionally only
+# for requests slower than METRICS_SLOW_REQUEST_MS
+METRICS_LOG_REQUESTS = os.environ.get("METRICS_LOG_REQUESTS", "0") in ("1", "true")
+METRICS_SLOW_REQUEST_MS = float(os.environ.get("METRICS_SLOW_REQUEST_MS", 0))
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    """Formats label values in the Prometheus text format, e.g. {span="cache.get"}."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Observation counts in cumulative buckets, plus their sum, per label combination."""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {count}")
+        return lines
+
+
+SPAN_SECONDS = Histogram("app_span_seconds", "Time spent in instrumented code.", ["span"])
+REQUEST_SECONDS = Histogram("app_request_seconds", "Request handling time.",
+                            ["endpoint", "method", "status"])
+UPSTREAM_REQUESTS = Counter("app_upstream_requests_total", "Upstream API responses by status.",
+                            ["provider", "status"])
+
+
+class RequestTimings:
+    """Accumulates span times for one request, including work on pool threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self.lock:
+            entry = self.spans.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns call counts and total milliseconds per span."""
+        with self.lock:
+            return {name: {"count": count, "ms": round(seconds * 1000, 2)}
+                    for name, (count, seconds) in sorted(self.spans.items())}
+
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Records time spent in a span for the metrics and the current request."""
+    SPAN_SECONDS.observe(seconds, span=name)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Times a block of code.
+
+    Span times are summed per request, including time spent on worker
+    threads started with utils.pipeline, and counted in app_span_seconds.
+
+    Args:
+        name: The span name, e.g. "cache.get".
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def timed(name: str) -> Callable:
+    """Decorator that runs a function inside span(name)."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def start_request() -> None:
+    """Starts collecting span times for the current request."""
+    if METRICS_ENABLED:
+        _current_timings.set(RequestTimings())
+
+
+def finish_request(endpoint: Optional[str], method: str, path: str, status: int) -> None:
+    """
+    Records the current request's duration and logs its breakdown if enabled.
+
+    Streamed responses are measured until the response starts.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return
+    _current_timings.set(None)
+
+    seconds = time.perf_counter() - timings.started
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint or "unknown", method=method, status=status)
+
+    if METRICS_LOG_REQUESTS and seconds * 1000 >= METRICS_SLOW_REQUEST_MS:
+        logging.info(json.dumps({
+            "event": "request",
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "status": status,
+            "ms": round(seconds * 1000, 2),
+            "spans": timings.summary()
+        }))
+
+
+def render_metrics(gauges: Optional[Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], Any]]]] = None) -> str:
+    """
+    Renders all metrics of this process in the Prometheus text format.
+
+    Each gunicorn worker keeps its own metrics, so scrape every worker or
+    aggregate by instance.
+
+    Args:
+        gauges: Extra point-in-time values as {name: (description, {labels: value})},
+            where labels is a tuple of (name, value) pairs.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+
+    for name, (description, values) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values.items():
+            names = tuple(label for label, _ in labels)
+            label_values = tuple(label_value for _, label_value in labels)
+            lines.append(f"{name}{format_labels(names, label_values)} {value}")
+
+    return "\n".join(lines) + "\n"
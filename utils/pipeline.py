@@ -0,0 +1,113 @@
+import os
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+# Maximum number of ZIP codes processed at the same time
+ZIP_WORKERS = int(os.environ.get("ZIP_WORKERS", 16))
+
+# Maximum number of in-flight upstream requests per provider
+MAX_IN_FLIGHT = {
+    "zillow": int(os.environ.get("ZILLOW_MAX_IN_FLIGHT", 4)),
+    "rentcast": int(os.environ.get("RENTCAST_MAX_IN_FLIGHT", 8)),
+}
+
+_provider_slots = {
+    provider: threading.BoundedSemaphore(max(limit, 1))
+    for provider, limit in MAX_IN_FLIGHT.items()
+}
+
+
+@contextmanager
+def provider_slot(provider: str):
+    """
+    Blocks until the provider has a free in-flight request slot.
+
+    Args:
+        provider: The provider name ("zillow" or "rentcast").
+    """
+    slot = _provider_slots[provider]
+    slot.acquire()
+    try:
+        yield
+    finally:
+        slot.release()
+
+
+def run_ordered(func: Callable[[Any], Any], items: Iterable[Any],
+                max_workers: int = ZIP_WORKERS) -> List[Any]:
+    """
+    Runs func over items on a bounded thread pool.
+
+    Args:
+        func: The function to call for each item.
+        items: The items to process.
+        max_workers: The maximum number of items processed at once.
+
+    Returns:
+        The results in the same order as items, as a sequential run would produce.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = max(1, min(max_workers, len(items)))
+    logging.info(f"Processing {len(items)} items with {workers} workers")
+
+    if workers == 1:
+        return [func(item) for item in items]
+
+    # Each item runs in a copy of the caller's context so request metrics follow it
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def iter_completed(func: Callable[[Any], Any], items: Iterable[Any],
+                   max_workers: int = ZIP_WORKERS) -> Iterator[Tuple[int, Any]]:
+    """
+    Runs func over items on a bounded thread pool, yielding results as they finish.
+
+    Items are submitted through a sliding window of twice the worker count,
+    and a result is no longer referenced by the pool once it has been
+    yielded, so memory is bounded by the window rather than by the number
+    of items.
+
+    Args:
+        func: The function to call for each item.
+        items: The items to process.
+        max_workers: The maximum number of items processed at once.
+
+    Yields:
+        Tuples of (index of the item in items, result) in completion order.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    workers = max(1, min(max_workers, len(items)))
+    window = workers * 2
+    next_index = 0
+    futures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while futures or next_index < len(items):
+                # Keep the workers busy while the consumer handles results
+                while next_index < len(items) and len(futures) < window:
+                    future = executor.submit(contextvars.copy_context().run, func, items[next_index])
+                    futures[future] = next_index
+                    next_index += 1
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures.pop(future)
+                    result = future.result()
+                    yield index, result
+                del done, future, result
+        finally:
+            # Stop queued work if the consumer goes away early
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,227 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Usage counters are kept next to the application in the instance folder
+USAGE_DB_PATH = os.environ.get(
+    "API_USAGE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "instance", "api_usage.db"))
+
+# Per-provider limits. Rates are requests per second for this process, so
+# divide the provider's allowance by the number of gunicorn workers.
+RATE_LIMITS = {
+    "zillow": {
+        "rate": float(os.environ.get("ZILLOW_RATE_LIMIT", 2)),
+        "burst": int(os.environ.get("ZILLOW_BURST", 2)),
+        "monthly_quota": int(os.environ.get("ZILLOW_MONTHLY_QUOTA", 0)),
+    },
+    "rentcast": {
+        "rate": float(os.environ.get("RENTCAST_RATE_LIMIT", 5)),
+        "burst": int(os.environ.get("RENTCAST_BURST", 5)),
+        "monthly_quota": int(os.environ.get("RENTCAST_MONTHLY_QUOTA", 0)),
+    },
+}
+
+
+class QuotaExceededError(Exception):
+    """Raised when a provider's monthly call quota has been used up."""
+
+
+class TokenBucket:
+    """A thread-safe token bucket that refills at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Takes one token, blocking until one is available.
+
+        Returns:
+            The number of seconds spent waiting.
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+
+                delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+_buckets = {
+    provider: TokenBucket(limits["rate"], limits["burst"])
+    for provider, limits in RATE_LIMITS.items()
+}
+
+_local = threading.local()
+
+
+def set_rate_share(share: float) -> None:
+    """
+    Limits this process to a share of the configured request rates.
+
+    Used when several processes split one provider allowance, e.g. the
+    batch runner's process pool.
+
+    Args:
+        share: The share of each provider's rate, e.g. 0.25 for one of four processes.
+    """
+    for provider, limits in RATE_LIMITS.items():
+        _buckets[provider].rate = limits["rate"] * share
+
+
+def get_current_month() -> str:
+    """Returns the current month as YYYY-MM, the period quotas are counted in."""
+    return datetime.now().strftime("%Y-%m")
+
+
+def get_usage_connection() -> sqlite3.Connection:
+    """Returns this thread's connection to the usage database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(USAGE_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(USAGE_DB_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS api_usage (
+                month TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (month, provider, endpoint)
+            )
+        """)
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+
+def get_monthly_calls(provider: str, month: Optional[str] = None) -> int:
+    """
+    Returns the number of calls made to a provider in a month.
+
+    Args:
+        provider: The provider name.
+        month: The month as YYYY-MM. Defaults to the current month.
+    """
+    try:
+        row = get_usage_connection().execute(
+            "SELECT COALESCE(SUM(calls), 0) FROM api_usage WHERE month = ? AND provider = ?",
+            (month or get_current_month(), provider)).fetchone()
+        return row[0]
+    except sqlite3.Error as e:
+        logging.warning(f"Error reading API usage for {provider}: {str(e)}")
+        return 0
+
+
+def record_call(provider: str, endpoint: str, success: bool) -> None:
+    """
+    Adds one call to the persistent monthly counter for a provider endpoint.
+
+    Args:
+        provider: The provider name.
+        endpoint: The endpoint path that was called.
+        success: Whether the call returned a usable response.
+    """
+    try:
+        conn = get_usage_connection()
+        with conn:
+            conn.execute("""
+                INSERT INTO api_usage (month, provider, endpoint, calls, errors)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT (month, provider, endpoint)
+                DO UPDATE SET calls = calls + 1, errors = errors + excluded.errors
+            """, (get_current_month(), provider, endpoint, 0 if success else 1))
+    except sqlite3.Error as e:
+        logging.warning(f"Error recording API usage for {provider}: {str(e)}")
+
+
+def throttle(provider: str) -> None:
+    """
+    Waits for the provider's rate limit and checks its monthly quota.
+
+    Args:
+        provider: The provider name.
+
+    Raises:
+        QuotaExceededError: If the provider's monthly quota has been used up.
+    """
+    limits = RATE_LIMITS.get(provider)
+    if not limits:
+        return
+
+    quota = limits["monthly_quota"]
+    if quota and get_monthly_calls(provider) >= quota:
+        raise QuotaExceededError(f"Monthly {provider} quota of {quota} calls exhausted")
+
+    waited = _buckets[provider].acquire()
+    if waited:
+        logging.debug(f"Rate limited {provider} request for {waited:.2f}s")
+
+
+def get_usage_report(month: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Summarises API calls by provider and endpoint for a month.
+
+    Args:
+        month: The month as YYYY-MM. Defaults to the current month.
+
+    Returns:
+        A dictionary with per-provider totals, quotas and endpoint breakdowns.
+    """
+    month = month or get_current_month()
+    report = {"month": month, "providers": {}}
+
+    for provider, limits in RATE_LIMITS.items():
+        report["providers"][provider] = {
+            "calls": 0,
+            "errors": 0,
+            "monthly_quota": limits["monthly_quota"] or None,
+            "rate_limit": limits["rate"],
+            "endpoints": {}
+        }
+
+    try:
+        rows = get_usage_connection().execute(
+            "SELECT provider, endpoint, calls, errors FROM api_usage WHERE month = ? ORDER BY provider, endpoint",
+            (month, )).fetchall()
+    except sqlite3.Error as e:
+        logging.warning(f"Error reading API usage report: {str(e)}")
+        return report
+
+    for provider, endpoint, calls, errors in rows:
+        entry = report["providers"].setdefault(provider, {
+            "calls": 0,
+            "errors": 0,
+            "monthly_quota": None,
+            "rate_limit": None,
+            "endpoints": {}
+        })
+        entry["calls"] += calls
+        entry["errors"] += errors
+        entry["endpoints"][endpoint] = {"calls": calls, "errors": errors}
+
+    return report
@@ -0,0 +1,141 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import List, Tuple
+
+from utils.cache import transaction
+
+# Probe history is kept next to the application in the instance folder
+RENT_PROBES_DB_PATH = os.environ.get(
+    "RENT_PROBES_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "instance", "rent_probes.db"))
+
+# (ZIP, bedrooms, property type) combinations RentCast has no data for are
+# skipped for this many days (0 disables the negative cache)
+RENT_NEGATIVE_TTL_DAYS = float(os.environ.get("RENT_NEGATIVE_TTL_DAYS", 7))
+
+# Probes are ordered by their past hit rate in ZIP codes sharing this many
+# leading digits (0 keeps the fixed order)
+RENT_PROBE_PREFIX_LENGTH = int(os.environ.get("RENT_PROBE_PREFIX_LENGTH", 3))
+
+# A probe is a (bedrooms, property type) combination to query
+Probe = Tuple[int, str]
+
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns this thread's connection to the probe history database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(RENT_PROBES_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(RENT_PROBES_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS empty_probes (
+                zip_code TEXT NOT NULL,
+                bedrooms INTEGER NOT NULL,
+                property_type TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (zip_code, bedrooms, property_type)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_empty_probes_expires ON empty_probes (expires_at);
+            CREATE TABLE IF NOT EXISTS probe_stats (
+                zip_prefix TEXT NOT NULL,
+                bedrooms INTEGER NOT NULL,
+                property_type TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (zip_prefix, bedrooms, property_type)
+            ) WITHOUT ROWID;
+        """)
+        _local.conn = conn
+    return conn
+
+
+def get_zip_prefix(zip_code: str) -> str:
+    """Returns the ZIP prefix probe hit rates are shared under."""
+    return zip_code[:RENT_PROBE_PREFIX_LENGTH]
+
+
+def plan_probes(zip_code: str, tiers: List[List[Probe]]) -> List[List[Probe]]:
+    """
+    Orders the probes of each tier for a ZIP code and drops known-empty ones.
+
+    Within a tier, probes are sorted by their smoothed hit rate in ZIP codes
+    with the same prefix, keeping the given order for ties and unseen
+    probes. Tiers themselves keep their order, so an exact bedroom match is
+    still preferred over an adjusted one.
+
+    Args:
+        zip_code: The ZIP code to look up.
+        tiers: Lists of (bedrooms, property type) probes in their default order.
+
+    Returns:
+        The tiers with known-empty probes removed and the rest reordered.
+        Errors reading the history are logged and the tiers returned as given.
+    """
+    try:
+        conn = get_connection()
+        empty = set()
+        if RENT_NEGATIVE_TTL_DAYS > 0:
+            empty = {(bedrooms, property_type) for bedrooms, property_type in conn.execute(
+                "SELECT bedrooms, property_type FROM empty_probes WHERE zip_code = ? AND expires_at > ?",
+                (zip_code, time.time()))}
+
+        hit_rates = {}
+        if RENT_PROBE_PREFIX_LENGTH > 0:
+            hit_rates = {(bedrooms, property_type): (hits + 1) / (hits + misses + 2)
+                         for bedrooms, property_type, hits, misses in conn.execute(
+                             "SELECT bedrooms, property_type, hits, misses FROM probe_stats WHERE zip_prefix = ?",
+                             (get_zip_prefix(zip_code), ))}
+    except sqlite3.Error as e:
+        logging.warning(f"Error reading rent probe history for {zip_code}: {str(e)}")
+        return tiers
+
+    # Unseen probes rank like a probe with no hits and no misses
+    return [sorted((probe for probe in tier if probe not in empty),
+                   key=lambda probe: -hit_rates.get(probe, 0.5))
+            for tier in tiers]
+
+
+def record_probes(zip_code: str, outcomes: List[Tuple[int, str, bool]]) -> None:
+    """
+    Records which probes of a lookup found a rent and which came back empty.
+
+    Empty probes are skipped for RENT_NEGATIVE_TTL_DAYS, and both outcomes
+    update the hit rates of the ZIP prefix. Errors are logged, not raised.
+
+    Args:
+        zip_code: The ZIP code that was looked up.
+        outcomes: (bedrooms, property type, found) for every probe that got an answer.
+    """
+    if not outcomes:
+        return
+
+    now = time.time()
+    prefix = get_zip_prefix(zip_code)
+    try:
+        conn = get_connection()
+        with transaction(conn):
+            conn.execute("DELETE FROM empty_probes WHERE expires_at <= ?", (now, ))
+            if RENT_NEGATIVE_TTL_DAYS > 0:
+                conn.executemany("""
+                    INSERT OR REPLACE INTO empty_probes (zip_code, bedrooms, property_type, expires_at)
+                    VALUES (?, ?, ?, ?)
+                """, [(zip_code, bedrooms, property_type, now + RENT_NEGATIVE_TTL_DAYS * 86400)
+                      for bedrooms, property_type, found in outcomes if not found])
+            conn.executemany("""
+                INSERT INTO probe_stats (zip_prefix, bedrooms, property_type, hits, misses)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (zip_prefix, bedrooms, property_type)
+                DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses
+            """, [(prefix, bedrooms, property_type, 1 if found else 0, 0 if found else 1)
+                  for bedrooms, property_type, found in outcomes])
+    except sqlite3.Error as e:
+        logging.warning(f"Error recording rent probes for {zip_code}: {str(e)}")
+
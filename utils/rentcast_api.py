@@ -1,12 +1,24 @@
 import os
 import json
 import logging
-import requests
-from typing import Optional
+from typing import List, Optional, Tuple
 
+from utils.circuit_breaker import CircuitOpenError
+from utils.http_client import http_get
+from utils.metrics import timed
+from utils.rent_probes import Probe, plan_probes, record_probes
+
+# Point at a stand-in server (e.g. benchmarks/mock_server.py) for offline runs
+RENTCAST_BASE_URL = os.environ.get("RENTCAST_BASE_URL", "https://api.rentcast.io").rstrip("/")
+
+@timed("rentcast.estimate")
 def get_rent_estimate(zip_code: str, bedrooms: int) -> float:
     """
     Gets rent estimate for a property with the given ZIP code and bedroom count.
+
+    Combinations RentCast recently had no data for are skipped, and the
+    remaining ones are tried in the order that has succeeded most often in
+    nearby ZIP codes (see utils.rent_probes).
     
     Args:
         zip_code: The ZIP code of the property.
@@ -14,6 +26,9 @@ def get_rent_estimate(zip_code: str, bedrooms: int) -> float:
         
     Returns:
         The estimated monthly rent (always returns a value by using fallbacks if needed).
+
+    Raises:
+        CircuitOpenError: If RentCast's circuit is open; use get_fallback_rent instead.
     """
     logging.info(f"Getting rent estimate for ZIP {zip_code} with {bedrooms} bedrooms")
     api_key = os.environ.get("RENTCAST_API_KEY")
@@ -29,22 +44,60 @@ def get_rent_estimate(zip_code: str, bedrooms: int) -> float:
     if is_high_end_zip:
         logging.info(f"High-end ZIP code {zip_code} detected - will use premium rent estimates if APIs fail")
     
-    url = "https://api.rentcast.io/v1/avm/rent/zip"
-    
     # Ensure bedrooms is within valid range
     capped_bedrooms = min(max(bedrooms, 1), 5)  # Most APIs limit to 1-5 bedrooms
     
-    headers = {
-        "accept": "application/json",
-        "X-Api-Key": api_key
-    }
-    
     # Try different property types to increase chances of getting data
     # For high-end ZIPs, try luxury property types first
     property_types = ["CONDO", "SFH", "MFH"] if is_high_end_zip else ["SFH", "MFH", "CONDO"]
     
+    # Some ZIP codes may have data for certain bedroom counts but not others
+    other_bedroom_counts = [3, 2, 4, 1, 5]  # Try common ones first
+    other_bedroom_counts = [b for b in other_bedroom_counts if b != capped_bedrooms]  # Remove current one
+    
+    exact_probes, alternative_probes = plan_probes(zip_code, [
+        [(capped_bedrooms, prop_type) for prop_type in property_types],
+        [(alt_bedrooms, prop_type) for alt_bedrooms in other_bedroom_counts for prop_type in property_types]
+    ])
+    
+    # (bedrooms, property type, found) for every probe RentCast answered
+    outcomes = []
+    try:
+        return query_rent_estimate(zip_code, bedrooms, capped_bedrooms, is_high_end_zip,
+                                   exact_probes, alternative_probes, outcomes)
+    finally:
+        record_probes(zip_code, outcomes)
+
+
+def query_rent_estimate(zip_code: str, bedrooms: int, capped_bedrooms: int, is_high_end_zip: bool,
+                        exact_probes: List[Probe], alternative_probes: List[Probe],
+                        outcomes: List[Tuple[int, str, bool]]) -> float:
+    """
+    Queries RentCast probe by probe, falling back to the static rent tables.
+
+    Args:
+        zip_code: The ZIP code of the property.
+        bedrooms: The number of bedrooms.
+        capped_bedrooms: The bedroom count limited to what RentCast supports.
+        is_high_end_zip: Whether the ZIP code gets premium adjustments.
+        exact_probes: (bedrooms, property type) probes for the exact bedroom count.
+        alternative_probes: Probes for other bedroom counts, adjusted on a hit.
+        outcomes: Collects (bedrooms, property type, found) for every answered probe.
+
+    Returns:
+        The estimated monthly rent.
+
+    Raises:
+        CircuitOpenError: If RentCast's circuit is open.
+    """
+    url = f"{RENTCAST_BASE_URL}/v1/avm/rent/zip"
+    headers = {
+        "accept": "application/json",
+        "X-Api-Key": os.environ.get("RENTCAST_API_KEY")
+    }
+    
     # First, try with the exact bedroom count provided
-    for prop_type in property_types:
+    for _, prop_type in exact_probes:
         try:
             querystring = {
                 "zip": zip_code,
@@ -53,12 +106,13 @@ def get_rent_estimate(zip_code: str, bedrooms: int) -> float:
             }
             
             logging.info(f"Trying rent estimate for ZIP {zip_code}, {bedrooms} BR, type {prop_type}")
-            response = requests.get(url, headers=headers, params=querystring)
+            response = http_get("rentcast", url, headers=headers, params=querystring)
             logging.info(f"RentCast API response for {zip_code}, {bedrooms} BR, {prop_type}: {response.status_code}")
             
             # If we get a 404, that means this combination doesn't exist in their database
             if response.status_code == 404:
                 logging.debug(f"No data for {zip_code}, {bedrooms} BR with type {prop_type}")
+                outcomes.append((capped_bedrooms, prop_type, False))
                 continue
                 
             # For other errors, still try the next property type
@@ -72,58 +126,80 @@ def get_rent_estimate(zip_code: str, bedrooms: int) -> float:
             if "rent" in data and data["rent"]:
                 rent = float(data["rent"])
                 logging.info(f"Found rent: ${rent} for {zip_code}, {bedrooms} BR, type {prop_type}")
+                outcomes.append((capped_bedrooms, prop_type, True))
                 return rent
+            outcomes.append((capped_bedrooms, prop_type, False))
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logging.warning(f"Error for {prop_type}: {str(e)}")
             continue
     
     # If no results with the exact bedroom count, try with other bedroom counts
-    # Some ZIP codes may have data for certain bedroom counts but not others
-    other_bedroom_counts = [3, 2, 4, 1, 5]  # Try common ones first
-    other_bedroom_counts = [b for b in other_bedroom_counts if b != capped_bedrooms]  # Remove current one
-    
+    other_bedroom_counts = list(dict.fromkeys(alt_bedrooms for alt_bedrooms, _ in alternative_probes))
     logging.info(f"No data found for {zip_code} with {bedrooms} BR, trying other bedroom counts: {', '.join(map(str, other_bedroom_counts))}")
     
-    for alt_bedrooms in other_bedroom_counts:
-        for prop_type in property_types:
-            try:
-                querystring = {
-                    "zip": zip_code,
-                    "bedrooms": str(alt_bedrooms),
-                    "propertyType": prop_type
-                }
+    for alt_bedrooms, prop_type in alternative_probes:
+        try:
+            querystring = {
+                "zip": zip_code,
+                "bedrooms": str(alt_bedrooms),
+                "propertyType": prop_type
+            }
+            
+            logging.info(f"Trying alternative: ZIP {zip_code}, {alt_bedrooms} BR, type {prop_type}")
+            response = http_get("rentcast", url, headers=headers, params=querystring)
+            
+            if response.status_code == 404:
+                outcomes.append((alt_bedrooms, prop_type, False))
+                continue
                 
-                logging.info(f"Trying alternative: ZIP {zip_code}, {alt_bedrooms} BR, type {prop_type}")
-                response = requests.get(url, headers=headers, params=querystring)
+            if response.status_code != 200:
+                continue
+                
+            data = response.json()
+            
+            if "rent" in data and data["rent"]:
+                rent_value = float(data["rent"])
+                # Adjust the rent value based on bedroom differences
+                bedroom_diff = capped_bedrooms - alt_bedrooms
                 
-                if response.status_code == 404:
-                    continue
-                    
-                if response.status_code != 200:
-                    continue
-                    
-                data = response.json()
+                # For high-end areas, each bedroom adds more value
+                bedroom_premium = 500 if is_high_end_zip else 200
+                adjusted_rent = rent_value + (bedroom_diff * bedroom_premium)
                 
-                if "rent" in data and data["rent"]:
-                    rent_value = float(data["rent"])
-                    # Adjust the rent value based on bedroom differences
-                    bedroom_diff = capped_bedrooms - alt_bedrooms
-                    
-                    # For high-end areas, each bedroom adds more value
-                    bedroom_premium = 500 if is_high_end_zip else 200
-                    adjusted_rent = rent_value + (bedroom_diff * bedroom_premium)
-                    
-                    logging.info(f"Found rent for {alt_bedrooms} BR: ${rent_value}, adjusted for {capped_bedrooms} BR: ${adjusted_rent}")
-                    return adjusted_rent
-                    
-            except Exception as e:
-                logging.warning(f"Error trying alternative bedrooms: {str(e)}")
-                continue
+                logging.info(f"Found rent for {alt_bedrooms} BR: ${rent_value}, adjusted for {capped_bedrooms} BR: ${adjusted_rent}")
+                outcomes.append((alt_bedrooms, prop_type, True))
+                return adjusted_rent
+            outcomes.append((alt_bedrooms, prop_type, False))
+                
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logging.warning(f"Error trying alternative bedrooms: {str(e)}")
+            continue
     
     # If we get here, we tried all property types and didn't find rent data
     logging.info(f"No RentCast API data found for ZIP {zip_code}, {bedrooms} bedrooms - using fallback estimates")
-    
+    return get_fallback_rent(zip_code, bedrooms)
+
+
+def get_fallback_rent(zip_code: str, bedrooms: int) -> float:
+    """
+    Returns a static rent estimate for when RentCast has no data or is unavailable.
+
+    Args:
+        zip_code: The ZIP code of the property.
+        bedrooms: The number of bedrooms.
+
+    Returns:
+        A premium estimate for high-end ZIP codes, otherwise the national average.
+    """
+    high_end_zip_prefixes = ['902', '904', '945', '100', '101', '941']
+    is_high_end_zip = any(zip_code.startswith(prefix) for prefix in high_end_zip_prefixes)
+    capped_bedrooms = min(max(bedrooms, 1), 5)
+
     # For high-end ZIP codes, use premium rent estimates
     if is_high_end_zip:
         # High-end areas have much higher rents
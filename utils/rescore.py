@@ -0,0 +1,107 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils import result_store
+from utils.cache import MemoryCache
+from utils.calculator import calculate_property_metrics_batch
+
+# Candidate columns of recently re-scored result sets are kept in memory so
+# repeated what-if requests do not touch the database
+RESCORE_CACHE_SETS = int(os.environ.get("RESCORE_CACHE_SETS", 32))
+RESCORE_CACHE_TTL = float(os.environ.get("RESCORE_CACHE_TTL", 1800))
+
+_candidate_columns = MemoryCache(RESCORE_CACHE_SETS, RESCORE_CACHE_TTL)
+
+
+def get_candidate_columns(set_id: str) -> Dict[str, Any]:
+    """
+    Returns a result set's candidates as columns, with numeric columns as arrays.
+
+    Args:
+        set_id: The result set ID.
+    """
+    columns = _candidate_columns.get_many([set_id]).get(set_id)
+    if columns is None:
+        columns = result_store.load_candidates(set_id)
+        for field in ('price', 'rent', 'threshold_factor'):
+            columns[field] = np.asarray(columns[field], dtype=np.float64)
+        _candidate_columns.set_many({set_id: columns})
+    return columns
+
+
+def rescore(set_id: str, parameters: Dict[str, Any],
+            limit: Optional[int] = 100) -> Dict[str, Any]:
+    """
+    Recomputes a run's metrics and filters for new loan parameters and thresholds.
+
+    No listings or rents are fetched; the candidates stored with the result
+    set are scored with the batch calculator and the same criteria as
+    /analyze.
+
+    Args:
+        set_id: The result set ID.
+        parameters: The mortgage parameters and filter criteria.
+        limit: The maximum number of results to return, best CoC return
+            first. None returns every matching result in candidate order.
+
+    Returns:
+        A dictionary with the candidate and match counts, summary statistics
+        of the matches and the matching results.
+    """
+    columns = get_candidate_columns(set_id)
+    prices = columns['price']
+    rents = columns['rent']
+    factors = columns['threshold_factor']
+
+    metrics = calculate_property_metrics_batch(
+        prices, rents, parameters['down_payment'], parameters['interest_rate'],
+        parameters['loan_term'], parameters['monthly_expenses'])
+    coc_returns = metrics['cash_on_cash_return']
+    cash_flows = metrics['cash_flow']
+
+    # Same test as /analyze: skip listings below either threshold
+    rejected = (coc_returns < parameters['min_coc_return'] * factors) | (
+        cash_flows < parameters['min_cash_flow'] * factors)
+    # Non-finite metrics (e.g. no cash invested) never match
+    rejected |= ~(np.isfinite(coc_returns) & np.isfinite(cash_flows))
+    matches = np.flatnonzero(~rejected)
+
+    if limit is not None:
+        order = np.argsort(-coc_returns[matches], kind='stable')
+        matches = matches[order][:limit]
+
+    results: List[Dict[str, Any]] = []
+    mortgages = metrics['mortgage_payment']
+    for i in matches.tolist():
+        results.append({
+            'address': columns['address'][i],
+            'price': columns['price'][i].item(),
+            'bedrooms': columns['bedrooms'][i],
+            'rent': columns['rent'][i].item(),
+            'mortgage': mortgages[i].item(),
+            'cash_flow': cash_flows[i].item(),
+            'coc_return': coc_returns[i].item(),
+            'property_type': columns['property_type'][i],
+            'link': columns['link'][i],
+            'zip_code': columns['zip_code'][i]
+        })
+
+    match_count = int((~rejected).sum())
+    summary = {}
+    if match_count:
+        summary = {
+            'avg_coc_return': float(coc_returns[~rejected].mean()),
+            'avg_cash_flow': float(cash_flows[~rejected].mean()),
+            'max_coc_return': float(coc_returns[~rejected].max())
+        }
+
+    logging.debug(f"Re-scored {len(prices)} candidates of {set_id}: {match_count} match")
+    return {
+        'candidate_count': len(prices),
+        'match_count': match_count,
+        'summary': summary,
+        'results': results
+    }
@@ -0,0 +1,396 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.cache import transaction
+
+# Result sets are kept next to the application in the instance folder
+RESULTS_DB_PATH = os.environ.get(
+    "RESULTS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "instance", "results.db"))
+
+# How long a result set stays available for pages and downloads
+RESULT_TTL_HOURS = float(os.environ.get("RESULT_TTL_HOURS", 24))
+
+# How often expired result sets are swept out
+RESULT_PURGE_INTERVAL = 3600
+
+# Fields of a result row, in CSV column order
+RESULT_FIELDS = [
+    'address', 'price', 'bedrooms', 'rent', 'mortgage', 'cash_flow',
+    'coc_return', 'property_type', 'link'
+]
+
+# Fields of a candidate row: every priced listing of a run, kept for re-scoring
+CANDIDATE_FIELDS = [
+    'address', 'price', 'bedrooms', 'rent', 'property_type', 'link',
+    'threshold_factor'
+]
+
+# Columns results can be sorted by; each has an index on (set_id, column)
+SORTABLE_FIELDS = [
+    'price', 'bedrooms', 'rent', 'mortgage', 'cash_flow', 'coc_return',
+    'address', 'property_type', 'zip_code'
+]
+
+_local = threading.local()
+_last_purge = 0.0
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns this thread's connection to the results database."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(RESULTS_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(RESULTS_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS result_sets (
+                id TEXT PRIMARY KEY,
+                parameters TEXT NOT NULL,
+                zip_count INTEGER NOT NULL,
+                result_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_result_sets_expires_at ON result_sets (expires_at);
+            CREATE TABLE IF NOT EXISTS results (
+                set_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                zip_code TEXT,
+                address TEXT,
+                price NUMERIC,
+                bedrooms INTEGER,
+                rent NUMERIC,
+                mortgage REAL,
+                cash_flow REAL,
+                coc_return REAL,
+                property_type TEXT,
+                link TEXT,
+                PRIMARY KEY (set_id, position)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS candidates (
+                set_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                zip_code TEXT,
+                address TEXT,
+                price NUMERIC,
+                bedrooms INTEGER,
+                rent NUMERIC,
+                property_type TEXT,
+                link TEXT,
+                threshold_factor REAL,
+                PRIMARY KEY (set_id, position)
+            ) WITHOUT ROWID;
+        """)
+        for field in SORTABLE_FIELDS:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_results_{field} ON results (set_id, {field}, position)")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+            # The write lock serialises concurrent workers upgrading the schema
+            with transaction(conn):
+                if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+                    # Top-K runs that pruned listings store an incomplete candidate set
+                    conn.execute("ALTER TABLE result_sets ADD COLUMN rescorable INTEGER NOT NULL DEFAULT 1")
+                    conn.execute("PRAGMA user_version = 1")
+        _local.conn = conn
+    return conn
+
+
+def create_result_set(parameters: Dict[str, Any], zip_count: int) -> str:
+    """
+    Creates an empty result set.
+
+    Args:
+        parameters: The mortgage parameters and filter criteria of the run.
+        zip_count: The number of ZIP codes in the run.
+
+    Returns:
+        The new result set ID.
+    """
+    global _last_purge
+    now = time.time()
+    if now - _last_purge > RESULT_PURGE_INTERVAL:
+        _last_purge = now
+        purge_expired()
+
+    set_id = uuid.uuid4().hex
+    conn = get_connection()
+    with transaction(conn):
+        conn.execute("""
+            INSERT INTO result_sets (id, parameters, zip_count, created_at, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (set_id, json.dumps(parameters), zip_count, now, now + RESULT_TTL_HOURS * 3600))
+    return set_id
+
+
+def append_results(set_id: str, results: List[Dict[str, Any]],
+                   zip_code: Optional[str] = None) -> None:
+    """
+    Adds result rows to the end of a result set.
+
+    Args:
+        set_id: The result set ID.
+        results: The result rows.
+        zip_code: The ZIP code the rows belong to, if known.
+    """
+    if not results:
+        return
+
+    conn = get_connection()
+    with transaction(conn):
+        start = conn.execute("SELECT result_count FROM result_sets WHERE id = ?",
+                             (set_id, )).fetchone()[0]
+        conn.executemany(f"""
+            INSERT INTO results (set_id, position, zip_code, {', '.join(RESULT_FIELDS)})
+            VALUES (?, ?, ?, {', '.join('?' * len(RESULT_FIELDS))})
+        """, [(set_id, start + offset, result.get('zip_code', zip_code),
+              *(result.get(field) for field in RESULT_FIELDS))
+              for offset, result in enumerate(results)])
+        conn.execute("UPDATE result_sets SET result_count = result_count + ? WHERE id = ?",
+                     (len(results), set_id))
+
+
+def append_candidates(set_id: str, candidates: List[Dict[str, Any]],
+                      zip_code: Optional[str] = None) -> None:
+    """
+    Stores the priced listings a run's results were selected from.
+
+    Args:
+        set_id: The result set ID.
+        candidates: Rows with the CANDIDATE_FIELDS keys.
+        zip_code: The ZIP code the rows belong to, if known.
+    """
+    if not candidates:
+        return
+
+    conn = get_connection()
+    with transaction(conn):
+        start = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM candidates WHERE set_id = ?",
+                             (set_id, )).fetchone()[0]
+        conn.executemany(f"""
+            INSERT INTO candidates (set_id, position, zip_code, {', '.join(CANDIDATE_FIELDS)})
+            VALUES (?, ?, ?, {', '.join('?' * len(CANDIDATE_FIELDS))})
+        """, [(set_id, start + offset, zip_code, *(row.get(field) for field in CANDIDATE_FIELDS))
+              for offset, row in enumerate(candidates)])
+
+
+def load_candidates(set_id: str) -> Dict[str, List[Any]]:
+    """
+    Reads a result set's candidates as columns.
+
+    Args:
+        set_id: The result set ID.
+
+    Returns:
+        A dictionary of column name to list of values, in insertion order.
+    """
+    columns = ['zip_code'] + CANDIDATE_FIELDS
+    rows = get_connection().execute(f"""
+        SELECT {', '.join(columns)} FROM candidates WHERE set_id = ? ORDER BY position
+    """, (set_id, )).fetchall()
+    return {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+
+
+def copy_candidates(from_set_id: str, to_set_id: str) -> None:
+    """Copies the candidates of one result set to another."""
+    columns = ', '.join(['position', 'zip_code'] + CANDIDATE_FIELDS)
+    conn = get_connection()
+    with transaction(conn):
+        conn.execute(f"""
+            INSERT INTO candidates (set_id, {columns})
+            SELECT ?, {columns} FROM candidates WHERE set_id = ?
+        """, (to_set_id, from_set_id))
+
+
+def mark_not_rescorable(set_id: str) -> None:
+    """Marks a result set whose candidates are incomplete, so it cannot be re-scored."""
+    conn = get_connection()
+    with transaction(conn):
+        conn.execute("UPDATE result_sets SET rescorable = 0 WHERE id = ?", (set_id, ))
+
+
+def get_result_set(set_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Returns a result set's metadata.
+
+    Args:
+        set_id: The result set ID.
+
+    Returns:
+        The parameters, zip_count, result_count and rescorable flag of the
+        set, or None if it does not exist or has expired.
+    """
+    if not set_id:
+        return None
+
+    row = get_connection().execute("""
+        SELECT parameters, zip_count, result_count, created_at, rescorable FROM result_sets
+        WHERE id = ? AND expires_at > ?
+    """, (set_id, time.time())).fetchone()
+    if row is None:
+        return None
+
+    return {
+        'id': set_id,
+        'parameters': json.loads(row[0]),
+        'zip_count': row[1],
+        'result_count': row[2],
+        'created_at': row[3],
+        'rescorable': bool(row[4])
+    }
+
+
+def iter_results(set_id: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily reads the rows of a result set in insertion order.
+
+    Rows are fetched in batches, so only one batch is held in memory.
+
+    Args:
+        set_id: The result set ID.
+        batch_size: The number of rows fetched per query.
+
+    Yields:
+        Result dictionaries with the RESULT_FIELDS keys plus zip_code.
+    """
+    columns = ['position', 'zip_code'] + RESULT_FIELDS
+    position = -1
+    conn = get_connection()
+
+    while True:
+        rows = conn.execute(f"""
+            SELECT {', '.join(columns)} FROM results
+            WHERE set_id = ? AND position > ? ORDER BY position LIMIT ?
+        """, (set_id, position, batch_size)).fetchall()
+
+        for row in rows:
+            yield dict(zip(columns[1:], row[1:]))
+
+        if len(rows) < batch_size:
+            return
+        position = rows[-1][0]
+
+
+def query_results(set_id: str,
+                  sort: str = 'coc_return',
+                  descending: bool = True,
+                  offset: int = 0,
+                  limit: int = 25,
+                  after: Optional[List[Any]] = None,
+                  min_coc_return: Optional[float] = None,
+                  min_cash_flow: Optional[float] = None,
+                  max_price: Optional[float] = None,
+                  property_type: Optional[str] = None,
+                  zip_code: Optional[str] = None,
+                  search: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns one page of a result set, sorted and filtered in the database.
+
+    Pages can be addressed by offset, or by keyset with the next_cursor of
+    the previous page, which stays fast however deep the page is.
+
+    Args:
+        set_id: The result set ID.
+        sort: The column to sort by (one of SORTABLE_FIELDS).
+        descending: Whether to sort in descending order.
+        offset: The number of matching rows to skip (ignored when after is given).
+        limit: The maximum number of rows to return.
+        after: A cursor [sort value, position] returned as next_cursor.
+        min_coc_return: Only include rows with at least this CoC return.
+        min_cash_flow: Only include rows with at least this monthly cash flow.
+        max_price: Only include rows priced at or below this.
+        property_type: Only include rows of this property type.
+        zip_code: Only include rows from this ZIP code.
+        search: Only include rows whose address contains this text.
+
+    Returns:
+        A dictionary with the page rows, the total and filtered row counts,
+        and next_cursor for keyset pagination (None on the last page).
+    """
+    if sort not in SORTABLE_FIELDS:
+        raise ValueError(f"Cannot sort results by {sort}")
+    if after is not None and not (isinstance(after, list) and len(after) == 2
+                                  and isinstance(after[0], (str, int, float, type(None)))
+                                  and isinstance(after[1], int)):
+        raise ValueError("The after cursor must be a [sort value, position] list")
+
+    conditions = ["set_id = ?"]
+    params: List[Any] = [set_id]
+    for clause, value in [("coc_return >= ?", min_coc_return),
+                          ("cash_flow >= ?", min_cash_flow),
+                          ("price <= ?", max_price),
+                          ("property_type = ?", property_type),
+                          ("zip_code = ?", zip_code)]:
+        if value is not None and value != '':
+            conditions.append(clause)
+            params.append(value)
+    if search:
+        conditions.append("address LIKE ? ESCAPE '\\'")
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params.append(f"%{escaped}%")
+
+    conn = get_connection()
+    where = " AND ".join(conditions)
+    total = conn.execute("SELECT COUNT(*) FROM results WHERE set_id = ?", (set_id, )).fetchone()[0]
+    filtered = conn.execute(f"SELECT COUNT(*) FROM results WHERE {where}", params).fetchone()[0]
+
+    page_conditions = list(conditions)
+    page_params = list(params)
+    if after is not None:
+        comparison = "<" if descending else ">"
+        page_conditions.append(f"({sort} {comparison} ? OR ({sort} = ? AND position > ?))")
+        page_params.extend([after[0], after[0], after[1]])
+        offset = 0
+
+    direction = "DESC" if descending else "ASC"
+    columns = ['position', 'zip_code'] + RESULT_FIELDS
+    rows = conn.execute(f"""
+        SELECT {', '.join(columns)} FROM results
+        WHERE {' AND '.join(page_conditions)}
+        ORDER BY {sort} {direction}, position ASC
+        LIMIT ? OFFSET ?
+    """, (*page_params, limit, offset)).fetchall()
+
+    page = [dict(zip(columns[1:], row[1:])) for row in rows]
+    next_cursor = None
+    # A limit of 0 only asks for the counts and has no next page
+    if rows and len(rows) == limit:
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = [last[sort], last['position']]
+
+    return {
+        'total': total,
+        'filtered': filtered,
+        'rows': page,
+        'next_cursor': next_cursor
+    }
+
+
+def purge_expired() -> int:
+    """
+    Deletes expired result sets with their rows and candidates.
+
+    Returns:
+        The number of result sets removed.
+    """
+    now = time.time()
+    try:
+        conn = get_connection()
+        with transaction(conn):
+            for table in ('results', 'candidates'):
+                conn.execute(f"""
+                    DELETE FROM {table} WHERE set_id IN
+                        (SELECT id FROM result_sets WHERE expires_at <= ?)
+                """, (now, ))
+            cursor = conn.execute("DELETE FROM result_sets WHERE expires_at <= ?", (now, ))
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logging.warning(f"Error purging expired result sets: {str(e)}")
+        return 0
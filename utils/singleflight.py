@@ -0,0 +1,62 @@
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+
+class _Call:
+    """An in-flight call whose result is shared by every waiting caller."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, _Call] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """
+        Runs func once for all concurrent callers with the same key.
+
+        Args:
+            key: Identifies duplicate work.
+            func: The function to run.
+
+        Returns:
+            The function's result.
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not leader:
+            logging.debug(f"Waiting for in-flight fetch of {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+        return call.result
@@ -0,0 +1,142 @@
+import os
+import heapq
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.calculator import calculate_property_metrics_batch
+from utils.rentcast_api import get_fallback_rent
+
+# Fields a top-K run can rank by
+TOPK_SORT_FIELDS = ('coc_return', 'cash_flow')
+
+# Largest number of results a top-K run may ask for
+TOPK_MAX = int(os.environ.get("TOPK_MAX", 10000))
+
+# Listings may skip their rent lookup when they could not make the top K
+# even at this rent per bedroom (studios count as one bedroom). RentCast
+# rents have no hard ceiling, so this is an operator's estimate and pruned
+# runs cannot be re-scored; 0 (the default) disables pruning
+TOPK_MAX_RENT_PER_BEDROOM = float(os.environ.get("TOPK_MAX_RENT_PER_BEDROOM", 0))
+
+# analyze_zip uses this rent when an estimate is missing
+FALLBACK_RENT = 1000
+
+# The most get_rent_estimate adds when it adjusts another bedroom count's rent
+ADJUSTED_RENT_PREMIUM = 500
+
+
+class TopK:
+    """
+    Keeps the best K results of a run in a bounded min-heap.
+
+    Results from any number of ZIP codes can be added while memory stays
+    O(K). Ties are broken in favour of earlier ZIP codes and earlier
+    listings (by their position among the ZIP's priced listings), so the
+    outcome does not depend on which ZIP finishes first or on pruning.
+    Adding results and reading the threshold are thread-safe.
+    """
+
+    def __init__(self, k: int, sort: str = 'coc_return'):
+        if sort not in TOPK_SORT_FIELDS:
+            raise ValueError(f"Cannot rank by {sort}")
+        if not 0 < k <= TOPK_MAX:
+            raise ValueError(f"K must be between 1 and {TOPK_MAX}")
+        self.k = k
+        self.sort = sort
+        self.heap = []
+        self.lock = threading.Lock()
+        self.skipped = 0
+
+    def add_results(self, results: List[Dict[str, Any]], zip_code: str, zip_index: int,
+                    positions: Optional[Sequence[int]] = None) -> None:
+        """
+        Offers a ZIP code's results to the heap.
+
+        Args:
+            results: The qualifying results of the ZIP code.
+            zip_code: The ZIP code, stored on each kept result.
+            zip_index: The position of the ZIP code in the submitted list.
+            positions: The position of each result among the ZIP's priced
+                listings (defaults to the result order).
+        """
+        if positions is None:
+            positions = range(len(results))
+        with self.lock:
+            for position, result in zip(positions, results):
+                entry = (result[self.sort], -zip_index, -position, {**result, 'zip_code': zip_code})
+                if len(self.heap) < self.k:
+                    heapq.heappush(self.heap, entry)
+                elif entry[:3] > self.heap[0][:3]:
+                    heapq.heapreplace(self.heap, entry)
+
+    def get_threshold(self) -> Optional[Tuple[float, int, int]]:
+        """
+        Returns the (score, -ZIP index, -position) key a result must beat to
+        enter the heap, or None while it is not full.
+        """
+        with self.lock:
+            return self.heap[0][:3] if len(self.heap) == self.k else None
+
+    def get_results(self) -> List[Dict[str, Any]]:
+        """Returns the kept results, best first."""
+        with self.lock:
+            return [entry[3] for entry in sorted(self.heap, key=lambda entry: entry[:3], reverse=True)]
+
+    def get_prunable(self, zip_code: str, zip_index: int, prices: Sequence[float],
+                     bedroom_counts: Sequence[int], parameters: dict,
+                     min_coc_return: float, min_cash_flow: float) -> List[bool]:
+        """
+        Flags listings that cannot qualify or enter the heap whatever their rent.
+
+        Each listing is scored with the highest rent it is assumed to get:
+        TOPK_MAX_RENT_PER_BEDROOM per bedroom, but never less than the
+        fallback rent plus the largest bedroom adjustment. Listings whose
+        upper-bound score fails the criteria, or whose (score, ZIP index,
+        position) key would not beat the heap's smallest, can skip their rent
+        lookup. Nothing is pruned while TOPK_MAX_RENT_PER_BEDROOM is 0.
+
+        Args:
+            zip_code: The ZIP code of the listings.
+            zip_index: The position of the ZIP code in the submitted list.
+            prices: The listing prices, in the order passed to add_results.
+            bedroom_counts: The listing bedroom counts.
+            parameters: The mortgage parameters.
+            min_coc_return: The minimum CoC return for the ZIP code.
+            min_cash_flow: The minimum cash flow for the ZIP code.
+
+        Returns:
+            One flag per listing, True if the listing can be skipped.
+        """
+        if not TOPK_MAX_RENT_PER_BEDROOM or not prices:
+            return [False] * len(prices)
+
+        fallback_ceilings = {bedrooms: max(get_fallback_rent(zip_code, bedrooms), FALLBACK_RENT)
+                             + ADJUSTED_RENT_PREMIUM
+                             for bedrooms in set(bedroom_counts)}
+        rent_ceilings = np.maximum(
+            np.maximum(np.asarray(bedroom_counts, dtype=np.float64), 1) * TOPK_MAX_RENT_PER_BEDROOM,
+            [fallback_ceilings[bedrooms] for bedrooms in bedroom_counts])
+        bounds = calculate_property_metrics_batch(
+            prices, rent_ceilings, parameters['down_payment'], parameters['interest_rate'],
+            parameters['loan_term'], parameters['monthly_expenses'])
+
+        prunable = ((bounds['cash_on_cash_return'] < min_coc_return)
+                    | (bounds['cash_flow'] < min_cash_flow))
+        threshold = self.get_threshold()
+        if threshold is not None:
+            # Same ordering as the heap: an equal score only loses to an
+            # earlier ZIP code or an earlier listing of the same ZIP code
+            scores = bounds['cash_on_cash_return' if self.sort == 'coc_return' else 'cash_flow']
+            threshold_score, threshold_zip, threshold_position = threshold
+            if -zip_index == threshold_zip:
+                loses_tie = -np.arange(len(prices)) < threshold_position
+            else:
+                loses_tie = np.full(len(prices), -zip_index < threshold_zip)
+            prunable |= (scores < threshold_score) | ((scores == threshold_score) & loses_tie)
+
+        flags = prunable.tolist()
+        with self.lock:
+            self.skipped += sum(flags)
+        return flags
@@ -0,0 +1,300 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.cache import get_backend, get_namespace, transaction, SQLITE_BATCH_SIZE
+from utils.listings import PROPERTY_TYPES, Listing, decode_listings
+
+# The warehouse is kept next to the application in the instance folder
+WAREHOUSE_DB_PATH = os.environ.get(
+    "WAREHOUSE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "instance", "listings.db"))
+
+# Columns listings can be sorted by
+SORTABLE_FIELDS = ['price', 'bedrooms', 'zip_code', 'first_seen', 'last_seen']
+
+LISTING_COLUMNS = ['listing_key', 'zpid', 'address', 'zip_code', 'price', 'bedrooms',
+                   'type_code', 'link', 'first_seen', 'last_seen']
+
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Returns this thread's connection to the listings warehouse."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(WAREHOUSE_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(WAREHOUSE_DB_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_key TEXT PRIMARY KEY,
+                zpid TEXT,
+                address TEXT NOT NULL,
+                normalized_address TEXT NOT NULL,
+                zip_code TEXT NOT NULL,
+                price REAL,
+                bedrooms INTEGER,
+                type_code INTEGER,
+                link TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_listings_zip_price ON listings (zip_code, price);
+            CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+            CREATE INDEX IF NOT EXISTS idx_listings_bedrooms ON listings (bedrooms, price);
+            CREATE INDEX IF NOT EXISTS idx_listings_type ON listings (type_code, price);
+            CREATE INDEX IF NOT EXISTS idx_listings_first_seen ON listings (first_seen);
+            CREATE INDEX IF NOT EXISTS idx_listings_last_seen ON listings (last_seen);
+            CREATE INDEX IF NOT EXISTS idx_listings_address ON listings (normalized_address);
+        """)
+        _local.conn = conn
+    return conn
+
+
+def normalize_address(listing: Listing) -> str:
+    """
+    Returns a listing's address in a form that matches across ZIP code searches.
+
+    Case and punctuation are dropped, as are the ZIP codes appended for the
+    searched ZIP, and the listing's own ZIP code is added back.
+    """
+    words = re.sub(r"[^a-z0-9]+", " ", listing.address.lower()).split()
+    while words and re.fullmatch(r"\d{5}", words[-1]):
+        words.pop()
+    return " ".join(words + [listing.zip_code])
+
+
+def is_identifying_address(normalized_address: str) -> bool:
+    """
+    Returns False for placeholder addresses such as Zillow's "(Undisclosed
+    Address)", and for addresses with no street part before the ZIP code,
+    which many different listings share.
+    """
+    words = normalized_address.split()
+    while words and re.fullmatch(r"\d{5}", words[-1]):
+        words.pop()
+    return bool(words) and "undisclosed" not in words
+
+
+def get_warehouse_key(listing: Listing, normalized_address: str) -> Optional[str]:
+    """
+    Returns the key a listing is stored under: its zpid, or its normalized
+    address. Listings with neither a zpid nor a real address get None.
+    """
+    if listing.zpid:
+        return f"zpid:{listing.zpid}"
+    if is_identifying_address(normalized_address):
+        return f"addr:{normalized_address}"
+    return None
+
+
+def upsert_listings(listings: Iterable[Listing], seen_at: Optional[float] = None) -> int:
+    """
+    Adds listings to the warehouse or updates the ones it already holds.
+
+    Listings are deduplicated across all ZIP codes by zpid, or by normalized
+    address when a listing has no zpid. A listing first stored by address is
+    re-keyed, keeping its first_seen, when it turns up with a zpid. Listings
+    with neither a zpid nor a real address cannot be told apart and are
+    skipped. Errors are logged, not raised, so fetching listings never fails
+    because of the warehouse.
+
+    Args:
+        listings: The listings that were fetched.
+        seen_at: When they were fetched. Defaults to now.
+
+    Returns:
+        The number of listings written.
+    """
+    seen_at = seen_at or time.time()
+    rows = {}
+    for listing in listings:
+        normalized_address = normalize_address(listing)
+        key = get_warehouse_key(listing, normalized_address)
+        if key is None:
+            continue
+        rows[key] = (key, listing.zpid, listing.address, normalized_address, listing.zip_code,
+                     listing.price, listing.bedrooms, listing.type_code, listing.link,
+                     seen_at, seen_at)
+    if not rows:
+        return 0
+
+    try:
+        conn = get_connection()
+        with transaction(conn):
+            for key, row in list(rows.items()):
+                normalized_address = row[3]
+                if not is_identifying_address(normalized_address):
+                    continue
+                if key.startswith("zpid:"):
+                    # Fold in a copy stored by address before its zpid was known
+                    address_key = f"addr:{normalized_address}"
+                    folded = conn.execute("SELECT first_seen FROM listings WHERE listing_key = ?",
+                                          (address_key, )).fetchone()
+                    if folded:
+                        conn.execute("DELETE FROM listings WHERE listing_key = ?", (address_key, ))
+                        rows[key] = row[:9] + (min(row[9], folded[0]), row[10])
+                else:
+                    existing = conn.execute(
+                        "SELECT listing_key FROM listings WHERE normalized_address = ? LIMIT 1",
+                        (normalized_address, )).fetchone()
+                    if existing and existing[0] != key:
+                        del rows[key]
+                        rows[existing[0]] = (existing[0], ) + row[1:]
+
+            conn.executemany("""
+                INSERT INTO listings (listing_key, zpid, address, normalized_address, zip_code,
+                                      price, bedrooms, type_code, link, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (listing_key) DO UPDATE SET
+                    zpid = COALESCE(excluded.zpid, listings.zpid),
+                    address = excluded.address,
+                    normalized_address = excluded.normalized_address,
+                    zip_code = excluded.zip_code,
+                    price = excluded.price,
+                    bedrooms = excluded.bedrooms,
+                    type_code = excluded.type_code,
+                    link = excluded.link,
+                    first_seen = MIN(listings.first_seen, excluded.first_seen),
+                    last_seen = MAX(listings.last_seen, excluded.last_seen)
+            """, list(rows.values()))
+    except sqlite3.Error as e:
+        logging.warning(f"Error adding listings to the warehouse: {str(e)}")
+        return 0
+
+    return len(rows)
+
+
+def search_listings(zip_codes: Optional[List[str]] = None,
+                    min_price: Optional[float] = None,
+                    max_price: Optional[float] = None,
+                    min_bedrooms: Optional[int] = None,
+                    max_bedrooms: Optional[int] = None,
+                    property_types: Optional[List[str]] = None,
+                    seen_within_days: Optional[float] = None,
+                    sort: str = 'price',
+                    descending: bool = False,
+                    offset: int = 0,
+                    limit: int = 100) -> Dict[str, Any]:
+    """
+    Screens the warehouse with index-backed filters.
+
+    Args:
+        zip_codes: Only listings in these ZIP codes.
+        min_price: Minimum price.
+        max_price: Maximum price.
+        min_bedrooms: Minimum bedroom count.
+        max_bedrooms: Maximum bedroom count.
+        property_types: Only these property types, e.g. ["Multifamily"].
+        seen_within_days: Only listings fetched within this many days.
+        sort: The column to sort by (one of SORTABLE_FIELDS).
+        descending: Sort from high to low.
+        offset: The number of matching listings to skip.
+        limit: The maximum number of listings to return.
+
+    Returns:
+        A dictionary with the number of matching listings and the requested page.
+
+    Raises:
+        ValueError: If the sort column or a property type is unknown.
+    """
+    if sort not in SORTABLE_FIELDS:
+        raise ValueError(f"Cannot sort by {sort}")
+
+    conditions = []
+    params = []
+    if zip_codes:
+        conditions.append("zip_code IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(zip_codes))
+    if min_price is not None:
+        conditions.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append("price <= ?")
+        params.append(max_price)
+    if min_bedrooms is not None:
+        conditions.append("bedrooms >= ?")
+        params.append(min_bedrooms)
+    if max_bedrooms is not None:
+        conditions.append("bedrooms <= ?")
+        params.append(max_bedrooms)
+    if property_types:
+        unknown_types = [t for t in property_types if t not in PROPERTY_TYPES]
+        if unknown_types:
+            raise ValueError(f"Unknown property types: {', '.join(unknown_types)}")
+        conditions.append(f"type_code IN ({','.join('?' * len(property_types))})")
+        params.extend(PROPERTY_TYPES.index(t) for t in property_types)
+    if seen_within_days is not None:
+        conditions.append("last_seen >= ?")
+        params.append(time.time() - seen_within_days * 86400)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = get_connection()
+    total = conn.execute(f"SELECT COUNT(*) FROM listings {where}", params).fetchone()[0]
+    rows = conn.execute(f"""
+        SELECT {', '.join(LISTING_COLUMNS)} FROM listings {where}
+        ORDER BY {sort} {'DESC' if descending else 'ASC'}, listing_key
+        LIMIT ? OFFSET ?
+    """, (*params, limit, offset)).fetchall()
+
+    listings = []
+    for row in rows:
+        listing = dict(zip(LISTING_COLUMNS, row))
+        listing['property_type'] = PROPERTY_TYPES[listing.pop('type_code') or 0]
+        listings.append(listing)
+
+    return {'total': total, 'listings': listings}
+
+
+def get_warehouse_stats() -> Dict[str, Any]:
+    """Returns the number of listings and ZIP codes in the warehouse, and listings per type."""
+    conn = get_connection()
+    listings, zip_codes = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT zip_code) FROM listings").fetchone()
+    by_type = {PROPERTY_TYPES[type_code or 0]: count for type_code, count in conn.execute(
+        "SELECT type_code, COUNT(*) FROM listings GROUP BY type_code")}
+    return {'listings': listings, 'zip_codes': zip_codes, 'by_type': by_type}
+
+
+def import_cached_listings() -> int:
+    """
+    Loads every listing held in the cache into the warehouse.
+
+    Listings are recorded as seen when their cache entry was fetched.
+
+    Returns:
+        The number of listings written.
+    """
+    keys = [entry["key"] for entry in get_backend().list_entries()
+            if get_namespace(entry["key"]) == "zillow_listings"]
+    imported = 0
+
+    for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+        entries = get_backend().get_entries(keys[start:start + SQLITE_BATCH_SIZE])
+        for key, (data, _) in entries.items():
+            zip_code = key.rsplit("_", 1)[-1]
+            listings = decode_listings(data, zip_code)
+            if listings:
+                seen_at = data.get('refreshed_at') if isinstance(data, dict) else None
+                imported += upsert_listings(listings, seen_at)
+
+    return imported
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["import-cache"]:
+        print(f"Imported {import_cached_listings()} cached listings into {WAREHOUSE_DB_PATH}")
+    elif sys.argv[1:] == ["stats"]:
+        print(json.dumps(get_warehouse_stats(), indent=2))
+    else:
+        print("Usage: python -m utils.warehouse import-cache|stats")
+        sys.exit(1)
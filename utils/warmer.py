@@ -0,0 +1,192 @@
+import os
+import sys
+import time
+import fcntl
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils.cache import get_cache_expiry
+from utils.fetchers import load_listings, load_rent
+from utils.rate_limit import RATE_LIMITS, get_monthly_calls
+
+# ZIP codes to keep warm, separated by commas or whitespace, and/or a file
+# with one ZIP code per line
+WARM_WATCHLIST = os.environ.get("WARM_WATCHLIST", "")
+WARM_WATCHLIST_FILE = os.environ.get("WARM_WATCHLIST_FILE", "")
+
+# Local hours during which warming runs, as "start-end" (may wrap midnight)
+WARM_HOURS = os.environ.get("WARM_HOURS", "2-6")
+
+# Entries expiring within this many days are refreshed ahead of time
+WARM_AHEAD_DAYS = float(os.environ.get("WARM_AHEAD_DAYS", 7))
+
+# Warming stops once a provider has used this share of its monthly quota,
+# leaving the rest for interactive searches
+WARM_QUOTA_SHARE = float(os.environ.get("WARM_QUOTA_SHARE", 0.8))
+
+WARM_CHECK_INTERVAL = float(os.environ.get("WARM_CHECK_INTERVAL", 600))
+
+# Only one process per host runs the scheduler
+WARM_LOCK_PATH = os.environ.get(
+    "WARM_LOCK_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "instance", "warmer.lock"))
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def load_watchlist() -> List[str]:
+    """Returns the configured watchlist ZIP codes, without duplicates."""
+    zip_codes = WARM_WATCHLIST.replace(',', ' ').split()
+    if WARM_WATCHLIST_FILE:
+        try:
+            with open(WARM_WATCHLIST_FILE, 'r') as f:
+                zip_codes.extend(line.strip() for line in f
+                                 if line.strip() and not line.startswith('#'))
+        except IOError as e:
+            logging.warning(f"Error reading watchlist {WARM_WATCHLIST_FILE}: {str(e)}")
+    return list(dict.fromkeys(zip_codes))
+
+
+def in_warm_window(now: Optional[datetime] = None) -> bool:
+    """Returns True if the current local hour is within WARM_HOURS."""
+    start, end = (int(hour) for hour in WARM_HOURS.split('-'))
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def has_budget(provider: str) -> bool:
+    """Returns True if warming may still call the provider this month."""
+    quota = RATE_LIMITS[provider]["monthly_quota"]
+    return not quota or get_monthly_calls(provider) < quota * WARM_QUOTA_SHARE
+
+
+def is_expiring(expiry: Dict[str, float], key: str) -> bool:
+    """Returns True if a key is missing or expires within WARM_AHEAD_DAYS."""
+    return expiry.get(key, 0) < time.time() + WARM_AHEAD_DAYS * 86400
+
+
+def warm_zip(zip_code: str) -> Dict[str, int]:
+    """
+    Refreshes a ZIP code's listings and rent estimates if they are about to expire.
+
+    Calls go through the normal rate limiter, so warming never exceeds the
+    configured request rates.
+
+    Args:
+        zip_code: The ZIP code to warm.
+
+    Returns:
+        The number of listing and rent entries refreshed.
+    """
+    refreshed = {'listings': 0, 'rents': 0}
+    listings_key = f"zillow_listings_{zip_code}"
+
+    if is_expiring(get_cache_expiry([listings_key]), listings_key) and has_budget("zillow"):
+        listings = load_listings(zip_code, force=True)
+        refreshed['listings'] += 1
+    else:
+        listings = load_listings(zip_code)
+
+    # The same bedroom counts analyze_zip looks up
+    bedroom_counts = sorted({listing.bedrooms for listing in listings
+                             if listing.price and listing.price >= 10000})
+    rent_keys = {bedrooms: f"rentcast_{zip_code}_{bedrooms}" for bedrooms in bedroom_counts}
+    expiry = get_cache_expiry(rent_keys.values())
+
+    for bedrooms, key in rent_keys.items():
+        if not is_expiring(expiry, key):
+            continue
+        if not has_budget("rentcast"):
+            break
+        load_rent(zip_code, bedrooms, force=True)
+        refreshed['rents'] += 1
+
+    return refreshed
+
+
+def warm_watchlist(ignore_window: bool = False) -> Dict[str, Any]:
+    """
+    Warms every ZIP code on the watchlist.
+
+    Args:
+        ignore_window: Keep going outside WARM_HOURS (for manual runs).
+
+    Returns:
+        A summary with the number of ZIP codes warmed, entries refreshed and failures.
+    """
+    summary = {'zip_codes': 0, 'listings': 0, 'rents': 0, 'failures': 0}
+
+    for zip_code in load_watchlist():
+        if not ignore_window and not in_warm_window():
+            logging.info("Cache warming window closed, stopping")
+            break
+        if not has_budget("zillow") and not has_budget("rentcast"):
+            logging.info("Cache warming budget used up, stopping")
+            break
+
+        try:
+            refreshed = warm_zip(zip_code)
+            summary['listings'] += refreshed['listings']
+            summary['rents'] += refreshed['rents']
+        except Exception as e:
+            logging.warning(f"Error warming ZIP {zip_code}: {str(e)}")
+            summary['failures'] += 1
+        summary['zip_codes'] += 1
+
+    logging.info(f"Cache warming finished: {summary}")
+    return summary
+
+
+def scheduler_loop(lock_file) -> None:
+    """Warms the watchlist once per day inside the warming window."""
+    last_run = None
+    while True:
+        today = datetime.now().date()
+        if last_run != today and in_warm_window():
+            last_run = today
+            try:
+                warm_watchlist()
+            except Exception as e:
+                logging.error(f"Cache warming failed: {str(e)}")
+        time.sleep(WARM_CHECK_INTERVAL)
+
+
+def start_scheduler() -> None:
+    """
+    Starts the cache warming scheduler if a watchlist is configured.
+
+    Only the first process on the host to take WARM_LOCK_PATH runs the
+    scheduler. Calling this more than once has no effect.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None or not load_watchlist():
+            return
+
+        os.makedirs(os.path.dirname(WARM_LOCK_PATH), exist_ok=True)
+        lock_file = open(WARM_LOCK_PATH, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+
+        # The thread keeps the lock file open for the life of the process
+        _scheduler = threading.Thread(target=scheduler_loop, args=(lock_file, ),
+                                      name="cache-warmer", daemon=True)
+        _scheduler.start()
+        logging.info(f"Cache warming scheduled for {WARM_HOURS} ({len(load_watchlist())} ZIP codes)")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["run"]:
+        print(warm_watchlist(ignore_window=True))
+    else:
+        print("Usage: python -m utils.warmer run")
+        sys.exit(1)
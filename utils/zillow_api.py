@@ -2,40 +2,162 @@ import os
 import time
 import json
 import logging
-import requests
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 
+from utils.http_client import http_get
+from utils.metrics import timed
+from utils.pipeline import MAX_IN_FLIGHT, run_ordered
+
+# Upper bound on result pages fetched per ZIP code and endpoint
+ZILLOW_MAX_PAGES = int(os.environ.get("ZILLOW_MAX_PAGES", 20))
+
+# Point at a stand-in server (e.g. benchmarks/mock_server.py) for offline runs
+ZILLOW_BASE_URL = os.environ.get("ZILLOW_BASE_URL", "https://zillow-com1.p.rapidapi.com").rstrip("/")
+
+SEARCH_ENDPOINT = f"{ZILLOW_BASE_URL}/propertyExtendedSearch"
+SALE_ENDPOINT = f"{ZILLOW_BASE_URL}/properties/list-for-sale"
+
+
+class IncompleteListingsError(Exception):
+    """Raised when some result pages of a search could not be fetched."""
+
+    def __init__(self, message: str, properties: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.properties = properties
+
+
+def get_headers() -> Dict[str, str]:
+    """Returns the RapidAPI headers, raising ValueError if no API key is configured."""
+    api_key = os.environ.get("ZILLOW_API_KEY")
+
+    if not api_key:
+        logging.error("Zillow API key not found in environment variables")
+        raise ValueError("Zillow API key not configured. Please set the ZILLOW_API_KEY environment variable.")
+
+    return {
+        "X-RapidAPI-Key": api_key,
+        "X-RapidAPI-Host": "zillow-com1.p.rapidapi.com"
+    }
+
+
+def get_page(endpoint: str, headers: Dict[str, str], querystring: Dict[str, str],
+             page: int) -> Optional[Dict[str, Any]]:
+    """
+    Fetches one page of search results.
+
+    Returns:
+        The response data, or None if the request failed.
+    """
+    try:
+        response = http_get("zillow", endpoint, headers=headers,
+                            params={**querystring, "page": str(page)})
+        logging.info(f"Zillow API status for {querystring['location']} page {page}: {response.status_code}")
+        if response.status_code != 200:
+            return None
+        return response.json()
+    except Exception as e:
+        logging.error(f"Error fetching page {page} for {querystring['location']}: {str(e)}")
+        return None
+
+
+def get_all_pages(endpoint: str, headers: Dict[str, str],
+                  querystring: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Fetches every page of a search, up to ZILLOW_MAX_PAGES.
+
+    The first page reports the page count; the remaining pages are fetched
+    concurrently and their properties returned in page order. Pages that
+    fail are retried once.
+
+    Raises:
+        IncompleteListingsError: If a page after the first still failed,
+            carrying the properties of the pages that were fetched.
+    """
+    first_page = get_page(endpoint, headers, querystring, 1)
+    if not first_page:
+        return []
+
+    properties = list(first_page.get("props") or [])
+    total_pages = int(first_page.get("totalPages") or 1)
+    if total_pages > ZILLOW_MAX_PAGES:
+        logging.warning(f"Search for {querystring['location']} has {total_pages} pages, fetching the first {ZILLOW_MAX_PAGES}")
+        total_pages = ZILLOW_MAX_PAGES
+
+    page_numbers = range(2, total_pages + 1)
+    pages = run_ordered(lambda page: get_page(endpoint, headers, querystring, page),
+                        page_numbers, max_workers=MAX_IN_FLIGHT["zillow"])
+    failed_pages = []
+    for page, data in zip(page_numbers, pages):
+        if data is None:
+            data = get_page(endpoint, headers, querystring, page)
+        if data is None:
+            failed_pages.append(page)
+        elif data.get("props"):
+            properties.extend(data["props"])
+
+    if failed_pages:
+        raise IncompleteListingsError(
+            f"Pages {', '.join(map(str, failed_pages))} of {total_pages} failed for {querystring['location']}",
+            properties)
+
+    logging.info(f"Fetched {total_pages} pages with {len(properties)} properties for {querystring['location']}")
+    return properties
+
+
+def iter_newest_listings(zip_code: str) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields pages of listings for a ZIP code, newest first.
+
+    Pages are fetched one at a time so incremental refreshes can stop as
+    soon as they reach listings they already know.
+
+    Args:
+        zip_code: The ZIP code to search.
+
+    Yields:
+        The raw listings of each page.
+    """
+    headers = get_headers()
+    querystring = {"location": zip_code, "home_type": "All", "sort": "Newest"}
+
+    page = 1
+    total_pages = 1
+    while page <= min(total_pages, ZILLOW_MAX_PAGES):
+        data = get_page(SEARCH_ENDPOINT, headers, querystring, page)
+        if not data:
+            raise ValueError(f"Zillow search failed for ZIP {zip_code} page {page}")
+        total_pages = int(data.get("totalPages") or 1)
+        yield data.get("props") or []
+        page += 1
+
+
+@timed("zillow.listings")
 def get_zillow_listings(zip_code: str) -> List[Dict[str, Any]]:
     """
     Fetches property listings from Zillow API for a given ZIP code.
+
+    Every result page is fetched, so large ZIP codes are not truncated to
+    the first page.
     
     Args:
         zip_code: The ZIP code to search for properties.
         
     Returns:
         A list of property listings.
+
+    Raises:
+        IncompleteListingsError: If some result pages could not be fetched,
+            carrying the listings that were.
     """
     logging.info(f"Fetching Zillow listings for ZIP: {zip_code}")
-    api_key = os.environ.get("ZILLOW_API_KEY")
-    
-    if not api_key:
-        logging.error("Zillow API key not found in environment variables")
-        raise ValueError("Zillow API key not configured. Please set the ZILLOW_API_KEY environment variable.")
-    
-    # Define our Zillow API endpoints
-    search_endpoint = "https://zillow-com1.p.rapidapi.com/propertyExtendedSearch"
-    sale_endpoint = "https://zillow-com1.p.rapidapi.com/properties/list-for-sale"
-    
-    headers = {
-        "X-RapidAPI-Key": api_key,
-        "X-RapidAPI-Host": "zillow-com1.p.rapidapi.com"
-    }
+    headers = get_headers()
     
     # For high-end ZIP codes, use different search parameters
     # These areas often have different market dynamics
     high_end_zip_prefixes = ['902', '904', '945', '100', '101', '941']
     is_high_end_zip = any(zip_code.startswith(prefix) for prefix in high_end_zip_prefixes)
     all_properties = []
+    incomplete = False
     
     # Try the primary search endpoint first
     try:
@@ -44,31 +166,25 @@ def get_zillow_listings(zip_code: str) -> List[Dict[str, Any]]:
             querystring = {
                 "location": zip_code,
                 "home_type": "All",
-                "sort": "Price_High_Low",  # For high-end areas, look at higher priced properties
-                "page": "1"
+                "sort": "Price_High_Low"  # For high-end areas, look at higher priced properties
             }
         else:
             querystring = {
                 "location": zip_code,
                 "home_type": "All",  # More inclusive to show all property types
-                "sort": "Price_Low_High",
-                "page": "1"
+                "sort": "Price_Low_High"
             }
         
         logging.info(f"Making API request to search endpoint for ZIP {zip_code} with params: {querystring}")
-        response = requests.get(search_endpoint, headers=headers, params=querystring)
-        logging.info(f"Zillow search API status for ZIP {zip_code}: {response.status_code}")
-        
-        if response.status_code == 200:
-            data = response.json()
-            logging.info(f"Raw API response keys for ZIP {zip_code}: {list(data.keys())}")
-            
-            # Check if we have properties in the response
-            if "props" in data and data["props"]:
-                properties = data["props"]
-                logging.info(f"Found {len(properties)} properties from search endpoint for ZIP {zip_code}")
-                all_properties.extend(properties)
+        properties = get_all_pages(SEARCH_ENDPOINT, headers, querystring)
+        if properties:
+            logging.info(f"Found {len(properties)} properties from search endpoint for ZIP {zip_code}")
+            all_properties.extend(properties)
     
+    except IncompleteListingsError as e:
+        logging.error(f"Incomplete results from search endpoint for ZIP {zip_code}: {str(e)}")
+        all_properties.extend(e.properties)
+        incomplete = True
     except Exception as e:
         logging.error(f"Error with search endpoint for ZIP {zip_code}: {str(e)}")
     
@@ -77,23 +193,19 @@ def get_zillow_listings(zip_code: str) -> List[Dict[str, Any]]:
         try:
             sale_querystring = {
                 "location": zip_code,
-                "page": "1",
                 "sort": "Price Low to High" if not is_high_end_zip else "Price High to Low"
             }
             
             logging.info(f"Trying sale endpoint for ZIP {zip_code} with params: {sale_querystring}")
-            sale_response = requests.get(sale_endpoint, headers=headers, params=sale_querystring)
-            logging.info(f"Zillow sale API status for ZIP {zip_code}: {sale_response.status_code}")
-            
-            if sale_response.status_code == 200:
-                sale_data = sale_response.json()
-                logging.info(f"Sale API response keys for ZIP {zip_code}: {list(sale_data.keys())}")
-                
-                if "props" in sale_data and sale_data["props"]:
-                    sale_properties = sale_data["props"] 
-                    logging.info(f"Found {len(sale_properties)} properties from sale endpoint for ZIP {zip_code}")
-                    all_properties.extend(sale_properties)
+            sale_properties = get_all_pages(SALE_ENDPOINT, headers, sale_querystring)
+            if sale_properties:
+                logging.info(f"Found {len(sale_properties)} properties from sale endpoint for ZIP {zip_code}")
+                all_properties.extend(sale_properties)
         
+        except IncompleteListingsError as e:
+            logging.error(f"Incomplete results from sale endpoint for ZIP {zip_code}: {str(e)}")
+            all_properties.extend(e.properties)
+            incomplete = True
         except Exception as e:
             logging.error(f"Error with sale endpoint for ZIP {zip_code}: {str(e)}")
     
@@ -126,4 +238,6 @@ def get_zillow_listings(zip_code: str) -> List[Dict[str, Any]]:
         property_types.add(home_type)
         
     logging.info(f"Property types found in ZIP {zip_code}: {', '.join(property_types)}")
+    if incomplete:
+        raise IncompleteListingsError(f"Some result pages failed for ZIP {zip_code}", unique_properties)
     return unique_properties